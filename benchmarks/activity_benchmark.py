@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Compares counting the active players of the last 30 days by scanning users.last_played with the daily HyperLogLog
+counters of ActivityCounters
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ActivityCounters, Database, dal  # noqa: E402
+
+USERS = 500000
+DAY = 86400
+RUNS = 20
+
+
+def _measure(func):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = func()
+    return (time.perf_counter() - start) / RUNS * 1000, result
+
+
+def main():
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.db")
+        Database.create_database(path)
+        connection = sqlite3.connect(path)
+
+        counters = ActivityCounters()
+        rows = []
+        for user_id in range(1, USERS + 1):
+            last_played = now - random.randint(0, 60 * DAY)
+            rows.append((user_id, last_played))
+            counters.add_player(user_id, last_played)
+        connection.executemany("INSERT INTO users (user_id, first_name, last_played) VALUES (?, 'Player', ?);", rows)
+        connection.commit()
+        counters.flush(connection)
+
+        # Days start at midnight UTC, like the days of ActivityCounters
+        today = now // DAY
+        exact = [sum(1 for _, last_played in rows if last_played // DAY > today - days) for days in (1, 7, 30)]
+
+        def scan():
+            return tuple(len(dal.get_recent_players(connection, (today - days + 1) * DAY)) for days in (1, 7, 30))
+
+        scan_time, _ = _measure(scan)
+        sketch_time, estimate = _measure(lambda: counters.count(connection, now))
+        blob_bytes = connection.execute("SELECT SUM(LENGTH(registers)) FROM activity;").fetchone()[0]
+
+        print("{} users, exact DAU/WAU/MAU {}".format(USERS, exact))
+        print("last_played scan  {:>8.2f} ms".format(scan_time))
+        print("hyperloglog       {:>8.2f} ms, estimate {}, {} KB of registers".format(sketch_time, estimate, blob_bytes // 1024))
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
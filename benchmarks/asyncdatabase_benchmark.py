@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Measures how long the event loop stalls while handlers write to the database, once with queries on the event loop
+and once with the queries running on a DatabaseWorker thread
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseWorker  # noqa: E402
+
+HANDLERS = 2000
+TICK = 0.001
+
+
+def _setup(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL;")
+    connection.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, bet INTEGER);")
+    connection.executemany("INSERT INTO users VALUES (?, 10);", [(i,) for i in range(HANDLERS)])
+    connection.commit()
+    return connection
+
+
+def _set_bet(connection, user_id, bet):
+    connection.execute("UPDATE users SET bet=? WHERE user_id=?;", [bet, user_id])
+
+
+async def _measure_lag(stopped, lags):
+    """Sleeps for TICK in a loop and records how late each wakeup is"""
+    while not stopped.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def _run(handler):
+    stopped = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(_measure_lag(stopped, lags))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(user_id) for user_id in range(HANDLERS)))
+    duration = time.perf_counter() - start
+
+    stopped.set()
+    await ticker
+    lags.sort()
+    return duration, lags[len(lags) // 2], lags[int(len(lags) * 0.99)], lags[-1]
+
+
+def _report(name, result):
+    duration, median, p99, worst = result
+    print("{:<12} {:>7.2f} s total, event loop lag: median {:>6.2f} ms, p99 {:>6.2f} ms, max {:>6.2f} ms".format(
+        name, duration, median * 1000, p99 * 1000, worst * 1000))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "users.db")
+        connection = _setup(path)
+
+        async def blocking_handler(user_id):
+            _set_bet(connection, user_id, 20)
+            connection.commit()
+            await asyncio.sleep(0)
+
+        _report("blocking", asyncio.run(_run(blocking_handler)))
+        connection.close()
+
+        worker = DatabaseWorker(path)
+
+        async def worker_handler(user_id):
+            await asyncio.wrap_future(worker.submit(_set_bet, user_id, 30, write=True))
+
+        _report("worker", asyncio.run(_run(worker_handler)))
+        worker.close()
+
+
+if __name__ == '__main__':
+    main()
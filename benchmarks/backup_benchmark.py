@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the latency of single writes on a DatabaseWorker, once while nothing else happens and once while an online backup
+of the same database is running
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseWorker, backup_database  # noqa: E402
+
+USERS = 500000
+WRITE_INTERVAL = 0.002
+
+
+def _setup(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL;")
+    connection.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_name TEXT, games_played INTEGER DEFAULT 0, bet INTEGER);")
+    connection.executemany("INSERT INTO users (user_id, first_name, bet) VALUES (?, ?, 10);", [(i, "Player {}".format(i)) for i in range(USERS)])
+    connection.commit()
+    connection.close()
+
+
+def _set_bet(connection, user_id):
+    connection.execute("UPDATE users SET bet = bet + 1, games_played = games_played + 1 WHERE user_id=?;", [user_id])
+
+
+def _measure(worker, stopped):
+    latencies = []
+    user_id = 0
+    while not stopped.is_set():
+        start = time.perf_counter()
+        worker.submit(_set_bet, user_id, write=True).result()
+        latencies.append(time.perf_counter() - start)
+        user_id = (user_id + 7919) % USERS
+        time.sleep(WRITE_INTERVAL)
+    return latencies
+
+
+def _report(name, latencies):
+    latencies.sort()
+    print("{:<16} {:>6} writes, median {:>6.3f} ms, p99 {:>6.3f} ms, max {:>6.3f} ms".format(
+        name, len(latencies), latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000, latencies[-1] * 1000))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.db")
+        _setup(path)
+        print("database size: {:.1f} MB".format(os.path.getsize(path) / 1024 / 1024))
+        worker = DatabaseWorker(path)
+
+        stopped = threading.Event()
+        timer = threading.Timer(3, stopped.set)
+        timer.start()
+        _report("idle", _measure(worker, stopped))
+
+        results = {}
+        stopped = threading.Event()
+        measuring = threading.Thread(target=lambda: results.setdefault("latencies", _measure(worker, stopped)))
+        measuring.start()
+        # Back up over and over for a few seconds to get enough samples
+        backups = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 3:
+            backup_database(path, os.path.join(directory, "snapshot.db"))
+            backups += 1
+        duration = time.perf_counter() - start
+        stopped.set()
+        measuring.join()
+        _report("during backups", results["latencies"])
+        print("{} backups, {:.2f} s per backup".format(backups, duration / backups))
+
+        worker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Measures exporting and importing the users table in both formats"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from database.bulk import export_table, import_table  # noqa: E402
+
+USERS = 1000000
+
+
+def _create_database(path):
+    Database.create_database(path)
+    return sqlite3.connect(path)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tempdir:
+        source = _create_database(os.path.join(tempdir, "source.db"))
+        source.executemany("INSERT INTO users (user_id, first_name, last_name, username, games_played, games_won, last_played) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                           ((i, "First {}".format(i), "Last", "user{}".format(i), i % 100, i % 50, 1600000000 + i) for i in range(USERS)))
+        source.commit()
+
+        for fmt in ("ndjson", "csv"):
+            path = os.path.join(tempdir, "users.{}".format(fmt))
+            start = time.perf_counter()
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                export_table(source, "users", f, fmt)
+            export_duration = time.perf_counter() - start
+
+            target = _create_database(os.path.join(tempdir, "target_{}.db".format(fmt)))
+            start = time.perf_counter()
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                count = import_table(target, "users", f, fmt)
+            import_duration = time.perf_counter() - start
+            target.close()
+
+            print("{:<7} {} rows, {:.1f} MB: export {:.2f} s, import {:.2f} s".format(
+                fmt, count, os.path.getsize(path) / 1e6, export_duration, import_duration))
+        source.close()
+
+
+if __name__ == '__main__':
+    main()
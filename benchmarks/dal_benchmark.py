@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the per-query latency of the data access layer with the previous queries of the Database class,
+which bound user_ids as strings, went through a shared cursor and checked existence with SELECT rowid, * and fetchall()
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, dal  # noqa: E402
+
+USERS = 100000
+QUERIES = 50000
+
+
+class LegacyQueries(object):
+    """The queries of Database before the data access layer"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+
+    def get_user(self, user_id):
+        self.cursor.execute("SELECT user_id, first_name, last_name, username, games_played, games_won, games_tie, last_played, banned"
+                            " FROM users WHERE user_id=?;", [str(user_id)])
+        result = self.cursor.fetchone()
+        if not result or len(result) == 0:
+            return None
+        return result
+
+    def is_user_saved(self, user_id):
+        self.cursor.execute("SELECT rowid, * FROM users WHERE user_id=?;", [str(user_id)])
+        return len(self.cursor.fetchall()) > 0
+
+    def get_bet(self, user_id):
+        self.cursor.execute("SELECT bet FROM users WHERE user_id=?;", [str(user_id)])
+        result = self.cursor.fetchone()
+        if not result or len(result) <= 0:
+            return 0
+        return int(result["bet"])
+
+    def get_stats(self, user_id):
+        played_games, won_games, _, last_played = self.get_user(user_id)[4:8]
+        return played_games, won_games, last_played
+
+
+def _dal_get_stats(connection, user_id):
+    user = dal.get_user(connection, user_id)
+    return user.games_played, user.games_won, user.last_played
+
+
+def _measure(func, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        func(user_id)
+    return (time.perf_counter() - start) / len(user_ids) * 1000000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.db")
+        Database.create_database(path)
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        connection.executemany("INSERT INTO users (user_id, first_name, last_name, username) VALUES (?, 'first', 'last', 'user');",
+                               [(user_id,) for user_id in range(1, USERS + 1)])
+        connection.commit()
+
+        legacy = LegacyQueries(connection)
+        # Half of the existence checks are for unknown users
+        existing = [random.randint(1, USERS) for _ in range(QUERIES)]
+        mixed = [random.randint(1, USERS * 2) for _ in range(QUERIES)]
+
+        benchmarks = [
+            ("get_user", legacy.get_user, lambda user_id: dal.get_user(connection, user_id), existing),
+            ("user exists", legacy.is_user_saved, lambda user_id: dal.user_exists(connection, user_id), mixed),
+            ("get_bet", legacy.get_bet, lambda user_id: dal.get_bet(connection, user_id), existing),
+            ("user stats", legacy.get_stats, lambda user_id: _dal_get_stats(connection, user_id), existing),
+        ]
+        print("{} queries each, microseconds per query".format(QUERIES))
+        for name, legacy_query, dal_query, user_ids in benchmarks:
+            legacy_time = _measure(legacy_query, user_ids)
+            dal_time = _measure(dal_query, user_ids)
+            print("{:<12} legacy {:>6.2f} us, dal {:>6.2f} us ({:.2f}x)".format(name, legacy_time, dal_time, legacy_time / dal_time))
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
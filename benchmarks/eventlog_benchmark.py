@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Measures the cost of logging a game action on the calling thread (the event loop in the bot)"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blackjack.game import BlackJackGame  # noqa: E402
+from blackjackbot.eventlog import EventLog, replay  # noqa: E402
+
+ACTIONS = 200000
+
+
+def main():
+    game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+    game.id = 1000000
+    game.chat_id = -1000000000
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        event_log = EventLog(tempdir)
+        event_log.log_create(game)
+
+        start = time.perf_counter()
+        for i in range(ACTIONS):
+            if i % 2:
+                event_log.log_action(game, "draw_card", (), {})
+            else:
+                event_log.log_action(game, "add_player", (i, "Player"), {})
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        event_log.close()
+        flush_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replayed = replay(tempdir, {})
+        replay_time = time.perf_counter() - start
+
+    print("Actions:            {}".format(ACTIONS))
+    print("Cost per action:    {:.2f} us".format(elapsed / ACTIONS * 1e6))
+    print("Final flush:        {:.3f} s".format(flush_time))
+    print("Replay:             {:.3f} s ({} records)".format(replay_time, replayed))
+
+
+if __name__ == '__main__':
+    main()
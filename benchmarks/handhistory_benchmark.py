@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Writes a million hands to the columnar hand history and computes the return to player over all of them,
+once by scanning the mapped columns and once from rows in a SQLite table for comparison
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import HandHistory, open_segments  # noqa: E402
+from database.handhistory import MAX_CARDS, numpy  # noqa: E402
+
+HANDS = 1000000
+BATCH = 10000
+
+
+def _columns(count, start):
+    cards = bytes(MAX_CARDS)
+    bets = [random.choice((10, 20, 50)) for _ in range(count)]
+    payouts = [bet * random.choice((0, 0, 1, 2, 2)) for bet in bets]
+    return [[start + i for i in range(count)], [-1] * count, [1000000] * count, [random.randint(1, 100000) for _ in range(count)],
+            bets, payouts, [1 if payout > bet else 0 if payout == bet else -1 for bet, payout in zip(bets, payouts)],
+            [20] * count, [19] * count, [cards] * count, [cards] * count]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        history = HandHistory(directory, capacity=262144, flush_interval=3600)
+        sqlite_connection = sqlite3.connect(os.path.join(directory, "hands.db"))
+        sqlite_connection.execute("CREATE TABLE hands (timestamp INTEGER, user_id INTEGER, bet INTEGER, payout INTEGER);")
+
+        write_time = 0
+        for start in range(0, HANDS, BATCH):
+            columns = _columns(BATCH, start)
+            sqlite_connection.executemany("INSERT INTO hands VALUES (?, ?, ?, ?);", zip(columns[0], columns[3], columns[4], columns[5]))
+            begin = time.perf_counter()
+            # Bypasses record_game() to measure the segment writes only
+            with history._write_lock:
+                while columns[0]:
+                    if history._writer.free == 0:
+                        number = history._writer.number + 1
+                        history._writer.close()
+                        history._writer = history._open_writer(number)
+                    take = min(history._writer.free, len(columns[0]))
+                    history._writer.append([column[:take] for column in columns])
+                    columns = [column[take:] for column in columns]
+            write_time += time.perf_counter() - begin
+        sqlite_connection.commit()
+        history.close()
+        print("{} hands written in {:.2f} s ({:.0f} hands/s)".format(HANDS, write_time, HANDS / write_time))
+
+        begin = time.perf_counter()
+        bets = payouts = 0
+        for segment in open_segments(directory):
+            if numpy is not None:
+                bets += int(segment.column("bet").sum())
+                payouts += int(segment.column("payout").sum())
+            else:
+                bets += sum(segment.column("bet"))
+                payouts += sum(segment.column("payout"))
+            segment.close()
+        scan_time = time.perf_counter() - begin
+        print("columns ({}): RTP {:.4f} in {:.1f} ms".format("numpy" if numpy is not None else "memoryview", payouts / bets, scan_time * 1000))
+
+        begin = time.perf_counter()
+        bets, payouts = sqlite_connection.execute("SELECT SUM(bet), SUM(payout) FROM hands;").fetchone()
+        print("sqlite table:  RTP {:.4f} in {:.1f} ms".format(payouts / bets, (time.perf_counter() - begin) * 1000))
+        sqlite_connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the 30 day P&L report of PnlRollups with summing the same rounds from the ledger table
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, GLOBAL_SCOPE, PnlRollups  # noqa: E402
+
+ROUNDS = 500000
+CHATS = 2000
+HOUR = 3600
+RUNS = 20
+
+
+def _measure(func):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = func()
+    return (time.perf_counter() - start) / RUNS * 1000, result
+
+
+def main():
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.db")
+        Database.create_database(path)
+        connection = sqlite3.connect(path)
+        rollups = PnlRollups()
+
+        entries = []
+        for round_id in range(ROUNDS):
+            created = now - random.randint(0, 60 * 24 * HOUR)
+            chat_id = -random.randint(1, CHATS)
+            bet = random.choice((10, 20, 50))
+            payout = bet * random.choice((0, 0, 1, 2, 2))
+            rollups.add_round(chat_id, 1, bet, payout, timestamp=created)
+            key = "{}:{}".format(chat_id, round_id)
+            entries.append((key, 1, "house", "bet", bet, created))
+            entries.append((key, 1, "house", "payout", -payout, created))
+        connection.executemany("INSERT INTO ledger (round_id, user_id, account, kind, amount, created) VALUES (?, ?, ?, ?, ?, ?);", entries)
+        connection.commit()
+        rollups.flush(connection)
+
+        since = (now // HOUR - 30 * 24 + 1) * HOUR
+
+        def ledger_report():
+            return connection.execute("SELECT SUM(amount) FROM ledger WHERE account='house' AND created>=?;", [since]).fetchone()[0]
+
+        ledger_time, profit = _measure(ledger_report)
+        rollup_time, report = _measure(lambda: rollups.report(connection, 30 * 24, GLOBAL_SCOPE, timestamp=now))
+        print("{} rounds in {} chats over 60 days, house profit of the last 30 days".format(ROUNDS, CHATS))
+        print("ledger scan  {:>8.2f} ms, profit {}".format(ledger_time, profit))
+        print("rollups      {:>8.2f} ms, profit {}, RTP {:.4f}".format(rollup_time, report.house_profit, report.rtp))
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
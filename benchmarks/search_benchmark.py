@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Compares looking up users by name with the users_fts index and with LIKE on the users table
+"""
+import os
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, dal  # noqa: E402
+
+USERS = 1000000
+RUNS = 20
+QUERIES = ["@player4242", "player12345", "sofiax", "maria nowak", "müller", "joh"]
+FIRST_NAMES = ["John", "Anna", "Peter", "Maria", "José", "Lukas", "Sofia", "Noah", "Emma", "Ali"]
+LAST_NAMES = ["Smith", "Müller", "Garcia", "Rossi", "Nowak", "Kim", "Ivanov", "Jensen", None, None]
+
+
+def _measure(func):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = func()
+    return (time.perf_counter() - start) / RUNS * 1000, result
+
+
+def _random_name():
+    return random.choice(FIRST_NAMES) + "".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(0, 3)))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.db")
+        Database.create_database(path)
+        connection = sqlite3.connect(path)
+
+        start = time.perf_counter()
+        connection.executemany("INSERT INTO users (user_id, first_name, last_name, username) VALUES (?, ?, ?, ?);",
+                               ((user_id, _random_name(), random.choice(LAST_NAMES), "player{}".format(user_id) if user_id % 3 else None)
+                                for user_id in range(1, USERS + 1)))
+        connection.commit()
+        print("Inserted {} users with the index triggers in {:.1f} s".format(USERS, time.perf_counter() - start))
+
+        def like(text):
+            # Finding the best matches with LIKE means looking at every matching row, which is a scan of the users table
+            words = text.replace("@", " ").split()
+            conditions = " AND ".join("(first_name LIKE ?{0} || '%' OR last_name LIKE ?{0} || '%' OR username LIKE ?{0} || '%')".format(i + 1)
+                                      for i in range(len(words)))
+            return connection.execute("SELECT user_id FROM users WHERE {};".format(conditions), words).fetchall()
+
+        for text in QUERIES:
+            like_time, _ = _measure(lambda: like(text))
+            fts_time, _ = _measure(lambda: dal.find_users(connection, text))
+            matches = connection.execute("SELECT COUNT(*) FROM users_fts WHERE users_fts MATCH ?;", [dal.build_search_query(text)]).fetchone()[0]
+            print("{:<14} {:>7} matches   LIKE {:>8.2f} ms   FTS5 top 10 {:>8.2f} ms".format(text, matches, like_time, fts_time))
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the write throughput of the users table with 1, 2, 4 and 8 shards:
+- handler writes: many concurrent handlers updating single rows of random users, e.g. bet changes
+- statistics flush: one StatisticsBuffer flush with the counters of many users, which runs on all shards in parallel
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ShardedStore, StatisticsBuffer, shard_of  # noqa: E402
+from database.sharding import shard_path  # noqa: E402
+
+USERS = 200000
+WRITES = 20000
+CONCURRENCY = 500
+SHARD_COUNTS = (1, 2, 4, 8)
+
+
+def _fill(directory, shards):
+    rows = [[] for _ in range(shards)]
+    for user_id in range(1, USERS + 1):
+        rows[shard_of(user_id, shards)].append((user_id, "Player {}".format(user_id)))
+
+    for index in range(shards):
+        path = shard_path(directory, index, shards) if shards > 1 else os.path.join(directory, "users.db")
+        connection = sqlite3.connect(path)
+        connection.executemany("INSERT INTO users (user_id, first_name) VALUES (?, ?);", rows[index])
+        connection.commit()
+        connection.close()
+
+
+def _set_bet(connection, user_id, bet):
+    connection.execute("UPDATE users SET bet = ? WHERE user_id = ?;", [bet, user_id])
+
+
+async def _handler_writes(store):
+    user_ids = [random.randint(1, USERS) for _ in range(WRITES)]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def handler(user_id):
+        async with semaphore:
+            await store.run_user(user_id, _set_bet, user_id, random.randint(10, 100), write=True)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(user_id) for user_id in user_ids))
+    return WRITES / (time.perf_counter() - start)
+
+
+async def _statistics_flush(store):
+    buffer = StatisticsBuffer()
+    for user_id in range(1, USERS + 1):
+        buffer.add_game(user_id, won=user_id % 2 == 0)
+
+    start = time.perf_counter()
+    await buffer.flush_shards(store)
+    return USERS / (time.perf_counter() - start)
+
+
+def main():
+    print("{} users, {} CPU(s)".format(USERS, os.cpu_count()))
+    for name, benchmark in (("handler writes", _handler_writes), ("statistics flush", _statistics_flush)):
+        print(name)
+        baseline = None
+        for shards in SHARD_COUNTS:
+            with tempfile.TemporaryDirectory() as directory:
+                store = ShardedStore(directory, shards)
+                _fill(directory, shards)
+                throughput = asyncio.run(benchmark(store))
+                store.close()
+
+            baseline = baseline or throughput
+            print("  {} shard(s): {:>9.0f} rows/s ({:.2f}x)".format(shards, throughput, throughput / baseline))
+
+
+if __name__ == '__main__':
+    main()
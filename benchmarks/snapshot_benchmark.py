@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Measures how long it takes to snapshot and restore a large amount of running games"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blackjack.game import BlackJackGame, Player  # noqa: E402
+from blackjackbot.snapshot import dump_snapshot, load_snapshot, write_snapshot, read_snapshot  # noqa: E402
+
+TABLES = 50000
+
+
+def create_games(amount):
+    games = []
+    for i in range(amount):
+        game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+        game.id = 1000000 + i
+        game.chat_id = -1000000000 - i
+        # Players are added directly to avoid the balance lookup of add_player
+        for user_id in range(3):
+            game.players.append(Player(i * 10 + user_id, "Player {}".format(user_id)))
+        game.start(game.players[0].user_id)
+        games.append(game)
+    return games
+
+
+def main():
+    games = create_games(TABLES)
+
+    start = time.perf_counter()
+    data = dump_snapshot(games)
+    dump_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "games.snapshot")
+        start = time.perf_counter()
+        write_snapshot(path, data)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored, _ = read_snapshot(path)
+        read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_snapshot(data)
+    load_time = time.perf_counter() - start
+
+    assert len(restored) == TABLES
+    print("Tables:           {}".format(TABLES))
+    print("Snapshot size:    {:.1f} KiB ({:.0f} bytes/table)".format(len(data) / 1024, len(data) / TABLES))
+    print("Serialize:        {:.3f} s".format(dump_time))
+    print("Write (fsync):    {:.3f} s".format(write_time))
+    print("Read + restore:   {:.3f} s".format(read_time))
+    print("Restore (memory): {:.3f} s".format(load_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,5 +6,6 @@ from .shoe import Shoe
 from .player import Player
 from .dealer import Dealer
 from .blackjackgame import BlackJackGame
+from .serialization import dump_game, load_game, SerializationError
 
-__all__ = ['BlackJackGame', 'Player', 'Dealer', 'Card', 'Deck', 'Shoe']
+__all__ = ['BlackJackGame', 'Player', 'Dealer', 'Card', 'Deck', 'Shoe', 'dump_game', 'load_game', 'SerializationError']
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import functools
 import logging
 from datetime import datetime
 from enum import Enum
@@ -7,14 +8,52 @@ import blackjack.errors as errors
 from blackjack.game import Player, Dealer, Deck
 from remoteApi import RemoteApi
 
+
+def _action(func=None, name=None):
+    """
+    Marks a method as state-changing game action. After the action ran, the action sequence number of the game is increased
+    and the registered on_action_handlers are called.
+    Actions which failed without touching the game state (e.g. GameNotRunningException) are not reported.
+    Actions triggered from within another action (e.g. the automatic start of singleplayer games) are not reported separately.
+    :param name: The name the action is reported with. Defaults to the name of the method.
+    """
+    if func is None:
+        return functools.partial(_action, name=name)
+    action_name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self._action_depth += 1
+        state_changed = False
+        try:
+            result = func(self, *args, **kwargs)
+            state_changed = True
+            return result
+        except (errors.PlayerBustedException, errors.PlayerGot21Exception, errors.NoPlayersLeftException):
+            # These exceptions are raised after the game state has already been changed
+            state_changed = True
+            raise
+        finally:
+            self._action_depth -= 1
+            if state_changed and self._action_depth == 0:
+                self.action_seq += 1
+                self._run_action_handlers(action_name, args, kwargs)
+
+    return wrapper
+
+
 class BlackJackGame(object):
     """Representation of a game of Black Jack - The equivalent of a Black Jack casino table."""
     MAX_PLAYERS = 5
 
-    def __init__(self, gametype=None, game_id=None, lang_id="en"):
+    def __init__(self, gametype=None, game_id=None, lang_id="en", deck=None):
         self.logger = logging.getLogger(__name__)
         self.__on_start_handlers = []
         self.__on_stop_handlers = []
+        self.__on_action_handlers = []
+        self._action_depth = 0
+        # Increased with every action, so that outdated buttons can be told apart from the current ones
+        self.action_seq = 0
         self.list_won = []
         self.list_tie = []
         self.list_lost = []
@@ -23,11 +62,12 @@ class BlackJackGame(object):
         self._current_player = 0
         self.players = []
         self.running = False
-        self.deck = Deck(lang_id)
+        self.deck = deck if deck is not None else Deck(lang_id)
         self.dealer = Dealer("Dealer")
 
         self.type = gametype or BlackJackGame.Type.SINGLEPLAYER
         self.id = game_id
+        self.chat_id = None
         self.lang_id = lang_id
 
     class Type(Enum):
@@ -52,6 +92,15 @@ class BlackJackGame(object):
         """
         self.__on_stop_handlers.append(func)
 
+    def register_on_action_handler(self, func):
+        """
+        Registers a callback function as on_action_handler.
+        :param func: Function reference that will be called after each state-changing action (add_player, start, draw_card, next_player, stop).
+        It receives a reference to the game, the name of the action and the args and kwargs of the action as parameters.
+        :return:
+        """
+        self.__on_action_handlers.append(func)
+
     # noinspection PyBroadException
     def _run_handlers(self, handlers):
         """
@@ -65,6 +114,22 @@ class BlackJackGame(object):
             except Exception as e:
                 self.logger.error("Couldn't run handler '{0}' - The following exception occurred: '{1}'".format(handler, e))
 
+    # noinspection PyBroadException
+    def _run_action_handlers(self, action, args, kwargs):
+        """
+        Call all registered on_action_handlers
+        :param action: The name of the action which was executed
+        :param args: Positional arguments of the action
+        :param kwargs: Keyword arguments of the action
+        :return:
+        """
+        for handler in self.__on_action_handlers:
+            try:
+                handler(self, action, args, kwargs)
+            except Exception as e:
+                self.logger.error("Couldn't run action handler '{0}' - The following exception occurred: '{1}'".format(handler, e))
+
+    @_action
     def start(self, user_id):
         """
         Sets up the players' and the dealer's hands
@@ -89,6 +154,7 @@ class BlackJackGame(object):
 
         self._run_handlers(self.__on_start_handlers)
 
+    @_action
     def stop(self, user_id):
         """
         Stops the game, if the user has sufficient permissions
@@ -103,11 +169,23 @@ class BlackJackGame(object):
     def get_current_player(self):
         return self.players[self._current_player]
 
-    def add_player(self, user_id, first_name):
+    def add_player(self, user_id, first_name, bet=0):
         balance = RemoteApi().get_balance(user_id)
         if not balance:
             print("balance is none",balance)
         points = balance.get('amount')
+        self.seat_player(user_id, first_name, points, bet)
+
+    @_action(name="add_player")
+    def seat_player(self, user_id, first_name, points=None, bet=0):
+        """
+        Adds a player to the table without looking up their balance
+        :param user_id: The user_id of the new player
+        :param first_name: The first name of the new player
+        :param points: The balance of the player. If None, the balance is not checked (e.g. when replaying already validated actions).
+        :param bet: The amount the player bets in this round
+        :return:
+        """
         if self.running:
             raise errors.GameAlreadyRunningException("Not adding player, the game is already on!")
 
@@ -117,10 +195,11 @@ class BlackJackGame(object):
         if len(self.players) >= self.MAX_PLAYERS:
             raise errors.MaxPlayersReachedException
         
-        if  points < 100:
+        if points is not None and (points < 100 or points < bet):
             raise errors.InsufficientPointsException
         
         player = Player(user_id, first_name)
+        player.bet = bet
         self.logger.debug("Adding new player: {}!".format(player))
         self.players.append(player)
 
@@ -128,6 +207,7 @@ class BlackJackGame(object):
             self.logger.debug("Starting game now, because it's a singleplayer game")
             self.start(user_id)
 
+    @_action
     def draw_card(self):
         """
         Draw one card and add it to the player's hand
@@ -147,6 +227,7 @@ class BlackJackGame(object):
         if player.cardvalue == 21:
             raise errors.PlayerGot21Exception
 
+    @_action
     def next_player(self):
         """
         Marks the next player as active player. If all players are finished, go to dealer's turn
@@ -9,8 +9,17 @@ __author__ = 'Rico'
 
 class Deck(object):
 
-    def __init__(self, lang_id="en"):
+    def __init__(self, lang_id="en", cards=None):
+        """
+        Creates a new deck
+        :param lang_id: The ID of the language of the deck. Defaults to "en"
+        :param cards: Optional list of cards in the order they will be drawn (e.g. when restoring a game). If not set, a new shuffled deck is created.
+        """
         self.lang_id = lang_id
+        if cards is not None:
+            self._cards = cards
+            return
+
         self._cards = []
         self._set_up_deck()
         self._shuffle()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Compact binary (de)serialization of BlackJackGame objects, e.g. for sharing games between several bot processes"""
+import struct
+from datetime import datetime
+from operator import attrgetter
+
+from .blackjackgame import BlackJackGame
+from .card import Card
+from .deck import Deck
+from .player import Player
+
+FORMAT_VERSION = 2
+
+# version, type, flags, current player, game id, chat id, datetime started, action sequence number
+_HEADER = struct.Struct("<BBBbqqdI")
+# user_id, bet, win, flags
+_PLAYER = struct.Struct("<qqdB")
+_LENGTH = struct.Struct("<H")
+
+_FLAG_RUNNING = 1
+_FLAG_BETS_ACTIVE = 2
+_FLAG_DEALER_TURN_OVER = 4
+_FLAG_HAS_GAME_ID = 8
+_FLAG_HAS_CHAT_ID = 16
+
+# Cards are immutable, so all games can share the same 52 instances
+_CARDS = [Card(card_id) for card_id in range(52)]
+_card_id = attrgetter("card_id")
+
+
+class SerializationError(Exception):
+    pass
+
+
+def _pack_str(string):
+    data = (string or "").encode("utf-8")
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_str(data, offset):
+    length, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+def _pack_cards(cards):
+    return bytes([len(cards)]) + bytes(map(_card_id, cards))
+
+
+def _unpack_cards(data, offset):
+    amount = data[offset]
+    offset += 1
+    return list(map(_CARDS.__getitem__, data[offset:offset + amount])), offset + amount
+
+
+def dump_game(game):
+    """
+    Serializes a game into a compact byte string. Registered handlers are not part of the serialized data.
+    :param game: The BlackJackGame object to serialize
+    :return: bytes representing the game state
+    """
+    flags = 0
+    if game.running:
+        flags |= _FLAG_RUNNING
+    if game.bets_active:
+        flags |= _FLAG_BETS_ACTIVE
+    if game.dealer.turn_over:
+        flags |= _FLAG_DEALER_TURN_OVER
+    if game.id is not None:
+        flags |= _FLAG_HAS_GAME_ID
+    if game.chat_id is not None:
+        flags |= _FLAG_HAS_CHAT_ID
+
+    parts = [_HEADER.pack(FORMAT_VERSION, game.type.value, flags, game._current_player, game.id or 0, game.chat_id or 0,
+                          game.datetime_started.timestamp(), game.action_seq),
+             _pack_str(game.lang_id),
+             _pack_cards(game.deck.cards),
+             _pack_cards(game.dealer.cards),
+             bytes([len(game.players)])]
+
+    for player in game.players:
+        parts.append(_PLAYER.pack(player.user_id, player.bet, player.win, 1 if player.turn_over else 0))
+        parts.append(_pack_str(player.first_name))
+        parts.append(_pack_str(player.lang_id))
+        parts.append(_pack_cards(player.cards))
+
+    # The evaluation results are stored as indices into the list of players
+    for result_list in (game.list_won, game.list_tie, game.list_lost):
+        parts.append(bytes([len(result_list)]) + bytes(game.players.index(player) for player in result_list))
+
+    return b"".join(parts)
+
+
+def load_game(data):
+    """
+    Creates a new BlackJackGame object from data generated by dump_game
+    :param data: bytes generated by dump_game
+    :return: A new BlackJackGame object without any registered handlers
+    """
+    try:
+        version, game_type, flags, current_player, game_id, chat_id, started, action_seq = _HEADER.unpack_from(data, 0)
+        if version != FORMAT_VERSION:
+            raise SerializationError("Unsupported format version: {}".format(version))
+        offset = _HEADER.size
+        lang_id, offset = _unpack_str(data, offset)
+        deck_cards, offset = _unpack_cards(data, offset)
+
+        game = BlackJackGame(gametype=BlackJackGame.Type(game_type), lang_id=lang_id, deck=Deck(lang_id, cards=deck_cards))
+        game.id = game_id if flags & _FLAG_HAS_GAME_ID else None
+        game.chat_id = chat_id if flags & _FLAG_HAS_CHAT_ID else None
+        game.running = bool(flags & _FLAG_RUNNING)
+        game.bets_active = bool(flags & _FLAG_BETS_ACTIVE)
+        game._current_player = current_player
+        game.action_seq = action_seq
+        game.datetime_started = datetime.fromtimestamp(started)
+
+        game.dealer._cards, offset = _unpack_cards(data, offset)
+        game.dealer.turn_over = bool(flags & _FLAG_DEALER_TURN_OVER)
+
+        player_amount = data[offset]
+        offset += 1
+        for _ in range(player_amount):
+            user_id, bet, win, player_flags = _PLAYER.unpack_from(data, offset)
+            offset += _PLAYER.size
+            first_name, offset = _unpack_str(data, offset)
+            player_lang_id, offset = _unpack_str(data, offset)
+            player = Player(user_id, first_name, player_lang_id)
+            player.bet = bet
+            player.win = win
+            player.turn_over = bool(player_flags & 1)
+            player._cards, offset = _unpack_cards(data, offset)
+            game.players.append(player)
+
+        result_lists = []
+        for _ in range(3):
+            amount = data[offset]
+            offset += 1
+            result_lists.append([game.players[index] for index in data[offset:offset + amount]])
+            offset += amount
+        game.list_won, game.list_tie, game.list_lost = result_lists
+    except (struct.error, IndexError, ValueError) as e:
+        raise SerializationError("Can't load game from data: {}".format(e)) from e
+
+    return game
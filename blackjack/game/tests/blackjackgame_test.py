@@ -192,6 +192,34 @@ class BlackJackGameTest(unittest.TestCase):
         self.assertEqual(-1, self.game._current_player)
         dealers_turn.assert_called()
 
+    def test_action_seq(self):
+        """
+        Check that the action sequence number only increases for actions which changed the game
+        :return:
+        """
+        self.assertEqual(0, self.game.action_seq)
+        self.game.add_player(user_id=111, first_name="Player 111")
+        self.assertEqual(1, self.game.action_seq)
+
+        with self.assertRaises(GameNotRunningException):
+            self.game.draw_card()
+        self.assertEqual(1, self.game.action_seq)
+
+        self.game.add_player(user_id=222, first_name="Player 222")
+        self.game.start(111)
+        self.game.next_player()
+        self.assertEqual(4, self.game.action_seq)
+
+    def test_action_seq_singleplayer(self):
+        """
+        Check that the automatic start of singleplayer games is not counted as separate action
+        :return:
+        """
+        self.game.type = BlackJackGame.Type.SINGLEPLAYER
+        self.game.add_player(user_id=111, first_name="Player 111")
+        self.assertTrue(self.game.running)
+        self.assertEqual(1, self.game.action_seq)
+
     def test_get_current_player(self):
         """
         Check if we receive the correct player from get_current_player()
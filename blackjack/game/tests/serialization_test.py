@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from blackjack.game import BlackJackGame, dump_game, load_game, SerializationError
+
+
+class SerializationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP, lang_id="de")
+        self.game.id = 1234567
+        self.game.chat_id = -100123456789
+        self.game.add_player(user_id=111, first_name="Player 111")
+        self.game.add_player(user_id=222, first_name="Plåyer 👤")
+
+    def assertGamesEqual(self, expected, actual):
+        self.assertEqual(expected.id, actual.id)
+        self.assertEqual(expected.chat_id, actual.chat_id)
+        self.assertEqual(expected.type, actual.type)
+        self.assertEqual(expected.lang_id, actual.lang_id)
+        self.assertEqual(expected.running, actual.running)
+        self.assertEqual(expected._current_player, actual._current_player)
+        self.assertEqual(expected.action_seq, actual.action_seq)
+        self.assertEqual(expected.datetime_started, actual.datetime_started)
+        self.assertEqual([c.card_id for c in expected.deck.cards], [c.card_id for c in actual.deck.cards])
+        self.assertEqual([c.card_id for c in expected.dealer.cards], [c.card_id for c in actual.dealer.cards])
+        self.assertEqual(expected.dealer.turn_over, actual.dealer.turn_over)
+        self.assertEqual([(p.user_id, p.first_name, p.bet, p.win, p.turn_over, [c.card_id for c in p.cards]) for p in expected.players],
+                         [(p.user_id, p.first_name, p.bet, p.win, p.turn_over, [c.card_id for c in p.cards]) for p in actual.players])
+
+    def test_roundtrip_waiting(self):
+        """Check that a game which did not start yet survives serialization"""
+        self.assertGamesEqual(self.game, load_game(dump_game(self.game)))
+
+    def test_roundtrip_running(self):
+        """Check that a running game survives serialization and can be continued"""
+        self.game.start(111)
+        self.game.next_player()
+
+        loaded = load_game(dump_game(self.game))
+        self.assertGamesEqual(self.game, loaded)
+        self.assertEqual(222, loaded.get_current_player().user_id)
+
+    def test_roundtrip_evaluated(self):
+        """Check that the evaluation results are restored as references to the restored players"""
+        self.game.start(111)
+        self.game.dealers_turn()
+        self.game.evaluation()
+
+        loaded = load_game(dump_game(self.game))
+        for expected_list, loaded_list in ((self.game.list_won, loaded.list_won), (self.game.list_tie, loaded.list_tie),
+                                           (self.game.list_lost, loaded.list_lost)):
+            self.assertEqual([p.user_id for p in expected_list], [p.user_id for p in loaded_list])
+            for player in loaded_list:
+                self.assertIn(player, loaded.players)
+
+    def test_load_invalid(self):
+        """Check that loading garbage raises a SerializationError"""
+        with self.assertRaises(SerializationError):
+            load_game(b"\x01\x02")
+
+        data = bytearray(dump_game(self.game))
+        data[0] = 99
+        with self.assertRaises(SerializationError):
+            load_game(bytes(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,25 +1,36 @@
 # -*- coding: utf-8 -*-
 from telegram import Update
-from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler,InlineQueryHandler, filters
+from telegram.ext import ChatMemberHandler, CommandHandler, CallbackQueryHandler, MessageHandler,InlineQueryHandler, TypeHandler, filters
 
-from blackjackbot.commands import game, settings, util
+from blackjackbot.commands import admin, game, settings, util
 from blackjackbot.errors import error_handler
+from blackjackbot.requestcontext import RequestContext, load_request_context
 from util import BannedUserHandler, banned_user_callback
-# Banned users
+# Banned users - must be added to group -2, so that it runs before the request context gets loaded
 banned_user_handler = BannedUserHandler(callback=banned_user_callback, type=Update)
 
+# Loads language, user data and the active game before any other handler runs - must be added to group -1
+request_context_handler = TypeHandler(Update, load_request_context)
+
 # User commands
 start_command_handler = CommandHandler("start", game.start_cmd)
 stop_command_handler = CommandHandler("stop", game.stop_cmd)
 language_command_handler = CommandHandler("language", settings.language_cmd)
 stats_command_handler = CommandHandler("stats", util.stats_cmd)
+top_command_handler = CommandHandler("top", util.top_cmd)
 resetstats_command_handler = CommandHandler("resetstats", util.reset_stats_cmd)
 comment_command_handler = CommandHandler("comment", util.comment_cmd)
 comment_text_command_handler = MessageHandler(filters.TEXT & ~(filters.FORWARDED | filters.COMMAND), util.comment_text)
 
+# Admin commands
+broadcast_command_handler = CommandHandler("broadcast", admin.broadcast_cmd)
+activity_command_handler = CommandHandler("activity", admin.activity_cmd)
+pnl_command_handler = CommandHandler("pnl", admin.pnl_cmd)
+finduser_command_handler = CommandHandler("finduser", admin.finduser_cmd)
+
 # Callback handlers
-hit_callback_handler = CallbackQueryHandler(game.hit_callback, pattern=r"^hit_[0-9]{7}$")
-stand_callback_handler = CallbackQueryHandler(game.stand_callback, pattern=r"^stand_[0-9]{7}$")
+hit_callback_handler = CallbackQueryHandler(game.hit_callback, pattern=r"^hit_[0-9]{7}_[0-9]+$")
+stand_callback_handler = CallbackQueryHandler(game.stand_callback, pattern=r"^stand_[0-9]{7}_[0-9]+$")
 enterbet_callback_handler = CallbackQueryHandler(game.enterbet_callback, pattern=r"^enterbet_[a-zA-Z0-9]+$")
 adjustbet_callback_handler = CallbackQueryHandler(game.adjustbet_callback, pattern=r"^adjustbet_(-10|10)$")
 back_callback_handler = CallbackQueryHandler(game.back_callback, pattern=r"^back$")
@@ -30,14 +41,16 @@ language_callback_handler = CallbackQueryHandler(settings.language_callback, pat
 reset_stats_callback_handler = CallbackQueryHandler(util.reset_stats_callback, pattern=r"^reset_stats_(confirm|cancel)$")
 recharge_callback_handler = CallbackQueryHandler(game.recharge_callback, pattern=r"^recharge$")
 inlinequery_handler = InlineQueryHandler(util.inlinequery)
+# The bot was removed from a group or blocked by a user
+my_chat_member_handler = ChatMemberHandler(util.my_chat_member_callback, ChatMemberHandler.MY_CHAT_MEMBER)
 
-handlers = [banned_user_handler,adjustbet_callback_handler,back_callback_handler,enterbet_callback_handler,
+handlers = [adjustbet_callback_handler,back_callback_handler,enterbet_callback_handler,
             start_command_handler, stop_command_handler, join_callback_handler, hit_callback_handler,
-            stand_callback_handler, start_callback_handler, language_command_handler, stats_command_handler,
+            stand_callback_handler, start_callback_handler, language_command_handler, stats_command_handler, top_command_handler,
             newgame_callback_handler, language_callback_handler,recharge_callback_handler,
-            comment_command_handler, comment_text_command_handler,
+            comment_command_handler, comment_text_command_handler, broadcast_command_handler, activity_command_handler, pnl_command_handler, finduser_command_handler,
             resetstats_command_handler, reset_stats_callback_handler,
-            inlinequery_handler
+            inlinequery_handler, my_chat_member_handler
             ]
 
-__all__ = ['handlers', 'error_handler']
+__all__ = ['handlers', 'error_handler', 'banned_user_handler', 'request_context_handler', 'RequestContext']
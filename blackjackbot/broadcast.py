@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Sends admin messages to all recent players without exceeding Telegram's rate limits.
+Progress is checkpointed after every page of recipients, so an interrupted broadcast resumes where it stopped.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second overall and one message per second to the same chat.
+# Broadcasts stay below that, so that the regular game messages still get through.
+GLOBAL_RATE = 20
+PER_CHAT_RATE = 1
+RECENT_PLAYERS_PERIOD = 60 * 60 * 24
+
+
+class TokenBucket(object):
+    """Allows `rate` acquisitions per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """Returns the seconds until a token is available"""
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def is_full(self):
+        self._refill()
+        return self._tokens >= self.capacity
+
+    async def acquire(self):
+        # No lock needed: the check and the decrement happen without awaiting in between
+        while True:
+            delay = self.delay()
+            if delay <= 0:
+                self._tokens -= 1
+                return
+            await asyncio.sleep(delay)
+
+
+class RateLimiter(object):
+    """Combines a global token bucket with one token bucket per chat"""
+
+    def __init__(self, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_chats = max_chats
+        self._chat_buckets = OrderedDict()
+
+    def _get_chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+            # Buckets which were refilled completely behave like new ones and can be dropped
+            while len(self._chat_buckets) > self.max_chats:
+                oldest_chat_id, oldest = next(iter(self._chat_buckets.items()))
+                if not oldest.is_full():
+                    break
+                del self._chat_buckets[oldest_chat_id]
+        self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id):
+        await self._get_chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+
+class Broadcast(object):
+    """A message to all players who played since a certain time"""
+    page_size = 500
+    concurrency = 10
+    max_attempts = 3
+
+    def __init__(self, broadcast_id, admin_id, text, since, last_user_id=0, sent=0, failed=0):
+        self.broadcast_id = broadcast_id
+        self.admin_id = admin_id
+        self.text = text
+        self.since = since
+        self.last_user_id = last_user_id
+        self.sent = sent
+        self.failed = failed
+
+    async def run(self, bot, limiter):
+        """
+        Sends the message to all remaining recipients. Recipients are fetched page by page, so that neither the memory usage
+        nor the time the database worker is busy depend on the amount of recipients.
+        :param bot: PTB bot object
+        :param limiter: RateLimiter shared by all broadcasts
+        :return:
+        """
+        db = AsyncDatabase()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        logger.info("Running broadcast {} starting after user {}".format(self.broadcast_id, self.last_user_id))
+
+        while True:
+            page = await db.get_recent_players_page(self.since, self.last_user_id, self.page_size)
+            if not page:
+                break
+
+            tasks = []
+            for user_id in page:
+                await semaphore.acquire()
+                await limiter.acquire(user_id)
+                tasks.append(asyncio.ensure_future(self._send(bot, user_id, semaphore)))
+            results = await asyncio.gather(*tasks)
+
+            delivered = sum(results)
+            self.sent += delivered
+            self.failed += len(results) - delivered
+            self.last_user_id = page[-1]
+            # A crash before this point sends the current page again on resume - at least once delivery
+            await db.update_broadcast(self.broadcast_id, self.last_user_id, self.sent, self.failed)
+
+        await db.update_broadcast(self.broadcast_id, self.last_user_id, self.sent, self.failed, finished=True)
+        logger.info("Broadcast {} finished: {} sent, {} failed".format(self.broadcast_id, self.sent, self.failed))
+
+    async def _send(self, bot, chat_id, semaphore):
+        try:
+            for _ in range(self.max_attempts):
+                try:
+                    await bot.send_message(chat_id=chat_id, text=self.text)
+                    return True
+                except RetryAfter as e:
+                    logger.warning("Flood control during broadcast {} - waiting {} seconds".format(self.broadcast_id, e.retry_after))
+                    await asyncio.sleep(e.retry_after)
+                except (Forbidden, BadRequest):
+                    # The user blocked the bot or deleted their account
+                    return False
+                except TelegramError as e:
+                    logger.warning("Couldn't send broadcast {} to {}: {}".format(self.broadcast_id, chat_id, e))
+                    return False
+            return False
+        finally:
+            semaphore.release()
+
+
+_limiter = RateLimiter()
+
+
+async def _run_and_report(bot, broadcast):
+    await broadcast.run(bot, _limiter)
+    try:
+        await bot.send_message(chat_id=broadcast.admin_id, text="Broadcast {} finished: {} sent, {} failed".format(
+            broadcast.broadcast_id, broadcast.sent, broadcast.failed))
+    except TelegramError as e:
+        logger.warning("Couldn't report broadcast {} to admin {}: {}".format(broadcast.broadcast_id, broadcast.admin_id, e))
+
+
+async def start_broadcast(application, admin_id, text, period=RECENT_PLAYERS_PERIOD):
+    """
+    Creates a new broadcast to all players of the given period and runs it in the background
+    :param application: PTB application
+    :param admin_id: user_id of the admin, who gets notified when the broadcast is finished
+    :param text: The message to send
+    :param period: Seconds since the last game of a player
+    :return: The new Broadcast object
+    """
+    since = int(time.time()) - period
+    broadcast_id = await AsyncDatabase().create_broadcast(admin_id, text, since)
+    broadcast = Broadcast(broadcast_id, admin_id, text, since)
+    application.create_task(_run_and_report(application.bot, broadcast))
+    return broadcast
+
+
+async def resume_broadcasts(application):
+    """Continues all broadcasts which were interrupted, e.g. by a restart of the bot"""
+    for row in await AsyncDatabase().get_unfinished_broadcasts():
+        broadcast = Broadcast(*row)
+        application.create_task(_run_and_report(application.bot, broadcast))
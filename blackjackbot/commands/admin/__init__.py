@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from .commands import activity_cmd, broadcast_cmd, finduser_cmd, pnl_cmd
+
+__all__ = ['activity_cmd', 'broadcast_cmd', 'finduser_cmd', 'pnl_cmd']
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from blackjackbot.broadcast import start_broadcast
+from blackjackbot.commands.util.decorators import admin_method
+from database import ActivityCounters, AsyncDatabase, GLOBAL_SCOPE, PnlRollups
+
+
+@admin_method
+async def broadcast_cmd(update, context):
+    """Sends the text after the /broadcast command to all players of the last 24 hours"""
+    # Split the raw text instead of using context.args to keep line breaks
+    parts = update.effective_message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await update.effective_message.reply_text("Usage: /broadcast <text>")
+        return
+
+    broadcast = await start_broadcast(context.application, update.effective_user.id, parts[1])
+    await update.effective_message.reply_text("Broadcast {} to the players of the last 24 hours started.".format(broadcast.broadcast_id))
+
+
+@admin_method
+async def activity_cmd(update, context):
+    """Shows the estimated amount of daily, weekly and monthly active players"""
+    daily, weekly, monthly = await ActivityCounters().get_activity()
+    await update.effective_message.reply_text("Active players (approx.)\nDAU: {}\nWAU: {}\nMAU: {}".format(daily, weekly, monthly))
+
+
+@admin_method
+async def pnl_cmd(update, context):
+    """Shows the house profit and return to player of the last hours, globally or for one chat: /pnl [hours] [chat_id]"""
+    try:
+        hours = int(context.args[0]) if len(context.args) > 0 else 24
+        chat_id = int(context.args[1]) if len(context.args) > 1 else GLOBAL_SCOPE
+    except ValueError:
+        hours = 0
+    if hours <= 0:
+        await update.effective_message.reply_text("Usage: /pnl [hours] [chat_id]")
+        return
+
+    report = await PnlRollups().get_report(hours, chat_id)
+    rtp = "-" if report.rtp is None else "{:.2%}".format(report.rtp)
+    scope = "all chats" if chat_id == GLOBAL_SCOPE else "chat {}".format(chat_id)
+    await update.effective_message.reply_text("P&L of the last {} hours ({})\nRounds: {}\nHands: {}\nWagered: {}\nPaid out: {}\n"
+                                              "House profit: {}\nRTP: {}".format(hours, scope, report.rounds, report.hands, report.wagered,
+                                                                                  report.paid, report.house_profit, rtp))
+
+
+@admin_method
+async def finduser_cmd(update, context):
+    """Looks up users by their name or @username to find their user_id: /finduser <text>"""
+    parts = update.effective_message.text.split(maxsplit=1)
+    users = await AsyncDatabase().find_users(parts[1], limit=10) if len(parts) > 1 else None
+    if users is None:
+        await update.effective_message.reply_text("Usage: /finduser <name or @username>")
+        return
+    if not users:
+        await update.effective_message.reply_text("No users found.")
+        return
+
+    lines = []
+    for _, user_id, first_name, last_name, username in users:
+        name = " ".join(part for part in (first_name, last_name) if part)
+        lines.append("{} - {}{}".format(user_id, name, " (@{})".format(username) if username else ""))
+    await update.effective_message.reply_text("\n".join(lines))
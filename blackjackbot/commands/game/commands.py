@@ -6,40 +6,38 @@ import blackjack.errors as errors
 from blackjack.game import BlackJackGame
 from blackjackbot.commands.util import html_mention, get_game_keyboard, get_bet_keyboard,get_recharge_keyboard,get_join_keyboard, get_start_keyboard, remove_inline_keyboard
 from blackjackbot.commands.util.decorators import needs_active_game
-from blackjackbot.errors import NoActiveGameException
 from blackjackbot.gamestore import GameStore
-from blackjackbot.lang import Translator
 from blackjackbot.util import get_cards_string
-from database import Database
-from .functions import create_game, players_turn, next_player, is_button_affiliated
+from database import AsyncDatabase, BetBuffer, UserDirectory
+from .functions import create_game, players_turn, next_player, is_button_affiliated, is_outdated_button, show_bet_keyboard
 
 
 async def start_cmd(update, context):
     """Handles messages contianing the /start command. Starts a game for a specific user"""
     user = update.effective_user
-    Database().add_user(user.id, user.language_code, user.first_name, user.last_name, user.username)
-    try:
-        GameStore().get_game(update.effective_chat.id)
-    except NoActiveGameException:
+    # Only writes if the user is new or changed their names
+    await UserDirectory().save_user(user.id, user.language_code, user.first_name, user.last_name, user.username)
+    if context.user_row is None:
+        # The request context was loaded before the user was saved, so the default bet isn't known yet
+        context.bet = await AsyncDatabase().get_bet(user.id)
+    if context.game is None:
         await create_game(update, context)
 
 async def start_callback(update, context):
     """Starts a game that has been created already"""
     user = update.effective_user
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
-
-    try:
-        game = GameStore().get_game(update.effective_chat.id)
+    lang_id = context.lang_id
+    translator = context.translator
 
-        if not await is_button_affiliated(update, context, game, lang_id):
-            return
-    except NoActiveGameException:
+    game = context.game
+    if game is None:
         await update.callback_query.answer(translator("mp_no_created_game_callback"))
         await remove_inline_keyboard(update, context)
         return
 
+    if not await is_button_affiliated(update, context, game, lang_id):
+        return
+
     try:
         game.start(user.id)
         await update.callback_query.answer(translator("mp_starting_game_callback"))
@@ -73,10 +71,8 @@ async def stop_cmd(update, context):
     """Stops a game for a specific user"""
     user = update.effective_user
     chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
-
-    game = GameStore().get_game(chat.id)
+    translator = context.translator
+    game = context.game
 
     user_id = user.id
     try:
@@ -100,15 +96,19 @@ async def join_callback(update, context):
     """
     user = update.effective_user
     chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
+    lang_id = context.lang_id
+    translator = context.translator
 
-    game = GameStore().get_game(chat.id)
-    points = Database().get_bet(user_id=user.id)
+    game = context.game
+    points = context.bet
     if not await is_button_affiliated(update, context, game, lang_id):
         return
+    await BetBuffer().flush_user(user.id)
+    if GameStore().is_playing_elsewhere(user.id, chat.id):
+        await update.callback_query.answer(translator("mp_playing_elsewhere_callback").format(user.first_name))
+        return
     try:
-        game.add_player(user.id, user.first_name)
+        game.add_player(user.id, user.first_name, bet=points)
         await update.effective_message.edit_text(text=translator("mp_request_join").format(game.get_player_list()),
                                            reply_markup=get_join_keyboard(game.id, lang_id,points))
         await update.callback_query.answer(translator("mp_join_callback").format(user.first_name))
@@ -133,11 +133,12 @@ async def hit_callback(update, context):
     CallbackQueryHandler callback for the 'hit' inline button. Draws a card for you.
     """
     user = update.effective_user
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
+    game = context.game
+    if is_outdated_button(update, game):
+        return
 
-    game = GameStore().get_game(chat.id)
+    lang_id = context.lang_id
+    translator = context.translator
 
     if not await is_button_affiliated(update, context, game, lang_id):
         return
@@ -153,7 +154,7 @@ async def hit_callback(update, context):
         game.draw_card()
         player_cards = get_cards_string(player, lang_id)
         text = translator("your_cards_are").format(user_mention, player.cardvalue, player_cards)
-        await update.effective_message.edit_text(text=text, parse_mode=ParseMode.HTML, reply_markup=get_game_keyboard(game.id, lang_id))
+        await update.effective_message.edit_text(text=text, parse_mode=ParseMode.HTML, reply_markup=get_game_keyboard(game.id, lang_id, game.action_seq))
     except errors.PlayerBustedException:
         player_cards = get_cards_string(player, lang_id)
         text = (translator("your_cards_are") + "\n\n" + translator("you_busted")).format(user_mention, player.cardvalue, player_cards)
@@ -175,11 +176,11 @@ async def stand_callback(update, context):
     """
     CallbackQueryHandler callback for the 'stand' inline button. Prepares round for the next player.
     """
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    game = GameStore().get_game(update.effective_chat.id)
+    game = context.game
+    if is_outdated_button(update, game):
+        return
 
-    if not await is_button_affiliated(update, context, game, lang_id):
+    if not await is_button_affiliated(update, context, game, context.lang_id):
         return
 
     await next_player(update, context)
@@ -194,34 +195,29 @@ async def rules_cmd(update, context):
     await update.effective_message.reply_text("Rules:\n\n- Black Jack pays 3 to 2\n- Dealer must stand on 17 and must draw to 16\n- Insurance pays 2 to 1")
 
 async def enterbet_callback(update, context):
-    chat = update.effective_chat
-    user = update.effective_user
-    lang_id = Database().get_lang_id(chat.id)
-    points = Database().get_bet(user_id=user.id)
-    await update.effective_message.edit_reply_markup(reply_markup=get_bet_keyboard(points,lang_id))
+    await update.effective_message.edit_reply_markup(reply_markup=get_bet_keyboard(context.bet, context.lang_id))
 
 async def adjustbet_callback(update, context):
     user = update.effective_user
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
     points = int(update.callback_query.data.split("_")[1])
-    current_points = Database().get_bet(user.id)
+    current_points = context.bet
     if(current_points + points <= 0):
         return
-    Database().set_bet(user.id, current_points + points)
-    await update.effective_message.edit_reply_markup(reply_markup=get_bet_keyboard(current_points + points,lang_id))
+    # Only kept in memory - the bet is written once the user stops tapping
+    context.bet = current_points + points
+    BetBuffer().set_bet(user.id, context.bet)
+    show_bet_keyboard(context.application, update.effective_message, context.lang_id, context.bet)
 
 
 async def back_callback(update, context):
-    chat = update.effective_chat
-    user = update.effective_user
-    game = GameStore().get_game(chat.id)
-    lang_id = Database().get_lang_id(chat.id)
-    points = Database().get_bet(user.id) 
-    await update.effective_message.edit_reply_markup(reply_markup=get_join_keyboard(game.id,lang_id,points))
+    await BetBuffer().flush_user(update.effective_user.id)
+    game = context.game
+    if game is None:
+        await remove_inline_keyboard(update, context)
+        return
+    await update.effective_message.edit_reply_markup(reply_markup=get_join_keyboard(game.id, context.lang_id, context.bet))
 
 async def recharge_callback(update, context):
     user = update.effective_user
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
+    lang_id = context.lang_id
     # await update.effective_message.edit_reply_markup(reply_markup=get_recharge_keyboard(user.id, lang_id))
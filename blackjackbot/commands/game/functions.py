@@ -3,17 +3,20 @@ import logging
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from blackjack.errors import NoPlayersLeftException
 from blackjack.game import BlackJackGame
 from blackjackbot.commands.util.decorators import needs_active_game
-from blackjackbot.commands.util import html_mention, get_game_keyboard, get_join_keyboard, generate_evaluation_string, remove_inline_keyboard
+from blackjackbot.commands.util import html_mention, get_game_keyboard, get_join_keyboard, get_bet_keyboard, generate_evaluation_string, remove_inline_keyboard
 from blackjackbot.gamestore import GameStore
-from blackjackbot.lang import Translator
 from blackjackbot.util import get_cards_string
-from database import Database
+from database import BetBuffer
 
 logger = logging.getLogger(__name__)
 
+# (chat_id, message_id) -> bet which should be shown on the bet keyboard of that message, while an edit is running
+_shown_bets = {}
+
 
 async def is_button_affiliated(update, context, game, lang_id):
     try:
@@ -28,15 +31,28 @@ async def is_button_affiliated(update, context, game, lang_id):
         return False
 
 
+def is_outdated_button(update, game):
+    """
+    Checks if a pressed game button was created for an earlier state of the game, e.g. by double taps or old messages
+    :param update: PTB update object with callback data in the format '<action>_<game_id>_<action_seq>'
+    :param game: The game the button belongs to
+    :return: True if the button press must be ignored
+    """
+    try:
+        action_seq = int(update.callback_query.data.split("_")[2])
+    except (IndexError, ValueError):
+        return True
+    return action_seq != game.action_seq
+
+
 async def players_turn(update, context):
     """Execute a player's turn"""
-    chat = update.effective_chat
-    game = GameStore().get_game(chat.id)
+    game = context.game
     player = game.get_current_player()
     user_mention = html_mention(user_id=player.user_id, first_name=player.first_name)
 
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
+    lang_id = context.lang_id
+    translator = context.translator
 
     logger.info("Player's turn: {}".format(player))
     player_cards = get_cards_string(player, lang_id)
@@ -53,17 +69,16 @@ async def players_turn(update, context):
         await next_player(update, context)
     else:
         text = translator("your_cards_are").format(user_mention, player.cardvalue, player_cards)
-        await update.effective_message.reply_text(text=text, parse_mode=ParseMode.HTML, reply_markup=get_game_keyboard(game.id, lang_id))
+        await update.effective_message.reply_text(text=text, parse_mode=ParseMode.HTML, reply_markup=get_game_keyboard(game.id, lang_id, game.action_seq))
 
 
 @needs_active_game
 async def next_player(update, context):
-    chat = update.effective_chat
     user = update.effective_user
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
+    lang_id = context.lang_id
+    translator = context.translator
 
-    game = GameStore().get_game(chat.id)
+    game = context.game
 
     try:
         if user.id != game.get_current_player().user_id:
@@ -92,8 +107,8 @@ async def create_game(update, context):
     """Create a new game instance for the chat of the user"""
     user = update.effective_user
     chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    translator = Translator(lang_id=lang_id)
+    lang_id = context.lang_id
+    translator = context.translator
 
     # Create either a singleplayer or multiplayer game
     if chat.type == "private":
@@ -104,13 +119,51 @@ async def create_game(update, context):
         logger.error("Chat type '{}' not supported!".format(chat.type))
         return
 
+    if GameStore().is_playing_elsewhere(user.id, chat.id):
+        await update.effective_message.reply_text(translator("playing_elsewhere"))
+        return
+
+    # The bet must be stored before the game uses it
+    await BetBuffer().flush_user(user.id)
+    points = context.bet
     game = BlackJackGame(gametype=game_type)
-    game.add_player(user_id=user.id, first_name=user.first_name)
+    game.add_player(user_id=user.id, first_name=user.first_name, bet=points)
     GameStore().add_game(chat.id, game)
-    points = Database().get_bet(user.id)
+    context.game = game
     if game.type == BlackJackGame.Type.SINGLEPLAYER:
         await update.effective_message.reply_text(translator("game_starts_now").format("", get_cards_string(game.dealer, lang_id)))
         await players_turn(update, context)
     else:
         text = translator("mp_request_join").format(game.get_player_list())
         await update.effective_message.reply_text(text=text, reply_markup=get_join_keyboard(game.id, lang_id,points))
+
+
+def show_bet_keyboard(application, message, lang_id, bet):
+    """
+    Updates the bet keyboard of a message in the background. Taps which arrive while an edit is running only change
+    the value of the next edit, so fast taps lead to a few edits showing the latest bet instead of one edit per tap.
+    :param application: The PTB application running the edit
+    :param message: The message with the bet keyboard
+    :param lang_id: The language of the keyboard
+    :param bet: The bet to show
+    :return:
+    """
+    key = (message.chat_id, message.message_id)
+    editing = key in _shown_bets
+    _shown_bets[key] = bet
+    if not editing:
+        application.create_task(_edit_bet_keyboard(message, key, lang_id))
+
+
+async def _edit_bet_keyboard(message, key, lang_id):
+    shown = None
+    try:
+        while _shown_bets[key] != shown:
+            shown = _shown_bets[key]
+            try:
+                await message.edit_reply_markup(reply_markup=get_bet_keyboard(shown, lang_id))
+            except BadRequest as e:
+                # e.g. "Message is not modified" or the message was deleted in the meantime
+                logger.debug("Couldn't update the bet keyboard: {}".format(e))
+    finally:
+        del _shown_bets[key]
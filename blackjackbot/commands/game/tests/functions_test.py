@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import unittest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
-from blackjackbot.commands.game.functions import is_button_affiliated
+from blackjackbot.commands.game.functions import is_button_affiliated, is_outdated_button, show_bet_keyboard
 
 
 class GameCommandsFunctionsTest(unittest.TestCase):
@@ -32,6 +33,41 @@ class GameCommandsFunctionsTest(unittest.TestCase):
         self.assertFalse(result)
         update.callback_query.answer.assert_called_once()
 
+    def test_is_outdated_button(self):
+        """Check that only buttons carrying the current action sequence number of the game are accepted"""
+        game = Mock()
+        game.id = 1337694
+        game.action_seq = 5
+        update = Mock()
+
+        update.callback_query.data = "hit_1337694_5"
+        self.assertFalse(is_outdated_button(update, game))
+
+        update.callback_query.data = "hit_1337694_4"
+        self.assertTrue(is_outdated_button(update, game))
+
+        update.callback_query.data = "hit_1337694"
+        self.assertTrue(is_outdated_button(update, game))
+
+    def test_show_bet_keyboard(self):
+        """Taps during a running edit must be merged into one edit showing the latest bet"""
+        async def tap():
+            tasks = []
+            application = Mock()
+            application.create_task = lambda coroutine: tasks.append(asyncio.ensure_future(coroutine))
+            message = Mock(chat_id=-1, message_id=7)
+            message.edit_reply_markup = AsyncMock()
+
+            for bet in (20, 30, 40, 50):
+                show_bet_keyboard(application, message, "en", bet)
+            await asyncio.gather(*tasks)
+            return len(tasks), message.edit_reply_markup.await_args_list
+
+        tasks, edits = asyncio.run(tap())
+        self.assertEqual(1, tasks)
+        self.assertEqual(1, len(edits))
+        self.assertIn("50", str(edits[0].kwargs["reply_markup"]))
+
 
 if __name__ == '__main__':
     unittest.main()
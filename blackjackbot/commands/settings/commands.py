@@ -6,7 +6,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from blackjackbot.lang import translate, get_available_languages, get_language_info
 from blackjackbot.util import build_menu
-from database import Database
+from database import AsyncDatabase
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +24,7 @@ async def language_cmd(update, context):
 
     lang_keyboard = InlineKeyboardMarkup(build_menu(buttons, n_cols=3))
 
-    lang_id = Database().get_lang_id(update.effective_chat.id)
-    await update.message.reply_text(text=translate("select_lang", lang_id), reply_markup=lang_keyboard)
+    await update.message.reply_text(text=translate("select_lang", context.lang_id), reply_markup=lang_keyboard)
 
 
 async def language_callback(update, context):
@@ -40,5 +39,5 @@ async def language_callback(update, context):
     lang_changed_text = translate("lang_changed", lang_id).format(lang.get("display_name"))
     await update.effective_message.edit_text(text=lang_changed_text, reply_markup=None)
 
-    Database().set_lang_id(lang_id=lang_id, chat_id=update.effective_chat.id)
+    await AsyncDatabase().set_lang_id(lang_id=lang_id, chat_id=update.effective_chat.id)
     logger.debug("Language changed to '{}' for user {}".format(lang_id, update.effective_user.id))
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from .functions import remove_inline_keyboard, get_start_keyboard, get_bet_keyboard,get_recharge_keyboard,generate_evaluation_string, html_mention, get_game_keyboard, get_join_keyboard,inlinequery
 from .decorators import admin_method, needs_active_game
-from .commands import stats_cmd, comment_cmd, comment_text, reset_stats_cmd, reset_stats_callback
+from .commands import stats_cmd, top_cmd, comment_cmd, comment_text, reset_stats_cmd, reset_stats_callback, my_chat_member_callback
 
 __all__ = ['remove_inline_keyboard', 'get_start_keyboard','get_recharge_keyboard', 'get_bet_keyboard','generate_evaluation_string', 'html_mention', 'get_game_keyboard', 'get_join_keyboard','inlinequery',
-           'stats_cmd', 'comment_cmd', 'comment_text', 'admin_method', 'needs_active_game', 'reset_stats_cmd', 'reset_stats_callback']
+           'stats_cmd', 'top_cmd', 'comment_cmd', 'comment_text', 'admin_method', 'needs_active_game', 'reset_stats_cmd', 'reset_stats_callback', 'my_chat_member_callback']
@@ -1,26 +1,49 @@
 # -*- coding: utf-8 -*-
 
-from telegram import ForceReply , InlineKeyboardButton, InlineKeyboardMarkup
+import html
+
+from telegram import ChatMember, ForceReply , InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from blackjackbot.lang import translate
 from blackjackbot.util.userstate import UserState
-from database import Database
+from database import AsyncDatabase, Leaderboards, GLOBAL_SCOPE
 from database.statistics import get_user_stats
 
 
-def stats_cmd(update, context):
-    update.message.reply_text(get_user_stats(update.effective_user.id), parse_mode=ParseMode.HTML)
+async def stats_cmd(update, context):
+    await update.message.reply_text(get_user_stats(context.user_row, context.lang_id), parse_mode=ParseMode.HTML)
+
+
+async def top_cmd(update, context):
+    """Shows the leaderboard of the current group or - in private chats or with '/top global' - the global leaderboard"""
+    chat = update.effective_chat
+    translator = context.translator
+
+    if chat.type == "private" or (context.args and context.args[0].lower() == "global"):
+        scope = GLOBAL_SCOPE
+        lines = [translator("top_title_global")]
+    else:
+        scope = chat.id
+        lines = [translator("top_title_chat")]
+
+    entries = await Leaderboards().get_top(scope)
+    if not entries:
+        await update.message.reply_text(translator("top_empty"))
+        return
+
+    for rank, (user_id, first_name, games_played, games_won) in enumerate(entries, start=1):
+        lines.append(translator("top_entry").format(rank, html.escape(first_name or str(user_id)), games_won, games_played))
 
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
 
-def reset_stats_cmd(update, context):
+
+async def reset_stats_cmd(update, context):
     """Asks the user if they want to reset their statistics"""
-    user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    _modify_old_reset_message(context)
+    await _modify_old_reset_message(context)
 
-    db = Database()
-    lang_id = db.get_lang_id(user_id)
+    lang_id = context.lang_id
 
     keyboard = [[
         InlineKeyboardButton(translate("reset_stats_confirm_button"), callback_data='reset_stats_confirm'),
@@ -28,54 +51,52 @@ def reset_stats_cmd(update, context):
         ]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    sent_message = update.message.reply_text(translate("reset_stats_confirm", lang_id), reply_markup=reply_markup)
+    sent_message = await update.message.reply_text(translate("reset_stats_confirm", lang_id), reply_markup=reply_markup)
     reset_message = {"message_id": sent_message.message_id, "chat_id": chat_id}
     context.user_data["reset_messages"] = reset_message
 
 
-def _modify_old_reset_message(context):
+async def _modify_old_reset_message(context):
     """Removes the last saved reset confirmation messages from the chat history"""
     reset_message = context.user_data.get("reset_message", None)
     if reset_message is None:
         return
 
     try:
-        context.bot.edit_message_reply_markup(chat_id=reset_message.get("chat_id"), message_id=reset_message.get("message_id"))
+        await context.bot.edit_message_reply_markup(chat_id=reset_message.get("chat_id"), message_id=reset_message.get("message_id"))
     except:
         pass
 
     context.user_data["reset_messages"] = None
 
 
-def reset_stats_callback(update, context):
+async def reset_stats_callback(update, context):
     """Handler for confirmation of statistics reset"""
     query = update.callback_query
-    query.answer()
+    await query.answer()
 
     user_id = update.effective_user.id
-    db = Database()
-    lang_id = db.get_lang_id(user_id)
+    lang_id = context.lang_id
 
     if query.data == "reset_stats_confirm":
-        db.reset_stats(user_id=user_id)
-        query.edit_message_text(translate("reset_stats_executed", lang_id))
+        await AsyncDatabase().reset_stats(user_id=user_id)
+        await query.edit_message_text(translate("reset_stats_executed", lang_id))
 
     elif query.data == "reset_stats_cancel":
-        query.edit_message_text(translate("reset_stats_cancelled", lang_id))
+        await query.edit_message_text(translate("reset_stats_cancelled", lang_id))
 
 
-def comment_cmd(update, context):
+async def comment_cmd(update, context):
     """MessageHandler callback for the /comment command"""
     if context.user_data.get("state", UserState.IDLE) != UserState.IDLE:
         return
 
-    chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
-    update.message.reply_text(translate("send_comment", lang_id), reply_markup=ForceReply())
+    lang_id = context.lang_id
+    await update.message.reply_text(translate("send_comment", lang_id), reply_markup=ForceReply())
     context.user_data["state"] = UserState.COMMENTING
 
 
-def comment_text(update, context):
+async def comment_text(update, context):
     """
     MessageHandler callback for processing comments sent by a user.
     Notifies the admins of the bot about the comment
@@ -86,7 +107,7 @@ def comment_text(update, context):
 
     user = update.effective_user
     chat = update.effective_chat
-    lang_id = Database().get_lang_id(chat.id)
+    lang_id = context.lang_id
 
     # username can be None, so we need to use str()
     data = [chat.id, user.id, user.first_name, user.last_name, "@" + str(user.username), user.language_code]
@@ -96,6 +117,12 @@ def comment_text(update, context):
 
     text = update.effective_message.text
 
-    update.message.reply_text(translate("received_comment", lang_id))
+    await update.message.reply_text(translate("received_comment", lang_id))
 
     context.user_data["state"] = UserState.IDLE
+
+
+async def my_chat_member_callback(update, context):
+    """Archives the settings of chats which removed or blocked the bot"""
+    if update.my_chat_member.new_chat_member.status in (ChatMember.LEFT, ChatMember.BANNED):
+        await AsyncDatabase().archive_chat(update.effective_chat.id)
@@ -118,15 +118,16 @@ def generate_evaluation_string(game, lang_id):
         return _generate_evaluation_string_mp(game, lang_id)
 
 
-def get_game_keyboard(game_id, lang_id):
+def get_game_keyboard(game_id, lang_id, action_seq):
     """Generates a game keyboard translated into the given language
     :param game_id: A unique identifier for each game
     :param lang_id: The language identifier for a specific chat
+    :param action_seq: The current action sequence number of the game, used to detect presses of outdated buttons
     :return:
     """
     translator = Translator(lang_id)
-    one_more_button = InlineKeyboardButton(text=translator("inline_keyboard_hit"), callback_data="hit_{}".format(game_id))
-    no_more_button = InlineKeyboardButton(text=translator("inline_keyboard_stand"), callback_data="stand_{}".format(game_id))
+    one_more_button = InlineKeyboardButton(text=translator("inline_keyboard_hit"), callback_data="hit_{}_{}".format(game_id, action_seq))
+    no_more_button = InlineKeyboardButton(text=translator("inline_keyboard_stand"), callback_data="stand_{}_{}".format(game_id, action_seq))
     stop_button = InlineKeyboardButton(text="Stop", callback_data="stop_{}".format(game_id))
     return InlineKeyboardMarkup(inline_keyboard=[[one_more_button, no_more_button]])
 
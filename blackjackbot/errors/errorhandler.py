@@ -2,7 +2,6 @@
 import logging
 
 from telegram.error import BadRequest, TimedOut, NetworkError, ChatMigrated, TelegramError
-from blackjackbot.gamestore import GameStore
 
 logger = logging.getLogger(__name__)
 
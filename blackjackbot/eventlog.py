@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only log of all state-changing game actions. Together with the last snapshot it allows to recover all games after a crash.
+Each record is framed as [length][crc32][body]. Records are buffered in memory and written + fsynced in groups by a background thread.
+"""
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+
+import blackjack.errors as errors
+from blackjack.game import dump_game, load_game, SerializationError
+
+logger = logging.getLogger(__name__)
+
+RECORD_CREATE = 1
+RECORD_ACTION = 2
+RECORD_REMOVE = 3
+
+ACTIONS = ["add_player", "start", "draw_card", "next_player", "stop"]
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS, start=1)}
+
+# length, crc32 of the body
+_FRAME = struct.Struct("<II")
+# record type, chat_id
+_RECORD = struct.Struct("<Bq")
+# record type, chat_id, action code
+_ACTION = struct.Struct("<BqB")
+_USER_ID = struct.Struct("<q")
+# user_id, bet
+_SEAT = struct.Struct("<qq")
+
+_SEGMENT_NAME = "events-{:08d}.log"
+_SEGMENT_PATTERN = re.compile(r"^events-(\d{8})\.log$")
+
+_GAME_ERRORS = tuple(getattr(errors, name) for name in errors.__all__)
+
+
+def _frame(body):
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _get_arg(args, kwargs, index, name, *default):
+    if len(args) > index:
+        return args[index]
+    if default:
+        return kwargs.get(name, default[0])
+    return kwargs[name]
+
+
+def encode_create(game):
+    return _frame(_RECORD.pack(RECORD_CREATE, game.chat_id) + dump_game(game))
+
+
+def encode_remove(chat_id):
+    return _frame(_RECORD.pack(RECORD_REMOVE, chat_id))
+
+
+def encode_action(chat_id, action, args, kwargs):
+    header = _ACTION.pack(RECORD_ACTION, chat_id, _ACTION_CODES[action])
+
+    if action == "add_player":
+        first_name = _get_arg(args, kwargs, 1, "first_name").encode("utf-8")
+        seat = _SEAT.pack(_get_arg(args, kwargs, 0, "user_id"), _get_arg(args, kwargs, 3, "bet", 0))
+        return _frame(header + seat + first_name)
+    if action in ("start", "stop"):
+        return _frame(header + _USER_ID.pack(_get_arg(args, kwargs, 0, "user_id")))
+    return _frame(header)
+
+
+def list_segments(directory):
+    """Returns a sorted list of (segment number, path) tuples of all log segments in a directory"""
+    segments = []
+    for name in os.listdir(directory):
+        match = _SEGMENT_PATTERN.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_records(path):
+    """
+    Yields the bodies of all records of a log segment. Reading stops at the first incomplete or corrupt record,
+    which is what a crash in the middle of a write leaves behind.
+    :param path: Path of the log segment
+    :return:
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        body = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if len(body) != length or zlib.crc32(body) != checksum:
+            logger.warning("Ignoring corrupt tail of event log '{}' at offset {}".format(path, offset))
+            return
+        yield body
+        offset += _FRAME.size + length
+
+
+def apply_record(games, body):
+    """
+    Applies a single log record to a dict of games
+    :param games: dict of chat_id -> BlackJackGame
+    :param body: Body of a log record
+    :return:
+    """
+    record_type, chat_id = _RECORD.unpack_from(body, 0)
+
+    if record_type == RECORD_CREATE:
+        games[chat_id] = load_game(body[_RECORD.size:])
+        return
+    if record_type == RECORD_REMOVE:
+        games.pop(chat_id, None)
+        return
+
+    game = games.get(chat_id)
+    if game is None:
+        return
+
+    action = ACTIONS[body[_RECORD.size] - 1]
+    payload = body[_ACTION.size:]
+    try:
+        if action == "add_player":
+            user_id, bet = _SEAT.unpack_from(payload, 0)
+            # The balance has already been checked when the action was executed originally
+            game.seat_player(user_id, payload[_SEAT.size:].decode("utf-8"), bet=bet)
+        elif action == "start":
+            game.start(_USER_ID.unpack_from(payload, 0)[0])
+        elif action == "stop":
+            game.stop(_USER_ID.unpack_from(payload, 0)[0])
+        else:
+            getattr(game, action)()
+    except _GAME_ERRORS:
+        # Exceptions such as PlayerBustedException are part of the regular game flow
+        pass
+
+
+def replay(directory, games, start_segment=0):
+    """
+    Replays all log segments starting with start_segment on top of the games of a snapshot
+    :param directory: The directory containing the log segments
+    :param games: dict of chat_id -> BlackJackGame, which gets modified in place
+    :param start_segment: The first segment which is not contained in the snapshot yet
+    :return: The amount of replayed records
+    """
+    if not os.path.isdir(directory):
+        return 0
+
+    replayed = 0
+    for segment, path in list_segments(directory):
+        if segment < start_segment:
+            continue
+        for body in read_records(path):
+            try:
+                apply_record(games, body)
+            except (struct.error, IndexError, SerializationError) as e:
+                logger.error("Can't replay record from '{}': {}".format(path, e))
+            replayed += 1
+    return replayed
+
+
+class EventLog(object):
+    """Writes game actions to log segments. Writes are group committed by a background thread every flush_interval seconds."""
+
+    def __init__(self, directory, flush_interval=0.05):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+
+        # Never append to an existing segment - its tail might be corrupt after a crash
+        segments = list_segments(directory)
+        self.segment = segments[-1][0] + 1 if segments else 1
+
+        self._file = open(self._segment_path(self.segment), "ab")
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="EventLogWriter", daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, _SEGMENT_NAME.format(segment))
+
+    def _append(self, data):
+        with self._lock:
+            self._buffer.append(data)
+
+    def log_create(self, game):
+        self._append(encode_create(game))
+
+    def log_action(self, game, action, args, kwargs):
+        self._append(encode_action(game.chat_id, action, args, kwargs))
+
+    def log_remove(self, chat_id):
+        self._append(encode_remove(chat_id))
+
+    def rotate(self):
+        """
+        Starts a new log segment. Must be called on the event loop right before a snapshot is captured.
+        :return: The number of the new segment, which is the first segment not contained in the snapshot
+        """
+        with self._lock:
+            self.segment += 1
+            # Integers in the buffer mark the switch to a new segment
+            self._buffer.append(self.segment)
+            return self.segment
+
+    def compact(self, segment):
+        """
+        Deletes all log segments older than segment, e.g. after a snapshot containing them has been written
+        :param segment: The first segment which is still needed
+        :return:
+        """
+        for number, path in list_segments(self.directory):
+            if number >= segment:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error("Couldn't remove log segment '{}': {}".format(path, e))
+
+    def flush(self):
+        """Writes and fsyncs all buffered records"""
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+
+        chunk = []
+        for item in buffer:
+            if isinstance(item, int):
+                self._write(chunk)
+                chunk = []
+                self._file.close()
+                self._file = open(self._segment_path(item), "ab")
+            else:
+                chunk.append(item)
+        self._write(chunk)
+
+    def _write(self, chunk):
+        if not chunk:
+            return
+        self._file.write(b"".join(chunk))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("Couldn't write event log: {}".format(e))
+
+    def close(self):
+        """Writes all remaining records and stops the background thread"""
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
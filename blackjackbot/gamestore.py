@@ -3,8 +3,10 @@ import logging
 from datetime import datetime, timedelta
 from random import randint
 
+from blackjack.game import BlackJackGame
 from .errors.noactivegameexception import NoActiveGameException
-import database.statistics
+from .storage import MemoryBackend
+from database import ActivityCounters, Leaderboards, Ledger, PnlRollups, StatisticsBuffer
 
 
 class GameStore(object):
@@ -18,41 +20,129 @@ class GameStore(object):
 
     def __init__(self):
         if not self._initialized:
-            self._chat_dict = {}
-            self._game_dict = {}
+            self._backend = MemoryBackend()
+            self._event_log = None
+            self._hand_history = None
             self.logger = logging.getLogger(__name__)
             self._initialized = True
 
+    def set_backend(self, backend):
+        """
+        Replaces the storage backend of the GameStore. Games stored in the previous backend are not migrated.
+        :param backend: A GameStoreBackend instance, e.g. a SQLiteBackend to share games between several processes
+        :return:
+        """
+        self._backend.close()
+        self._backend = backend
+
+    def set_event_log(self, event_log):
+        """
+        Sets an EventLog which records every change of the games in the store, so that they can be recovered after a crash
+        :param event_log: An EventLog instance or None to disable logging
+        :return:
+        """
+        self._event_log = event_log
+
+    def set_hand_history(self, hand_history):
+        """
+        Sets a HandHistory which stores the hands of every finished game for later analysis
+        :param hand_history: A HandHistory instance or None to disable recording
+        :return:
+        """
+        self._hand_history = hand_history
+
     @staticmethod
     def _generate_id():
         return randint(1000000, 9999999)
 
+    def _attach(self, game):
+        """Registers the GameStore's handlers on a game"""
+        game.register_on_stop_handler(self._game_stopped_callback)
+        game.register_on_action_handler(self._game_action_callback)
+
     def add_game(self, chat_id, game):
         if self.has_game(chat_id):
             raise Exception
 
         game.id = self._generate_id()
-        while self._game_dict.get(game.id, None):
+        while self._backend.has_game_id(game.id):
             game.id = self._generate_id()
 
         self.logger.info("Adding game with id {}".format(game.id))
-        game.register_on_stop_handler(self._game_stopped_callback)
-        self._chat_dict[chat_id] = game
-        self._game_dict[game.id] = chat_id
+        game.chat_id = chat_id
+        self._attach(game)
+        self._backend.add_game(chat_id, game)
+        self._index_players(game)
+        if self._event_log is not None:
+            self._event_log.log_create(game)
+
+    def restore_game(self, game):
+        """
+        Adds a game which was restored (e.g. from a snapshot) to the store, keeping its game.id and game.chat_id
+        :param game: The restored BlackJackGame object
+        :return:
+        """
+        if self.has_game(game.chat_id) or self._backend.has_game_id(game.id):
+            self.logger.warning("Not restoring game {} for {}, because it's already existing!".format(game.id, game.chat_id))
+            return
+
+        self._attach(game)
+        self._backend.add_game(game.chat_id, game)
+        self._index_players(game)
+
+    def get_games(self):
+        """Returns a list of all games in the store"""
+        return [game for _, game in self._backend.games()]
+
+    def _index_players(self, game):
+        """Updates the user_id -> game index for all players of a game"""
+        for player in game.players:
+            self._backend.index_player(player.user_id, game.chat_id)
 
     def get_game(self, chat_id):
         """
-
-        :param chat_id:
-        :return:
+        Returns the game of a certain chat
+        :param chat_id: The chat_id of a certain Telegram chat
+        :return: The BlackJackGame object of the chat
         """
-        game = self._chat_dict.get(chat_id)
+        game = self._backend.get_game(chat_id)
         if game is None:
             raise NoActiveGameException
+
+        if not self._backend.stores_objects:
+            # Games loaded from a shared backend are fresh objects without any handlers
+            self._attach(game)
         return game
 
     def has_game(self, chat_id):
-        return chat_id in self._chat_dict
+        return self._backend.has_game(chat_id)
+
+    def get_game_by_id(self, game_id):
+        """
+        Returns the game with a certain game_id
+        :param game_id: The unique id of a game
+        :return: The BlackJackGame object with the given id
+        """
+        chat_id = self._backend.get_chat_id(game_id)
+        if chat_id is None:
+            raise NoActiveGameException
+        return self.get_game(chat_id)
+
+    def get_game_by_user(self, user_id):
+        """
+        Returns the game a certain user is currently playing in
+        :param user_id: The user_id of a Telegram user
+        :return: The BlackJackGame object the user is a player of
+        """
+        chat_id = self._backend.get_chat_id_by_user(user_id)
+        if chat_id is None:
+            raise NoActiveGameException
+        return self.get_game(chat_id)
+
+    def is_playing_elsewhere(self, user_id, chat_id):
+        """Checks if a user is already sitting at the table of a chat other than the given one"""
+        playing_chat_id = self._backend.get_chat_id_by_user(user_id)
+        return playing_chat_id is not None and playing_chat_id != chat_id
 
     def remove_game(self, chat_id):
         """
@@ -63,12 +153,28 @@ class GameStore(object):
         if chat_id == -1:
             return
 
-        try:
-            game = self._chat_dict.pop(chat_id)
-            self._game_dict.pop(game.id)
-            self.logger.debug("Removing game for {} ({})".format(chat_id, game.id))
-        except KeyError:
+        game = self._backend.remove_game(chat_id)
+        if game is None:
             self.logger.error("Can't remove game for {}, because there is no such game!".format(chat_id))
+            return
+        self.logger.debug("Removing game for {} ({})".format(chat_id, game.id))
+        if self._event_log is not None:
+            self._event_log.log_remove(chat_id)
+
+    def _game_action_callback(self, game, action, args, kwargs):
+        """
+        Callback to store the new state of a game after each action
+        :param game:
+        :param action:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        self._backend.save_game(game.chat_id, game)
+        if self._event_log is not None:
+            self._event_log.log_action(game, action, args, kwargs)
+        if action == "add_player":
+            self._index_players(game)
 
     def _game_stopped_callback(self, game):
         """
@@ -76,22 +182,29 @@ class GameStore(object):
         :param game:
         :return:
         """
+        statistics = StatisticsBuffer()
+        leaderboards = Leaderboards()
+        activity = ActivityCounters()
+        group = game.type != BlackJackGame.Type.SINGLEPLAYER
         for player in game.players:
-            database.statistics.add_game_played(player.user_id)
-            if player in game.list_won:
-                database.statistics.set_game_won(player.user_id)
-        self.remove_game(self._game_dict[game.id])
-
-        self.logger.debug("Current games: {}".format(len(self._chat_dict)))
+            won = player in game.list_won
+            statistics.add_game(player.user_id, won=won)
+            leaderboards.add_game(game.chat_id, player.user_id, player.first_name, won, group=group)
+            activity.add_player(player.user_id)
+        Ledger().record_game(game)
+        PnlRollups().record_game(game)
+        if self._hand_history is not None:
+            self._hand_history.record_game(game)
+        self.remove_game(game.chat_id)
+
+        self.logger.debug("Current games: {}".format(self._backend.count()))
 
     def cleanup_stale_games(self):
         stale_timeout_min = 10
         now = datetime.now()
         remove_chat_ids = []
 
-        for game_id, chat_id in self._game_dict.items():
-            game = self.get_game(chat_id)
-
+        for chat_id, game in self._backend.games():
             game_older_than_10_mins = game.datetime_started < (now - timedelta(minutes=stale_timeout_min))
             if game_older_than_10_mins:
                 print("Killing game with id {} because it's stale for > {} mins".format(game.id, stale_timeout_min))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Loads the data most handlers need once per update, so that decorators and handlers don't query it again and again"""
+from telegram.ext import CallbackContext
+
+from blackjackbot.errors import NoActiveGameException
+from blackjackbot.gamestore import GameStore
+from blackjackbot.lang import Translator
+from database import AsyncDatabase, BetBuffer, UserDirectory
+
+
+class RequestContext(CallbackContext):
+    """
+    CallbackContext which additionally holds the chat's language, a translator, the user's database row and bet
+    and the chat's active game. PTB creates one context per update, which is shared by all handler groups.
+    """
+
+    def __init__(self, application, chat_id=None, user_id=None):
+        super(RequestContext, self).__init__(application, chat_id=chat_id, user_id=user_id)
+        self.lang_id = "en"
+        self.translator = Translator(lang_id=self.lang_id)
+        self.user_row = None
+        self.bet = 0
+        self.game = None
+        self.loaded = False
+
+
+async def load_request_context(update, context):
+    """
+    TypeHandler callback which runs in an early handler group and fills the RequestContext for all later handlers
+    :param update: PTB update object
+    :param context: RequestContext object
+    :return:
+    """
+    chat = update.effective_chat
+    user = update.effective_user
+    chat_id = chat.id if chat is not None else None
+    user_id = user.id if user is not None else None
+
+    # Inline queries have no chat - fall back to the user's private chat
+    lang_chat_id = chat_id if chat_id is not None else user_id
+    context.lang_id, context.user_row, context.bet = await AsyncDatabase().get_request_data(lang_chat_id, user_id)
+    if context.user_row is not None:
+        UserDirectory().remember_row(context.user_row)
+    if user_id is not None:
+        # A bet which is being adjusted right now is newer than the stored one
+        working_bet = BetBuffer().get_bet(user_id)
+        if working_bet is not None:
+            context.bet = working_bet
+    context.translator = Translator(lang_id=context.lang_id)
+
+    if chat_id is not None:
+        try:
+            context.game = GameStore().get_game(chat_id)
+        except NoActiveGameException:
+            context.game = None
+
+    context.loaded = True
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Binary snapshots of all live games, so that running games survive a restart of the bot"""
+import gc
+import logging
+import os
+import struct
+import threading
+
+from blackjack.game import dump_game, load_game, SerializationError
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"BJSS"
+SNAPSHOT_VERSION = 2
+
+# magic, version, first event log segment not contained in the snapshot, amount of games
+_HEADER = struct.Struct("<4sBQI")
+_LENGTH = struct.Struct("<I")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def dump_snapshot(games, log_segment=0):
+    """
+    Serializes a list of games into a snapshot
+    :param games: Iterable of BlackJackGame objects
+    :param log_segment: The first event log segment which has to be replayed on top of this snapshot
+    :return: bytes containing the snapshot
+    """
+    parts = [b""]
+    pack_length = _LENGTH.pack
+    for game in games:
+        data = dump_game(game)
+        parts.append(pack_length(len(data)))
+        parts.append(data)
+    parts[0] = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, log_segment, (len(parts) - 1) // 2)
+    return b"".join(parts)
+
+
+def load_snapshot(data):
+    """
+    Restores the games of a snapshot
+    :param data: bytes generated by dump_snapshot
+    :return: Tuple of a list of BlackJackGame objects without any registered handlers and the first event log segment to replay
+    """
+    try:
+        magic, version, log_segment, amount = _HEADER.unpack_from(data, 0)
+    except struct.error as e:
+        raise SnapshotError("Snapshot is too short") from e
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotError("Unsupported snapshot format: {} v{}".format(magic, version))
+
+    games = []
+    offset = _HEADER.size
+    unpack_length = _LENGTH.unpack_from
+    # Loading creates lots of objects, which would trigger many needless garbage collection runs
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(amount):
+            length, = unpack_length(data, offset)
+            offset += _LENGTH.size
+            games.append(load_game(data[offset:offset + length]))
+            offset += length
+    except (struct.error, SerializationError) as e:
+        raise SnapshotError("Snapshot is truncated or corrupt") from e
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return games, log_segment
+
+
+def write_snapshot(path, data):
+    """
+    Atomically replaces the snapshot file at path with data. Readers either see the old or the new snapshot, never a partial one.
+    :param path: Path of the snapshot file
+    :param data: bytes generated by dump_snapshot
+    :return:
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # Persist the rename itself
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def read_snapshot(path):
+    """
+    Reads the games of the snapshot file at path
+    :param path: Path of the snapshot file
+    :return: Tuple of a list of BlackJackGame objects and the first event log segment to replay - ([], 0) if there is no snapshot
+    """
+    if not os.path.exists(path):
+        return [], 0
+
+    with open(path, "rb") as f:
+        return load_snapshot(f.read())
+
+
+class SnapshotWriter(object):
+    """Writes snapshots on a background thread, so that the event loop never waits for the disk"""
+
+    def __init__(self, path, on_written=None):
+        """
+        :param path: Path of the snapshot file
+        :param on_written: Optional callback, which receives the log_segment of each snapshot after it has been written (e.g. for log compaction)
+        """
+        self.path = path
+        self.on_written = on_written
+        self._pending = None
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="SnapshotWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, data, log_segment=0):
+        """
+        Queues a snapshot for writing. Snapshots which were not written yet are replaced by the newer one.
+        :param data: bytes generated by dump_snapshot
+        :param log_segment: The log_segment the snapshot was created with
+        :return:
+        """
+        with self._condition:
+            self._pending = (data, log_segment)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                pending, self._pending = self._pending, None
+                if pending is None:
+                    return
+
+            data, log_segment = pending
+            try:
+                write_snapshot(self.path, data)
+            except OSError as e:
+                logger.error("Couldn't write snapshot to '{}': {}".format(self.path, e))
+                continue
+
+            if self.on_written is not None:
+                self.on_written(log_segment)
+
+    def stop(self):
+        """Writes the remaining snapshot and stops the background thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from .backend import GameStoreBackend
+from .memorybackend import MemoryBackend
+from .sqlitebackend import SQLiteBackend
+from .keyvaluebackend import KeyValueBackend, KeyValueError
+
+__all__ = ['GameStoreBackend', 'MemoryBackend', 'SQLiteBackend', 'KeyValueBackend', 'KeyValueError']
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+
+class GameStoreBackend(object):
+    """
+    Interface for the storage backends of the GameStore. Backends store games by the chat_id of the chat they are played in
+    and keep track of the game_ids in use.
+    """
+    # True, if the backend hands out the very same game objects it was given instead of (de)serialized copies
+    stores_objects = False
+
+    def add_game(self, chat_id, game):
+        """
+        Stores a new game for a chat
+        :param chat_id: The chat_id of the chat the game is played in
+        :param game: The BlackJackGame object with a unique game.id set
+        :return:
+        """
+        raise NotImplementedError
+
+    def get_game(self, chat_id):
+        """
+        Returns the game of a chat or None if there is no game for that chat
+        :param chat_id: The chat_id of a certain Telegram chat
+        :return:
+        """
+        raise NotImplementedError
+
+    def save_game(self, chat_id, game):
+        """
+        Stores the current state of an existing game. Games which were removed in the meantime are not stored again.
+        :param chat_id: The chat_id of the chat the game is played in
+        :param game: The BlackJackGame object
+        :return:
+        """
+        raise NotImplementedError
+
+    def remove_game(self, chat_id):
+        """
+        Removes the game of a chat
+        :param chat_id: The chat_id of a certain Telegram chat
+        :return: The removed game or None if there was no game for that chat
+        """
+        raise NotImplementedError
+
+    def has_game(self, chat_id):
+        raise NotImplementedError
+
+    def has_game_id(self, game_id):
+        raise NotImplementedError
+
+    def get_chat_id(self, game_id):
+        """Returns the chat_id of the chat a game with a certain game_id is played in or None"""
+        raise NotImplementedError
+
+    def index_player(self, user_id, chat_id):
+        """Marks a user as player of the game in a certain chat"""
+        raise NotImplementedError
+
+    def get_chat_id_by_user(self, user_id):
+        """Returns the chat_id of the game a user is playing in or None"""
+        raise NotImplementedError
+
+    def games(self):
+        """Returns an iterable of (chat_id, game) tuples of all stored games"""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import socket
+import threading
+
+from blackjack.game import dump_game, load_game
+from .backend import GameStoreBackend
+
+
+class KeyValueError(Exception):
+    pass
+
+
+class RespConnection(object):
+    """Minimal client for the Redis serialization protocol (RESP) - only supports what the KeyValueBackend needs"""
+
+    def __init__(self, host="127.0.0.1", port=6379, timeout=5):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(*args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise KeyValueError("Connection closed by server")
+
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise KeyValueError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise KeyValueError("Unknown reply type: {}".format(line))
+
+    def execute(self, *args):
+        with self._lock:
+            self._sock.sendall(self._encode(*args))
+            return self._read_reply()
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class KeyValueBackend(GameStoreBackend):
+    """
+    Stores serialized games on a networked key-value server speaking the Redis protocol (e.g. Redis itself),
+    so that bot processes on several hosts can serve the same chats
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, prefix="blackjack:"):
+        self.connection = RespConnection(host, port)
+        self.prefix = prefix
+
+    def _chat_key(self, chat_id):
+        return "{}chat:{}".format(self.prefix, chat_id)
+
+    def _game_id_key(self, game_id):
+        return "{}gameid:{}".format(self.prefix, game_id)
+
+    def add_game(self, chat_id, game):
+        # Reserve the game_id first, so that two processes can never hand out the same id
+        if self.connection.execute("SET", self._game_id_key(game.id), chat_id, "NX") is None:
+            raise KeyValueError("Game id {} is already in use".format(game.id))
+
+        if self.connection.execute("SET", self._chat_key(chat_id), dump_game(game), "NX") is None:
+            self.connection.execute("DEL", self._game_id_key(game.id))
+            raise KeyValueError("There is already a game for chat {}".format(chat_id))
+
+    def get_game(self, chat_id):
+        data = self.connection.execute("GET", self._chat_key(chat_id))
+        if data is None:
+            return None
+        return load_game(data)
+
+    def save_game(self, chat_id, game):
+        self.connection.execute("SET", self._chat_key(chat_id), dump_game(game), "XX")
+
+    def remove_game(self, chat_id):
+        game = self.get_game(chat_id)
+        if game is None:
+            return None
+
+        user_keys = [self._user_key(player.user_id) for player in game.players]
+        self.connection.execute("DEL", self._chat_key(chat_id), self._game_id_key(game.id), *user_keys)
+        return game
+
+    def has_game(self, chat_id):
+        return self.connection.execute("EXISTS", self._chat_key(chat_id)) == 1
+
+    def has_game_id(self, game_id):
+        return self.connection.execute("EXISTS", self._game_id_key(game_id)) == 1
+
+    def get_chat_id(self, game_id):
+        chat_id = self.connection.execute("GET", self._game_id_key(game_id))
+        if chat_id is None:
+            return None
+        return int(chat_id)
+
+    def _user_key(self, user_id):
+        return "{}user:{}".format(self.prefix, user_id)
+
+    def _chat_keys(self):
+        cursor = "0"
+        pattern = self._chat_key("*")
+        while True:
+            cursor, keys = self.connection.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 500)
+            cursor = cursor.decode("utf-8")
+            yield from keys
+            if cursor == "0":
+                return
+
+    def index_player(self, user_id, chat_id):
+        self.connection.execute("SET", self._user_key(user_id), chat_id)
+
+    def get_chat_id_by_user(self, user_id):
+        chat_id = self.connection.execute("GET", self._user_key(user_id))
+        if chat_id is None:
+            return None
+        return int(chat_id)
+
+    def games(self):
+        chat_key_prefix = len(self._chat_key(""))
+        result = []
+        for key in self._chat_keys():
+            data = self.connection.execute("GET", key)
+            if data is not None:
+                result.append((int(key[chat_key_prefix:]), load_game(data)))
+        return result
+
+    def count(self):
+        return sum(1 for _ in self._chat_keys())
+
+    def close(self):
+        self.connection.close()
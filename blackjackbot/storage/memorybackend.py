@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from .backend import GameStoreBackend
+
+
+class MemoryBackend(GameStoreBackend):
+    """Stores the game objects in dicts of the current process"""
+    stores_objects = True
+
+    def __init__(self):
+        self._chat_dict = {}
+        self._game_dict = {}
+        self._user_dict = {}
+
+    def add_game(self, chat_id, game):
+        self._chat_dict[chat_id] = game
+        self._game_dict[game.id] = chat_id
+
+    def get_game(self, chat_id):
+        return self._chat_dict.get(chat_id)
+
+    def save_game(self, chat_id, game):
+        # The stored object is the game itself, so there is nothing to save
+        pass
+
+    def remove_game(self, chat_id):
+        game = self._chat_dict.pop(chat_id, None)
+        if game is not None:
+            self._game_dict.pop(game.id, None)
+            for player in game.players:
+                if self._user_dict.get(player.user_id) == chat_id:
+                    del self._user_dict[player.user_id]
+        return game
+
+    def has_game(self, chat_id):
+        return chat_id in self._chat_dict
+
+    def has_game_id(self, game_id):
+        return game_id in self._game_dict
+
+    def get_chat_id(self, game_id):
+        return self._game_dict.get(game_id)
+
+    def index_player(self, user_id, chat_id):
+        self._user_dict[user_id] = chat_id
+
+    def get_chat_id_by_user(self, user_id):
+        return self._user_dict.get(user_id)
+
+    def games(self):
+        return list(self._chat_dict.items())
+
+    def count(self):
+        return len(self._chat_dict)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+from blackjack.game import dump_game, load_game
+from .backend import GameStoreBackend
+
+
+class SQLiteBackend(GameStoreBackend):
+    """Stores serialized games in a SQLite file, which can be shared by several bot processes on the same host"""
+
+    def __init__(self, database_path):
+        self.connection = sqlite3.connect(database_path, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS 'games'"
+                                "('chat_id' INTEGER NOT NULL,"
+                                "'game_id' INTEGER NOT NULL UNIQUE,"
+                                "'data' BLOB NOT NULL,"
+                                "PRIMARY KEY('chat_id'));")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS 'game_players'"
+                                "('user_id' INTEGER NOT NULL,"
+                                "'chat_id' INTEGER NOT NULL,"
+                                "PRIMARY KEY('user_id'));")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS 'game_players_chat_id' ON 'game_players' ('chat_id');")
+        self.connection.commit()
+
+    def add_game(self, chat_id, game):
+        with self.connection:
+            self.connection.execute("INSERT INTO games (chat_id, game_id, data) VALUES (?, ?, ?);", (chat_id, game.id, dump_game(game)))
+
+    def get_game(self, chat_id):
+        row = self.connection.execute("SELECT data FROM games WHERE chat_id=?;", (chat_id,)).fetchone()
+        if row is None:
+            return None
+        return load_game(row[0])
+
+    def save_game(self, chat_id, game):
+        with self.connection:
+            self.connection.execute("UPDATE games SET data=? WHERE chat_id=?;", (dump_game(game), chat_id))
+
+    def remove_game(self, chat_id):
+        with self.connection:
+            rows = self.connection.execute("DELETE FROM games WHERE chat_id=? RETURNING data;", (chat_id,)).fetchall()
+            self.connection.execute("DELETE FROM game_players WHERE chat_id=?;", (chat_id,))
+        if not rows:
+            return None
+        return load_game(rows[0][0])
+
+    def has_game(self, chat_id):
+        return self.connection.execute("SELECT 1 FROM games WHERE chat_id=?;", (chat_id,)).fetchone() is not None
+
+    def has_game_id(self, game_id):
+        return self.get_chat_id(game_id) is not None
+
+    def get_chat_id(self, game_id):
+        row = self.connection.execute("SELECT chat_id FROM games WHERE game_id=?;", (game_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def index_player(self, user_id, chat_id):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO game_players (user_id, chat_id) VALUES (?, ?);", (user_id, chat_id))
+
+    def get_chat_id_by_user(self, user_id):
+        row = self.connection.execute("SELECT chat_id FROM game_players WHERE user_id=?;", (user_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def games(self):
+        rows = self.connection.execute("SELECT chat_id, data FROM games;").fetchall()
+        return [(chat_id, load_game(data)) for chat_id, data in rows]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM games;").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
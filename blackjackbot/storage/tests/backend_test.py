@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from blackjack.game import BlackJackGame
+from blackjackbot.storage import MemoryBackend, SQLiteBackend, KeyValueBackend
+from blackjackbot.storage.tests.keyvalueserver import KeyValueServer
+
+
+class BackendTestMixin(object):
+    """Tests which every GameStoreBackend must pass"""
+
+    def create_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.create_backend()
+
+    def tearDown(self):
+        self.backend.close()
+
+    @staticmethod
+    def _create_game(game_id, chat_id):
+        game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+        game.id = game_id
+        game.chat_id = chat_id
+        game.add_player(user_id=111, first_name="Player 111")
+        return game
+
+    def test_add_get(self):
+        game = self._create_game(1000001, -123)
+        self.backend.add_game(-123, game)
+
+        self.assertTrue(self.backend.has_game(-123))
+        self.assertTrue(self.backend.has_game_id(1000001))
+        self.assertEqual(-123, self.backend.get_chat_id(1000001))
+        self.assertEqual(1, self.backend.count())
+
+        loaded = self.backend.get_game(-123)
+        self.assertEqual(1000001, loaded.id)
+        self.assertEqual([111], [p.user_id for p in loaded.players])
+
+    def test_get_missing(self):
+        self.assertIsNone(self.backend.get_game(42))
+        self.assertFalse(self.backend.has_game(42))
+        self.assertFalse(self.backend.has_game_id(1000001))
+        self.assertIsNone(self.backend.get_chat_id(1000001))
+
+    def test_save(self):
+        game = self._create_game(1000001, -123)
+        self.backend.add_game(-123, game)
+
+        game.add_player(user_id=222, first_name="Player 222")
+        self.backend.save_game(-123, game)
+        self.assertEqual([111, 222], [p.user_id for p in self.backend.get_game(-123).players])
+
+    def test_save_removed(self):
+        """Saving a game which has been removed in the meantime must not store it again"""
+        game = self._create_game(1000001, -123)
+        self.backend.add_game(-123, game)
+        self.backend.remove_game(-123)
+
+        self.backend.save_game(-123, game)
+        self.assertFalse(self.backend.has_game(-123))
+
+    def test_remove(self):
+        self.backend.add_game(-123, self._create_game(1000001, -123))
+        self.backend.add_game(-456, self._create_game(1000002, -456))
+
+        removed = self.backend.remove_game(-123)
+        self.assertEqual(1000001, removed.id)
+        self.assertFalse(self.backend.has_game(-123))
+        self.assertFalse(self.backend.has_game_id(1000001))
+        self.assertIsNone(self.backend.remove_game(-123))
+        self.assertEqual([(-456, 1000002)], [(chat_id, game.id) for chat_id, game in self.backend.games()])
+
+    def test_player_index(self):
+        game = self._create_game(1000001, -123)
+        self.backend.add_game(-123, game)
+        self.backend.index_player(111, -123)
+        self.backend.index_player(222, -123)
+
+        self.assertEqual(-123, self.backend.get_chat_id_by_user(111))
+        self.assertEqual(-123, self.backend.get_chat_id_by_user(222))
+        self.assertIsNone(self.backend.get_chat_id_by_user(333))
+
+    def test_player_index_remove(self):
+        """Removing a game must remove its players from the index"""
+        game = self._create_game(1000001, -123)
+        game.add_player(user_id=222, first_name="Player 222")
+        self.backend.add_game(-123, game)
+        self.backend.index_player(111, -123)
+        self.backend.index_player(222, -123)
+
+        self.backend.remove_game(-123)
+        self.assertIsNone(self.backend.get_chat_id_by_user(111))
+        self.assertIsNone(self.backend.get_chat_id_by_user(222))
+
+
+class MemoryBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def create_backend(self):
+        return MemoryBackend()
+
+
+class SQLiteBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def create_backend(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        return SQLiteBackend(os.path.join(self.tempdir.name, "games.db"))
+
+    def tearDown(self):
+        super().tearDown()
+        self.tempdir.cleanup()
+
+    def test_shared_between_connections(self):
+        """Games added by one process must be visible to another process using the same file"""
+        self.backend.add_game(-123, self._create_game(1000001, -123))
+
+        other = SQLiteBackend(os.path.join(self.tempdir.name, "games.db"))
+        self.assertEqual(1000001, other.get_game(-123).id)
+        other.close()
+
+
+class KeyValueBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def create_backend(self):
+        self.server = KeyValueServer()
+        self.server.start()
+        return KeyValueBackend(port=self.server.port)
+
+    def tearDown(self):
+        super().tearDown()
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
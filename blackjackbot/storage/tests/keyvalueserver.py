@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for a Redis server, implementing only the commands used by the KeyValueBackend"""
+import fnmatch
+import socketserver
+import threading
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self._reply(item)
+        elif value == "OK":
+            self.wfile.write(b"+OK\r\n")
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command, args = args[0].upper(), args[1:]
+
+            with self.server.lock:
+                if command == b"GET":
+                    self._reply(data.get(args[0]))
+                elif command == b"SET":
+                    key, value, options = args[0], args[1], [o.upper() for o in args[2:]]
+                    if (b"NX" in options and key in data) or (b"XX" in options and key not in data):
+                        self._reply(None)
+                    else:
+                        data[key] = value
+                        self._reply("OK")
+                elif command == b"DEL":
+                    self._reply(sum(1 for key in args if data.pop(key, None) is not None))
+                elif command == b"EXISTS":
+                    self._reply(sum(1 for key in args if key in data))
+                elif command == b"SCAN":
+                    pattern = args[args.index(b"MATCH") + 1].decode("utf-8")
+                    keys = [key for key in data if fnmatch.fnmatchcase(key.decode("utf-8"), pattern)]
+                    self._reply([b"0", keys])
+                else:
+                    self.wfile.write(b"-ERR unknown command\r\n")
+
+
+class KeyValueServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _RespHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
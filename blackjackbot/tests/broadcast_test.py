@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+
+from telegram.error import Forbidden, RetryAfter
+
+from blackjackbot.broadcast import Broadcast, RateLimiter, TokenBucket
+from database import AsyncDatabase, Database
+
+SINCE = 2000000000
+USER_IDS = list(range(4800, 4830))
+
+
+class FakeBot(object):
+
+    def __init__(self, blocked=(), flood=()):
+        self.sent = []
+        self.blocked = set(blocked)
+        self.flood = set(flood)
+
+    async def send_message(self, chat_id, text):
+        if chat_id in self.blocked:
+            raise Forbidden("Blocked by user")
+        if chat_id in self.flood:
+            self.flood.remove(chat_id)
+            raise RetryAfter(0)
+        self.sent.append(chat_id)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+
+        async def run():
+            for _ in range(21):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        asyncio.run(run())
+        # The first token is available right away, the other 20 need 10 ms each
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_per_chat(self):
+        limiter = RateLimiter(global_rate=1000, per_chat_rate=100)
+
+        async def run():
+            start = time.monotonic()
+            for chat_id in range(50):
+                await limiter.acquire(chat_id)
+            different_chats = time.monotonic() - start
+
+            start = time.monotonic()
+            for _ in range(5):
+                await limiter.acquire(1000)
+            return different_chats, time.monotonic() - start
+
+        different_chats, same_chat = asyncio.run(run())
+        self.assertLess(different_chats, 0.05)
+        self.assertGreaterEqual(same_chat, 0.039)
+
+
+class BroadcastTest(unittest.TestCase):
+
+    def setUp(self):
+        db = Database()
+        db.connection.execute("DELETE FROM broadcasts;")
+        for user_id in USER_IDS:
+            db.add_user(user_id, "en", "test", "test2", "test3")
+        # Recent players only - an older player must not receive anything
+        db.connection.executemany("UPDATE users SET last_played=? WHERE user_id=?;", [(SINCE, user_id) for user_id in USER_IDS])
+        db.connection.execute("UPDATE users SET last_played=? WHERE user_id=?;", [SINCE - 1, USER_IDS[0]])
+        db.connection.commit()
+
+    @staticmethod
+    def _limiter():
+        return RateLimiter(global_rate=10000, per_chat_rate=10000)
+
+    def test_broadcast(self):
+        bot = FakeBot(blocked=[USER_IDS[1]], flood=[USER_IDS[2]])
+
+        async def run():
+            broadcast_id = await AsyncDatabase().create_broadcast(1, "Hello", SINCE)
+            broadcast = Broadcast(broadcast_id, 1, "Hello", SINCE)
+            broadcast.page_size = 7
+            await broadcast.run(bot, self._limiter())
+            return broadcast, await AsyncDatabase().get_unfinished_broadcasts()
+
+        broadcast, unfinished = asyncio.run(run())
+        self.assertEqual(USER_IDS[2:], sorted(bot.sent))
+        self.assertEqual(len(USER_IDS) - 2, broadcast.sent)
+        self.assertEqual(1, broadcast.failed)
+        self.assertEqual([], unfinished)
+
+    def test_resume(self):
+        """An interrupted broadcast must continue after the last checkpointed user"""
+        bot = FakeBot()
+
+        async def run():
+            broadcast_id = await AsyncDatabase().create_broadcast(1, "Hello", SINCE)
+            await AsyncDatabase().update_broadcast(broadcast_id, USER_IDS[9], 9, 0)
+            row, = await AsyncDatabase().get_unfinished_broadcasts()
+            broadcast = Broadcast(*row)
+            await broadcast.run(bot, self._limiter())
+            return broadcast
+
+        broadcast = asyncio.run(run())
+        self.assertEqual(USER_IDS[10:], sorted(bot.sent))
+        self.assertEqual(len(USER_IDS) - 1, broadcast.sent)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from blackjack.errors import NoPlayersLeftException, PlayerBustedException, PlayerGot21Exception
+from blackjack.game import BlackJackGame
+from blackjackbot.eventlog import EventLog, list_segments, replay
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = self.tempdir.name
+        self.log = EventLog(self.directory, flush_interval=0.01)
+
+    def tearDown(self):
+        self.log.close()
+        self.tempdir.cleanup()
+
+    def _create_game(self, chat_id):
+        game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+        game.id = 1000000 - chat_id
+        game.chat_id = chat_id
+        game.register_on_action_handler(self.log.log_action)
+        game.add_player(user_id=111, first_name="Player 111")
+        self.log.log_create(game)
+        return game
+
+    def test_replay(self):
+        """Replaying the log must lead to the same game state"""
+        game = self._create_game(-123)
+        game.add_player(222, "Plåyer 222", bet=30)
+        game.start(user_id=111)
+        try:
+            game.draw_card()
+        except (PlayerBustedException, PlayerGot21Exception):
+            # Depends on the random deck, the card is drawn either way
+            pass
+        game.next_player()
+        self.log.flush()
+
+        games = {}
+        replay(self.directory, games)
+
+        restored = games[-123]
+        self.assertEqual([111, 222], [p.user_id for p in restored.players])
+        self.assertEqual("Plåyer 222", restored.players[1].first_name)
+        self.assertEqual(30, restored.players[1].bet)
+        self.assertTrue(restored.running)
+        self.assertEqual(1, restored._current_player)
+        self.assertEqual(game.action_seq, restored.action_seq)
+        for expected, actual in zip(game.players + [game.dealer], restored.players + [restored.dealer]):
+            self.assertEqual([c.card_id for c in expected.cards], [c.card_id for c in actual.cards])
+
+    def test_replay_remove(self):
+        game = self._create_game(-123)
+        self._create_game(-456)
+        game.add_player(222, "Player 222")
+        game.start(111)
+        game.next_player()
+        with self.assertRaises(NoPlayersLeftException):
+            game.next_player()
+        self.log.log_remove(-123)
+        game.stop(-1)
+        self.log.flush()
+
+        games = {}
+        replay(self.directory, games)
+        self.assertEqual([-456], list(games.keys()))
+
+    def test_replay_corrupt_tail(self):
+        """A torn write at the end of a segment must not prevent replaying the intact records"""
+        self._create_game(-123)
+        self.log.flush()
+        segment_path = list_segments(self.directory)[-1][1]
+        with open(segment_path, "ab") as f:
+            f.write(b"\x50\x00\x00\x00\x01\x02")
+
+        games = {}
+        replay(self.directory, games)
+        self.assertIn(-123, games)
+
+    def test_rotate_compact(self):
+        """Segments older than the segment of the last snapshot are removed, newer ones are replayed"""
+        self._create_game(-123)
+        segment = self.log.rotate()
+        self._create_game(-456)
+        self.log.flush()
+        self.assertEqual(2, len(list_segments(self.directory)))
+
+        self.log.compact(segment)
+        self.assertEqual([segment], [number for number, _ in list_segments(self.directory)])
+
+        games = {}
+        replay(self.directory, games, segment)
+        self.assertEqual([-456], list(games.keys()))
+
+    def test_new_segment_on_start(self):
+        """A restarted log must never append to an existing segment"""
+        self.log.close()
+        self.log = EventLog(self.directory)
+        self.assertEqual(2, self.log.segment)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "events-00000002.log")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from blackjack.game import BlackJackGame
+from blackjackbot.errors import NoActiveGameException
+from blackjackbot.gamestore import GameStore
+from blackjackbot.storage import MemoryBackend
+
+
+class GameStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = GameStore()
+        self.store.set_backend(MemoryBackend())
+
+    def _add_game(self, chat_id, user_id):
+        game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+        game.add_player(user_id=user_id, first_name="Player {}".format(user_id))
+        self.store.add_game(chat_id, game)
+        return game
+
+    def test_get_game_by_id(self):
+        game = self._add_game(-123, 111)
+
+        self.assertIs(game, self.store.get_game_by_id(game.id))
+        with self.assertRaises(NoActiveGameException):
+            self.store.get_game_by_id(1)
+
+    def test_get_game_by_user(self):
+        """Players joining after the game was added to the store must be indexed as well"""
+        game = self._add_game(-123, 111)
+        game.add_player(user_id=222, first_name="Player 222")
+
+        self.assertIs(game, self.store.get_game_by_user(111))
+        self.assertIs(game, self.store.get_game_by_user(222))
+        with self.assertRaises(NoActiveGameException):
+            self.store.get_game_by_user(333)
+
+    def test_is_playing_elsewhere(self):
+        self._add_game(-123, 111)
+
+        self.assertFalse(self.store.is_playing_elsewhere(111, -123))
+        self.assertTrue(self.store.is_playing_elsewhere(111, -456))
+        self.assertFalse(self.store.is_playing_elsewhere(222, -456))
+
+    def test_remove_game(self):
+        game = self._add_game(-123, 111)
+        self.store.remove_game(-123)
+
+        self.assertFalse(self.store.has_game(-123))
+        with self.assertRaises(NoActiveGameException):
+            self.store.get_game_by_id(game.id)
+        with self.assertRaises(NoActiveGameException):
+            self.store.get_game_by_user(111)
+
+
+if __name__ == '__main__':
+    unittest.main()
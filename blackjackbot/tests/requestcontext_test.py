@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest.mock import Mock
+
+from blackjack.game import BlackJackGame
+from blackjackbot.gamestore import GameStore
+from blackjackbot.requestcontext import RequestContext, load_request_context
+from blackjackbot.storage import MemoryBackend
+from database import AsyncDatabase
+
+
+class RequestContextTest(unittest.TestCase):
+
+    def setUp(self):
+        GameStore().set_backend(MemoryBackend())
+        asyncio.run(self._prepare_user())
+
+    @staticmethod
+    async def _prepare_user():
+        db = AsyncDatabase()
+        await db.add_user(4713, "de", "test", "test2", "test3")
+        await db.set_lang_id(-4713, "de")
+        await db.set_bet(4713, 30)
+
+    @staticmethod
+    def _update(chat_id, user_id):
+        update = Mock()
+        update.effective_chat.id = chat_id
+        update.effective_user.id = user_id
+        return update
+
+    def test_load(self):
+        game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+        game.add_player(user_id=4713, first_name="test")
+        GameStore().add_game(-4713, game)
+
+        context = RequestContext(Mock())
+        asyncio.run(load_request_context(self._update(-4713, 4713), context))
+
+        self.assertTrue(context.loaded)
+        self.assertEqual("de", context.lang_id)
+        self.assertEqual("de", context.translator.lang_id)
+        self.assertEqual(4713, context.user_row.user_id)
+        self.assertEqual(30, context.bet)
+        self.assertIs(game, context.game)
+
+    def test_load_without_game_and_user_row(self):
+        context = RequestContext(Mock())
+        asyncio.run(load_request_context(self._update(-4714, 4714), context))
+
+        self.assertEqual("en", context.lang_id)
+        self.assertIsNone(context.user_row)
+        self.assertEqual(0, context.bet)
+        self.assertIsNone(context.game)
+
+    def test_load_without_chat(self):
+        """Inline queries have no chat - the language of the user's private chat must be used"""
+        update = self._update(None, 4713)
+        update.effective_chat = None
+        asyncio.run(AsyncDatabase().set_lang_id(4713, "de"))
+
+        context = RequestContext(Mock())
+        asyncio.run(load_request_context(update, context))
+        self.assertEqual("de", context.lang_id)
+        self.assertIsNone(context.game)
+
+
+if __name__ == '__main__':
+    unittest.main()
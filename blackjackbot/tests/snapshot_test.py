@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from blackjack.game import BlackJackGame
+from blackjackbot.snapshot import SnapshotError, SnapshotWriter, dump_snapshot, load_snapshot, read_snapshot, write_snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "games.snapshot")
+        self.games = []
+        for i in range(3):
+            game = BlackJackGame(gametype=BlackJackGame.Type.MULTIPLAYER_GROUP)
+            game.id = 1000000 + i
+            game.chat_id = -100 - i
+            game.add_player(user_id=111, first_name="Player 111")
+            game.add_player(user_id=222, first_name="Player 222")
+            self.games.append(game)
+        self.games[0].start(111)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_roundtrip(self):
+        games, log_segment = load_snapshot(dump_snapshot(self.games, log_segment=7))
+        self.assertEqual(7, log_segment)
+
+        self.assertEqual([(g.id, g.chat_id, g.running) for g in self.games], [(g.id, g.chat_id, g.running) for g in games])
+        self.assertEqual([c.card_id for c in self.games[0].players[1].cards], [c.card_id for c in games[0].players[1].cards])
+
+    def test_empty(self):
+        self.assertEqual(([], 0), load_snapshot(dump_snapshot([])))
+
+    def test_invalid(self):
+        with self.assertRaises(SnapshotError):
+            load_snapshot(b"")
+        with self.assertRaises(SnapshotError):
+            load_snapshot(b"XXXX" + dump_snapshot(self.games)[4:])
+        with self.assertRaises(SnapshotError):
+            load_snapshot(dump_snapshot(self.games)[:20])
+
+    def test_write_read(self):
+        self.assertEqual(([], 0), read_snapshot(self.path))
+
+        write_snapshot(self.path, dump_snapshot(self.games))
+        self.assertEqual(3, len(read_snapshot(self.path)[0]))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_writer(self):
+        """The writer must write the latest submitted snapshot before stopping"""
+        written_segments = []
+        writer = SnapshotWriter(self.path, on_written=written_segments.append)
+        writer.submit(dump_snapshot(self.games[:1], 1), 1)
+        writer.submit(dump_snapshot(self.games, 2), 2)
+        writer.stop()
+
+        self.assertEqual(3, len(read_snapshot(self.path)[0]))
+        self.assertEqual(2, written_segments[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
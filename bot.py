@@ -5,11 +5,17 @@ import logging.handlers
 import pathlib
 
 from telegram.ext import Updater, JobQueue
-from telegram.ext import ApplicationBuilder
+from telegram.ext import ApplicationBuilder, ContextTypes
 from telegram import Update
 import config
-from blackjackbot import handlers, error_handler
+from remoteApi import RemoteApi
+from blackjackbot import handlers, error_handler, banned_user_handler, request_context_handler, RequestContext
+from blackjackbot.broadcast import resume_broadcasts
+from blackjackbot.eventlog import EventLog, replay
 from blackjackbot.gamestore import GameStore
+from blackjackbot.snapshot import SnapshotWriter, dump_snapshot, read_snapshot, SnapshotError
+from blackjackbot.storage import SQLiteBackend, KeyValueBackend
+from database import ActivityCounters, Archiver, AsyncDatabase, BannedUsers, BetBuffer, DatabaseBackup, HandHistory, Leaderboards, Ledger, LedgerSettler, PnlRollups, StatisticsBuffer
 
 logdir_path = pathlib.Path(__file__).parent.joinpath("logs").absolute()
 logfile_path = logdir_path.joinpath("bot.log")
@@ -27,7 +33,39 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 logging.getLogger("telegram").setLevel(logging.ERROR)
 logging.getLogger("apscheduler").setLevel(logging.ERROR)
 
-application = ApplicationBuilder().token(config.BOT_TOKEN).build()
+def get_gamestore_backend():
+    """Returns the GameStore backend configured via config.GAMESTORE_BACKEND ('memory', 'sqlite' or 'keyvalue') or None for the default"""
+    backend = getattr(config, "GAMESTORE_BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteBackend(getattr(config, "GAMESTORE_SQLITE_PATH", "games.db"))
+    if backend == "keyvalue":
+        return KeyValueBackend(getattr(config, "GAMESTORE_KV_HOST", "127.0.0.1"), getattr(config, "GAMESTORE_KV_PORT", 6379))
+    return None
+
+
+# Snapshots and the event log are only needed for the in-memory backend - the other backends persist games on their own
+snapshots_enabled = getattr(config, "GAMESTORE_BACKEND", "memory") == "memory"
+snapshot_path = pathlib.Path(__file__).parent.joinpath(getattr(config, "SNAPSHOT_FILE", "games.snapshot")).absolute()
+snapshot_interval = getattr(config, "SNAPSHOT_INTERVAL", 60)
+statistics_flush_interval = getattr(config, "STATISTICS_FLUSH_INTERVAL", 5)
+banned_users_refresh_interval = getattr(config, "BANNED_USERS_REFRESH_INTERVAL", 5)
+ledger_settle_interval = getattr(config, "LEDGER_SETTLE_INTERVAL", 30)
+# Amount of SQLite files the users table is spread over. Changing it needs a migration of the existing users (e.g. with database.bulk).
+AsyncDatabase.shards = getattr(config, "DATABASE_SHARDS", 1)
+BetBuffer.quiet_period = getattr(config, "BET_WRITE_DELAY", 3)
+# Users who didn't play for this many days are moved to the archive tables, 0 disables archiving
+archive_inactive_days = getattr(config, "ARCHIVE_INACTIVE_DAYS", 180)
+archive_interval = getattr(config, "ARCHIVE_INTERVAL", 86400)
+# Online backups of the database for reports and analytics, 0 disables them
+backup_interval = getattr(config, "BACKUP_INTERVAL", 3600)
+backup_path = pathlib.Path(__file__).parent.joinpath(getattr(config, "BACKUP_DIR", "database/snapshots")).absolute()
+database_backup = None
+snapshot_writer = None
+event_log_path = pathlib.Path(__file__).parent.joinpath(getattr(config, "EVENT_LOG_DIR", "eventlog")).absolute()
+event_log = None
+# Columnar history of all played hands for analytics, an empty value disables it
+hand_history_dir = getattr(config, "HAND_HISTORY_DIR", "handhistory")
+hand_history = None
 
 
 # Set up jobs
@@ -35,11 +73,128 @@ async def stale_game_cleaner(context):
     gs = GameStore()
     gs.cleanup_stale_games()
 
+
+def take_snapshot():
+    # Serializing is cheap and must happen on the event loop, so no game changes while it's being captured. Writing happens in the background.
+    # Rotating the log at the same time makes sure that every action is either part of the snapshot or of a newer log segment.
+    log_segment = event_log.rotate()
+    snapshot_writer.submit(dump_snapshot(GameStore().get_games(), log_segment), log_segment)
+
+
+async def statistics_flush_job(context):
+    await BetBuffer().flush()
+    await StatisticsBuffer().flush_shards()
+    await AsyncDatabase().run(Leaderboards().flush, write=True)
+    await AsyncDatabase().run(Ledger().flush, write=True)
+    await AsyncDatabase().run(ActivityCounters().flush, write=True)
+    await AsyncDatabase().run(PnlRollups().flush, write=True)
+
+
+async def ledger_settle_job(context):
+    await context.job.data.settle()
+
+
+async def backup_job(context):
+    database_backup.start()
+
+
+async def banned_users_refresh_job(context):
+    await BannedUsers().refresh()
+
+
+async def snapshot_job(context):
+    take_snapshot()
+
+
+async def archive_job(context):
+    await Archiver(archive_inactive_days).run()
+
+
+async def post_init(app):
+    global snapshot_writer, event_log, database_backup, hand_history
+    await BannedUsers().refresh()
+    await resume_broadcasts(app)
+
+    if hand_history_dir:
+        hand_history = HandHistory(str(pathlib.Path(__file__).parent.joinpath(hand_history_dir).absolute()))
+        GameStore().set_hand_history(hand_history)
+
+    if backup_interval:
+        database_backup = DatabaseBackup(AsyncDatabase().store.paths, backup_path, keep=getattr(config, "BACKUP_KEEP", 3))
+        app.job_queue.run_repeating(callback=backup_job, interval=backup_interval, first=backup_interval)
+
+    if not snapshots_enabled:
+        return
+
+    try:
+        games, log_segment = read_snapshot(snapshot_path)
+    except SnapshotError as e:
+        logger.error("Can't restore games from snapshot '{}': {}".format(snapshot_path, e))
+        games, log_segment = [], 0
+
+    games = {game.chat_id: game for game in games}
+    replayed = replay(event_log_path, games, log_segment)
+
+    for game in games.values():
+        GameStore().restore_game(game)
+    logger.info("Restored {} games from snapshot and {} logged actions".format(len(games), replayed))
+
+    event_log = EventLog(event_log_path)
+    GameStore().set_event_log(event_log)
+    snapshot_writer = SnapshotWriter(snapshot_path, on_written=event_log.compact)
+    app.job_queue.run_repeating(callback=snapshot_job, interval=snapshot_interval, first=snapshot_interval)
+
+
+async def post_shutdown(app):
+    await BetBuffer().flush(force=True)
+    await StatisticsBuffer().flush_shards()
+    await AsyncDatabase().run(Leaderboards().flush, write=True)
+    await AsyncDatabase().run(Ledger().flush, write=True)
+    await AsyncDatabase().run(ActivityCounters().flush, write=True)
+    await AsyncDatabase().run(PnlRollups().flush, write=True)
+    AsyncDatabase().close()
+    if database_backup is not None:
+        database_backup.join()
+    if hand_history is not None:
+        GameStore().set_hand_history(None)
+        hand_history.close()
+
+    if snapshot_writer is None:
+        return
+
+    take_snapshot()
+    snapshot_writer.stop()
+    GameStore().set_event_log(None)
+    event_log.close()
+    logger.info("Wrote snapshot of running games to '{}'".format(snapshot_path))
+
+
+application = ApplicationBuilder().token(config.BOT_TOKEN).context_types(ContextTypes(context=RequestContext)) \
+    .post_init(post_init).post_shutdown(post_shutdown).build()
+
+
 def main() -> None:
+    backend = get_gamestore_backend()
+    if backend is not None:
+        GameStore().set_backend(backend)
+
+    application.add_handler(banned_user_handler, group=-2)
+    application.add_handler(request_context_handler, group=-1)
     for handler in handlers:
         application.add_handler(handler)
         application.add_error_handler(error_handler)
     application.job_queue.run_repeating(callback=stale_game_cleaner, interval=300, first=300)
+    application.job_queue.run_repeating(callback=banned_users_refresh_job, interval=banned_users_refresh_interval, first=banned_users_refresh_interval)
+    application.job_queue.run_repeating(callback=statistics_flush_job, interval=statistics_flush_interval, first=statistics_flush_interval)
+    if archive_inactive_days:
+        application.job_queue.run_repeating(callback=archive_job, interval=archive_interval, first=archive_interval)
+
+    remote_api = RemoteApi()
+    if hasattr(remote_api, "apply_balance_changes"):
+        application.job_queue.run_repeating(callback=ledger_settle_job, interval=ledger_settle_interval, first=ledger_settle_interval,
+                                            data=LedgerSettler(remote_api))
+    else:
+        logger.warning("RemoteApi doesn't support apply_balance_changes - ledger entries are recorded but not settled")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
     logger.info("Bot started as @{}".format(application.bot.username))
     logger.info("Started polling!")
@@ -1,4 +1,20 @@
 # -*- coding: utf-8 -*-
 from .database import Database
+from .worker import DatabaseWorker
+from .asyncdatabase import AsyncDatabase
+from .activity import ActivityCounters
+from .archive import Archiver
+from .backup import DatabaseBackup, backup_database
+from . import dal
+from .bannedusers import BannedUsers
+from .handhistory import HandHistory, HandSegment, open_segments
+from .hyperloglog import HyperLogLog
+from .betbuffer import BetBuffer
+from .leaderboard import Leaderboards, GLOBAL_SCOPE
+from .ledger import Ledger, LedgerSettler
+from .rollups import PnlReport, PnlRollups
+from .sharding import ShardedStore, Shard, shard_of
+from .statisticsbuffer import StatisticsBuffer
+from .userdirectory import UserDirectory
 
-__all__ = ['Database']
+__all__ = ['Database', 'dal', 'AsyncDatabase', 'ActivityCounters', 'Archiver', 'DatabaseBackup', 'backup_database', 'DatabaseWorker', 'BannedUsers', 'BetBuffer', 'HandHistory', 'HandSegment', 'open_segments', 'HyperLogLog', 'Leaderboards', 'GLOBAL_SCOPE', 'Ledger', 'LedgerSettler', 'PnlReport', 'PnlRollups', 'ShardedStore', 'Shard', 'shard_of', 'StatisticsBuffer', 'UserDirectory']
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+from .asyncdatabase import AsyncDatabase
+from .database import Database
+from .hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+def _day(timestamp):
+    return int(timestamp) // SECONDS_PER_DAY
+
+
+class ActivityCounters(object):
+    """
+    Daily, weekly and monthly active players. Every day has a HyperLogLog counter, which is stored as a blob in the
+    activity table. Weekly and monthly numbers are the union of the last 7 and 30 daily counters, so counting reads at
+    most 30 small rows, no matter how many users there are.
+    """
+    _instance = None
+    _initialized = False
+
+    precision = 12
+
+    def __new__(cls):
+        if ActivityCounters._instance is None:
+            ActivityCounters._instance = super(ActivityCounters, cls).__new__(cls)
+        return ActivityCounters._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # day -> HyperLogLog of the players which weren't written yet
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def add_player(self, user_id, timestamp=None):
+        """
+        Counts a player as active
+        :param user_id: The user_id of the player
+        :param timestamp: Unix time of the game, defaults to now
+        :return:
+        """
+        if user_id <= 0:
+            return
+
+        day = _day(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            counter = self._pending.get(day)
+            if counter is None:
+                counter = self._pending[day] = HyperLogLog(self.precision)
+            counter.add(user_id)
+
+    def pending_days(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, connection=None):
+        """
+        Merges the collected players into the stored daily counters
+        :param connection: The sqlite3 connection to use, e.g. the one of a DatabaseWorker. Defaults to the connection of Database().
+        :return: The amount of updated days
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        if connection is None:
+            connection = Database().connection
+
+        try:
+            with connection:
+                for day, counter in pending.items():
+                    row = connection.execute("SELECT registers FROM activity WHERE day=?;", [day]).fetchone()
+                    if row is not None:
+                        counter.merge(HyperLogLog.from_bytes(row[0]))
+                    connection.execute("INSERT OR REPLACE INTO activity (day, registers) VALUES (?, ?);", [day, counter.to_bytes()])
+        except Exception:
+            logger.exception("Couldn't write activity of {} days - keeping it for the next flush".format(len(pending)))
+            self._restore(pending)
+            return 0
+
+        return len(pending)
+
+    def _restore(self, pending):
+        """Merges counters which couldn't be written back into the buffer"""
+        with self._lock:
+            for day, counter in pending.items():
+                current = self._pending.get(day)
+                if current is not None:
+                    counter.merge(current)
+                self._pending[day] = counter
+
+    def count(self, connection, timestamp=None):
+        """
+        Returns the estimated amount of distinct players of the current day, the last 7 and the last 30 days
+        :param connection: The sqlite3 connection to read the stored counters from
+        :param timestamp: Unix time of "today", defaults to now
+        :return: Tuple (daily, weekly, monthly)
+        """
+        today = _day(time.time() if timestamp is None else timestamp)
+        counters = {}
+        for day, registers in connection.execute("SELECT day, registers FROM activity WHERE day>? AND day<=?;", [today - 30, today]):
+            counters[day] = HyperLogLog.from_bytes(registers)
+
+        # Players who weren't written yet count as well
+        with self._lock:
+            for day, counter in self._pending.items():
+                if today - 30 < day <= today:
+                    stored = counters.setdefault(day, HyperLogLog(self.precision))
+                    stored.merge(counter)
+
+        # Going back day by day, the union of the last 1, 7 and 30 days is built with 30 merges at most
+        result = []
+        union = HyperLogLog(self.precision)
+        for days_ago in range(30):
+            counter = counters.get(today - days_ago)
+            if counter is not None:
+                union.merge(counter)
+            if days_ago + 1 in (1, 7, 30):
+                result.append(union.count())
+        return tuple(result)
+
+    async def get_activity(self):
+        """Returns (daily, weekly, monthly) active players, see count()"""
+        return await AsyncDatabase().run(self.count)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+from . import dal
+from .asyncdatabase import AsyncDatabase
+from .userdirectory import UserDirectory
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+class Archiver(object):
+    """
+    Moves users who didn't play for inactive_days days to the users_archive table and their private chats to the
+    chats_archive table, so the tables used on every request only hold the active users. Every batch is a short
+    write job on the database workers, so requests are served in between. Archived rows are restored on their next use.
+    """
+
+    def __init__(self, inactive_days=180, batch_size=500, pause=0.05, is_active=None):
+        """
+        :param inactive_days: Days without a game after which a user is archived
+        :param batch_size: Amount of users checked per job and shard
+        :param pause: Seconds to wait between two batches
+        :param is_active: Function telling whether a user_id is in use right now and must stay, e.g. because a
+        buffered write for the user is still pending. Defaults to the users of the UserDirectory.
+        """
+        self.inactive_days = inactive_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.is_active = is_active if is_active is not None else UserDirectory().is_saved
+
+    def _archive_batch(self, connection, shard, before, positions, archived):
+        after = positions[shard.index]
+        if after is None:
+            return None, []
+
+        page = dal.get_inactive_users_page(connection, before, after, self.batch_size)
+        if not page:
+            return None, []
+
+        user_ids = [user_id for user_id in page if not self.is_active(user_id)]
+        dal.archive_users(connection, user_ids, archived)
+        if shard.count == 1:
+            # The chats live in the same file
+            dal.archive_chats(connection, user_ids, archived)
+        return page[-1], user_ids
+
+    async def run(self, now=None):
+        """
+        Archives all inactive users
+        :param now: Unix time to measure the inactivity from, defaults to now
+        :return: The amount of archived users
+        """
+        now = int(time.time() if now is None else now)
+        before = now - self.inactive_days * SECONDS_PER_DAY
+        database = AsyncDatabase()
+
+        # Last checked user_id per shard, None once a shard is done
+        positions = [0] * database.store.shards
+        archived = 0
+        while any(position is not None for position in positions):
+            results = await database.run_on_shards(self._archive_batch, before, list(positions), now, write=True)
+            user_ids = []
+            for index, (position, batch) in enumerate(results):
+                positions[index] = position
+                user_ids.extend(batch)
+
+            if user_ids and database.store.sharded:
+                await database.run(dal.archive_chats, user_ids, now, write=True)
+            archived += len(user_ids)
+            await asyncio.sleep(self.pause)
+
+        logger.info("Archived {} users who didn't play for {} days".format(archived, self.inactive_days))
+        return archived
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+from itertools import islice
+from time import time
+
+from util import Cache
+from . import dal
+from .database import Database, lang_cache
+from .sharding import ShardedStore
+
+
+def _add_user(connection, user_id, lang_id, first_name, last_name, username):
+    if dal.insert_user(connection, user_id, first_name, last_name, username):
+        dal.insert_chat(connection, user_id, lang_id)
+
+
+def _save_user(connection, user_id, lang_id, first_name, last_name, username):
+    if not dal.save_user(connection, user_id, first_name, last_name, username):
+        return False
+    dal.insert_chat(connection, user_id, lang_id)
+    return True
+
+
+def _find_user(connection, user_id):
+    """Returns the UserRow of a user (or None) and whether the user is archived"""
+    user = dal.get_user(connection, user_id)
+    return user, user is None and dal.user_archived(connection, user_id)
+
+
+def _find_lang_id(connection, chat_id):
+    """Returns the lang_id of a chat (or None) and whether the chat is archived"""
+    lang_id = dal.find_lang_id(connection, chat_id)
+    return lang_id, lang_id is None and dal.chat_archived(connection, chat_id)
+
+
+def _restore_user(connection, user_id):
+    dal.restore_user(connection, user_id)
+    return dal.get_user(connection, user_id)
+
+
+def _restore_chat(connection, chat_id):
+    dal.restore_chat(connection, chat_id)
+    return dal.get_lang_id(connection, chat_id)
+
+
+def _get_request_data(connection, chat_id, user_id):
+    """Returns the lang_id, the UserRow and whether the chat and the user have to be restored from the archive"""
+    lang_id, chat_archived = _find_lang_id(connection, chat_id) if chat_id is not None else ("en", False)
+    user, user_archived = _find_user(connection, user_id) if user_id is not None else (None, False)
+    return lang_id or "en", user, chat_archived, user_archived
+
+
+def _restore_request_data(connection, chat_id, user_id, chat_archived, user_archived):
+    if chat_archived:
+        dal.restore_chat(connection, chat_id)
+    if user_archived:
+        dal.restore_user(connection, user_id)
+    lang_id, user, _, _ = _get_request_data(connection, chat_id, user_id)
+    return lang_id, user
+
+
+def _get_shard_recent_players_page(connection, shard, since, after_user_id, limit):
+    return dal.get_recent_players_page(connection, since, after_user_id, limit)
+
+
+def _find_shard_users(connection, shard, text, limit):
+    return dal.find_users(connection, text, limit)
+
+
+def _create_broadcast(connection, admin_id, text, since):
+    return connection.execute("INSERT INTO broadcasts (admin_id, text, since) VALUES (?, ?, ?);", [admin_id, text, since]).lastrowid
+
+
+def _update_broadcast(connection, broadcast_id, last_user_id, sent, failed, finished):
+    connection.execute("UPDATE broadcasts SET last_user_id=?, sent=?, failed=?, finished=? WHERE broadcast_id=?;",
+                       [last_user_id, sent, failed, 1 if finished else 0, broadcast_id])
+
+
+def _get_unfinished_broadcasts(connection):
+    return connection.execute("SELECT broadcast_id, admin_id, text, since, last_user_id, sent, failed FROM broadcasts "
+                              "WHERE finished=0 ORDER BY broadcast_id;").fetchall()
+
+
+class AsyncDatabase(object):
+    """
+    Awaitable access to the users database for handlers running on the event loop.
+    All queries run on DatabaseWorker threads, so a slow disk never blocks the event loop.
+    With shards > 1 the users are spread over several files, each with its own worker.
+    """
+    # Must be set before the first use, e.g. from the config
+    shards = 1
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if AsyncDatabase._instance is None:
+            AsyncDatabase._instance = super(AsyncDatabase, cls).__new__(cls)
+        return AsyncDatabase._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.store = ShardedStore(Database.dir_path, self.shards)
+        self._initialized = True
+
+    async def run(self, func, *args, write=False):
+        """
+        Runs a function with the worker's connection of the main database file on the worker thread
+        :param func: Function which is called with a sqlite3 connection and *args
+        :param args: Arguments for func
+        :param write: True if func modifies the database
+        :return: The result of func
+        """
+        return await self.store.run(func, *args, write=write)
+
+    async def run_user(self, user_id, func, *args, write=False):
+        """Like run, but on the shard holding the users table row of user_id"""
+        return await self.store.run_user(int(user_id), func, *args, write=write)
+
+    async def run_on_shards(self, func, *args, write=False):
+        """
+        Runs a function on every shard of the users table in parallel
+        :param func: Function which is called with a sqlite3 connection, the Shard and *args
+        :return: List of the results of all shards
+        """
+        return await self.store.run_on_shards(func, *args, write=write)
+
+    async def get_user(self, user_id):
+        user, archived = await self.run_user(user_id, _find_user, user_id)
+        if archived:
+            user = await self.run_user(user_id, _restore_user, user_id, write=True)
+        return user
+
+    async def get_played_games(self, user_id):
+        return await self.run_user(user_id, dal.get_played_games, user_id)
+
+    @Cache(timeout=60, maxsize=1, key=lambda self: None)
+    async def get_admins(self):
+        return await self.run(dal.get_admins)
+
+    @lang_cache
+    async def get_lang_id(self, chat_id):
+        lang_id, archived = await self.run(_find_lang_id, chat_id)
+        if archived:
+            return await self.run(_restore_chat, chat_id, write=True)
+        return lang_id or "en"
+
+    async def set_lang_id(self, chat_id, lang_id):
+        if lang_id is None:
+            lang_id = "en"
+        await self.run(dal.set_lang_id, chat_id, lang_id, write=True)
+        lang_cache.invalidate(int(chat_id))
+
+    async def get_bet(self, user_id):
+        return await self.run_user(user_id, dal.get_bet, user_id)
+
+    async def set_bet(self, user_id, bet):
+        await self.run_user(user_id, dal.set_bet, user_id, bet, write=True)
+
+    async def add_user(self, user_id, lang_id, first_name, last_name, username):
+        user_id = int(user_id)
+        if not self.store.sharded:
+            await self.run(_add_user, user_id, lang_id, first_name, last_name, username, write=True)
+        elif await self.run_user(user_id, dal.insert_user, user_id, first_name, last_name, username, write=True):
+            await self.run(dal.insert_chat, user_id, lang_id, write=True)
+        # A new user also gets a chats row for their private chat
+        lang_cache.invalidate(user_id)
+
+    async def save_user(self, user_id, lang_id, first_name, last_name, username):
+        """
+        Adds a user or updates their names if they changed
+        :return: True if the user was new
+        """
+        user_id = int(user_id)
+        if not self.store.sharded:
+            new = await self.run(_save_user, user_id, lang_id, first_name, last_name, username, write=True)
+        else:
+            new = await self.run_user(user_id, dal.save_user, user_id, first_name, last_name, username, write=True)
+            if new:
+                await self.run(dal.insert_chat, user_id, lang_id, write=True)
+        if new:
+            lang_cache.invalidate(user_id)
+        return new
+
+    async def user_data_changed(self, user_id, first_name, last_name, username):
+        return await self.run_user(user_id, dal.user_data_changed, user_id, first_name, last_name, username)
+
+    async def update_user_data(self, user_id, first_name, last_name, username):
+        await self.run_user(user_id, dal.update_user_data, user_id, first_name, last_name, username, write=True)
+
+    async def get_request_data(self, chat_id, user_id):
+        """
+        Loads everything most handlers need about the chat and the user with a single job on the worker
+        :param chat_id: The chat_id of the update or None
+        :param user_id: The user_id of the update or None
+        :return: Tuple of the chat's lang_id, the user row (or None) and the user's bet
+        """
+        if not self.store.sharded or user_id is None:
+            lang_id, user, chat_archived, user_archived = await self.run(_get_request_data, chat_id, user_id)
+            if chat_archived or user_archived:
+                # Archived rows come back on their next use
+                lang_id, user = await self.run(_restore_request_data, chat_id, user_id, chat_archived, user_archived, write=True)
+                if chat_archived:
+                    lang_cache.invalidate(int(chat_id))
+            return lang_id, user, user.bet if user is not None else 0
+
+        user_job = self.get_user(user_id)
+        if chat_id is None:
+            lang_id, user = "en", await user_job
+        else:
+            # The chat and the user live in different files - query both at the same time
+            lang_id, user = await asyncio.gather(self.get_lang_id(chat_id), user_job)
+        return lang_id, user, user.bet if user is not None else 0
+
+    async def get_recent_players_page(self, since, after_user_id=0, limit=500):
+        """
+        Returns one page of the user_ids of all players who played since a certain time
+        :param since: Unix timestamp
+        :param after_user_id: The last user_id of the previous page
+        :param limit: Maximum size of the page
+        :return: Sorted list of user_ids
+        """
+        if not self.store.sharded:
+            return await self.run(dal.get_recent_players_page, since, after_user_id, limit)
+
+        # Every shard returns its first `limit` matching user_ids in order, so the first `limit` of the merged streams are exact
+        pages = await self.run_on_shards(_get_shard_recent_players_page, since, after_user_id, limit)
+        return list(islice(heapq.merge(*pages), limit))
+
+    async def find_users(self, text, limit=10):
+        """
+        Searches users by their names and usernames
+        :param text: The search text
+        :param limit: Maximum amount of results
+        :return: List of (rank, user_id, first_name, last_name, username) tuples, best match first
+        """
+        if not self.store.sharded:
+            return await self.run(dal.find_users, text, limit)
+
+        # Each shard ranks its own users - their best matches are merged by rank
+        results = await self.run_on_shards(_find_shard_users, text, limit)
+        return list(islice(heapq.merge(*results), limit))
+
+    async def create_broadcast(self, admin_id, text, since):
+        return await self.run(_create_broadcast, admin_id, text, since, write=True)
+
+    async def update_broadcast(self, broadcast_id, last_user_id, sent, failed, finished=False):
+        await self.run(_update_broadcast, broadcast_id, last_user_id, sent, failed, finished, write=True)
+
+    async def get_unfinished_broadcasts(self):
+        return await self.run(_get_unfinished_broadcasts)
+
+    async def archive_chat(self, chat_id):
+        """Moves a chat to the archive, e.g. after the bot was removed from it. It is restored on its next use."""
+        await self.run(dal.archive_chats, [chat_id], int(time()), write=True)
+        lang_cache.invalidate(int(chat_id))
+
+    async def reset_stats(self, user_id):
+        await self.run_user(user_id, dal.reset_stats, user_id, write=True)
+
+    def close(self):
+        self.store.close()
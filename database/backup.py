@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Consistent copies of the live database files, made with SQLite's online backup API on a background thread.
+Reports and analytics should read the latest snapshot instead of the live files.
+"""
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_PATTERN = re.compile(r"^\d{8}-\d{6}$")
+
+
+def backup_database(source_path, target_path, pages=256, pause=0.005):
+    """
+    Copies a database file in small steps without blocking writers
+    :param source_path: Path of the live database, which must be in WAL mode
+    :param target_path: Path of the copy. It's written to a temporary file first and only replaced when the copy is complete.
+    :param pages: Amount of pages copied per step
+    :param pause: Seconds to sleep between two steps, so that the copy doesn't compete with the bot for the disk
+    :return:
+    """
+    temp_path = target_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(temp_path)
+    try:
+        # A copy whose source changes in between two steps starts over - with steady writes it would never finish.
+        # An open read transaction pins a WAL snapshot, so all steps see the same state, while writers carry on.
+        source.execute("BEGIN;")
+        source.execute("SELECT COUNT(*) FROM sqlite_master;")
+        source.backup(target, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        source.execute("COMMIT;")
+    finally:
+        target.close()
+        source.close()
+
+    os.replace(temp_path, target_path)
+
+
+class DatabaseBackup(object):
+    """
+    Writes snapshots of a set of database files into directories named after the time of the backup
+    """
+
+    def __init__(self, source_paths, directory, keep=3, pages=256, pause=0.005):
+        """
+        :param source_paths: Paths of the database files to back up, e.g. ShardedStore.paths
+        :param directory: The directory containing the snapshots
+        :param keep: Amount of snapshots to keep - older ones are deleted after a successful backup
+        :param pages: Amount of pages copied per step
+        :param pause: Seconds to sleep between two steps
+        """
+        self.source_paths = list(source_paths)
+        self.directory = directory
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self._thread = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def list_snapshots(self):
+        """Returns the paths of all complete snapshots, oldest first"""
+        names = [name for name in os.listdir(self.directory) if _SNAPSHOT_PATTERN.match(name)]
+        return [os.path.join(self.directory, name) for name in sorted(names)]
+
+    def latest_path(self, name="users.db"):
+        """
+        Returns the path of a file in the latest snapshot or None if there is no snapshot yet
+        :param name: File name of the database, e.g. users.db
+        :return:
+        """
+        snapshots = self.list_snapshots()
+        if not snapshots:
+            return None
+        return os.path.join(snapshots[-1], name)
+
+    def connect_latest(self, name="users.db"):
+        """Opens a read-only connection to a file of the latest snapshot or returns None if there is none"""
+        path = self.latest_path(name)
+        if path is None:
+            return None
+        connection = sqlite3.connect("file:{}?mode=ro".format(path), uri=True)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def start(self):
+        """
+        Starts a backup on a background thread
+        :return: False if the previous backup is still running
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                logger.warning("Not starting a backup, the previous one is still running")
+                return False
+            self._thread = threading.Thread(target=self.run, name="DatabaseBackup", daemon=True)
+            self._thread.start()
+            return True
+
+    def join(self, timeout=None):
+        """Waits for a running backup to finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def run(self):
+        """
+        Backs up all source files into a new snapshot directory
+        :return: The path of the snapshot or None if the backup failed
+        """
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        snapshot_path = os.path.join(self.directory, name)
+        # Written into a temporary directory, so that readers only ever see complete snapshots
+        temp_path = snapshot_path + ".tmp"
+        start = time.monotonic()
+        try:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            os.makedirs(temp_path)
+            for source_path in self.source_paths:
+                backup_database(source_path, os.path.join(temp_path, os.path.basename(source_path)), self.pages, self.pause)
+            if os.path.exists(snapshot_path):
+                shutil.rmtree(snapshot_path)
+            os.replace(temp_path, snapshot_path)
+        except (OSError, sqlite3.Error):
+            logger.exception("Couldn't back up the database to '{}'".format(snapshot_path))
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return None
+
+        logger.info("Backed up {} database file(s) to '{}' in {:.1f}s".format(len(self.source_paths), snapshot_path, time.monotonic() - start))
+        self._prune()
+        return snapshot_path
+
+    def _prune(self):
+        snapshots = self.list_snapshots()
+        for path in snapshots[:max(len(snapshots) - self.keep, 0)]:
+            shutil.rmtree(path, ignore_errors=True)
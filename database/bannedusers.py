@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from . import dal
+
+logger = logging.getLogger(__name__)
+
+
+class BannedUsers(object):
+    """
+    In-memory set of all banned user_ids, so that checking a user doesn't need the database.
+    The set is replaced as a whole on every change, so readers never see a partially updated set.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if BannedUsers._instance is None:
+            BannedUsers._instance = super(BannedUsers, cls).__new__(cls)
+        return BannedUsers._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.users = frozenset()
+        # Shard index -> data_version and banned users of that shard
+        self._data_versions = {}
+        self._shard_users = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    def load(self, connection):
+        """
+        Loads all banned users from the database
+        :param connection: A sqlite3 connection
+        :return:
+        """
+        self._set_users(dal.get_banned_users(connection))
+
+    def _set_users(self, users):
+        if users != self.users:
+            logger.info("Loaded {} banned users".format(len(users)))
+        self.users = users
+
+    def _refresh(self, connection, shard=None):
+        # data_version only changes for commits of *other* connections, e.g. a different process or a manual SQL edit.
+        # The value is specific to a connection, so this must always run with the same connection.
+        index = shard.index if shard is not None else 0
+        data_version = connection.execute("PRAGMA data_version;").fetchone()[0]
+        if data_version == self._data_versions.get(index):
+            return False
+
+        self._data_versions[index] = data_version
+        users = dal.get_banned_users(connection)
+        # The shards are refreshed by different worker threads at the same time
+        with self._lock:
+            self._shard_users[index] = users
+            self._set_users(frozenset().union(*self._shard_users.values()))
+        return True
+
+    async def refresh(self):
+        """
+        Reloads the banned users of every shard whose database was changed by another connection since the last refresh
+        :return: True if the banned users were reloaded
+        """
+        # Imported here, because the asyncdatabase module imports the Database, which imports this module
+        from .asyncdatabase import AsyncDatabase
+        return any(await AsyncDatabase().run_on_shards(self._refresh))
+
+    def add(self, user_id):
+        """Marks a user as banned right away, e.g. after a ban via this process"""
+        self.users = self.users | {int(user_id)}
+
+    def remove(self, user_id):
+        self.users = self.users - {int(user_id)}
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BetBuffer(object):
+    """
+    Holds the working bets of users who are adjusting them on the bet keyboard. A bet is written to the database once,
+    after it didn't change for quiet_period seconds or when it's needed right away (e.g. when the user joins a game).
+    """
+    quiet_period = 3
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if BetBuffer._instance is None:
+            BetBuffer._instance = super(BetBuffer, cls).__new__(cls)
+        return BetBuffer._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # user_id -> (bet, time of the last change)
+        self._bets = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def set_bet(self, user_id, bet):
+        """Sets the working bet of a user without writing it"""
+        with self._lock:
+            self._bets[int(user_id)] = (bet, time.monotonic())
+
+    def get_bet(self, user_id):
+        """Returns the working bet of a user or None if there is no unwritten bet"""
+        entry = self._bets.get(int(user_id))
+        return entry[0] if entry is not None else None
+
+    def pending_users(self):
+        with self._lock:
+            return len(self._bets)
+
+    async def flush(self, force=False):
+        """
+        Writes the bets which didn't change during the quiet period
+        :param force: Write all bets, e.g. on shutdown
+        :return: The amount of written bets
+        """
+        deadline = time.monotonic() - self.quiet_period
+        with self._lock:
+            due = {user_id: bet for user_id, (bet, changed) in self._bets.items() if force or changed <= deadline}
+        return await self._write(due)
+
+    async def flush_user(self, user_id):
+        """Writes the working bet of a single user right away"""
+        bet = self.get_bet(user_id)
+        if bet is None:
+            return 0
+        return await self._write({int(user_id): bet})
+
+    async def _write(self, bets):
+        # Imported here, because the asyncdatabase module imports the Database, which imports the database package
+        from .asyncdatabase import AsyncDatabase
+
+        if not bets:
+            return 0
+
+        database = AsyncDatabase()
+        # Submitted all at once, so that the worker commits them together
+        results = await asyncio.gather(*(database.set_bet(user_id, bet) for user_id, bet in bets.items()), return_exceptions=True)
+
+        written = 0
+        for (user_id, bet), result in zip(bets.items(), results):
+            if isinstance(result, Exception):
+                logger.error("Couldn't write the bet of user {} - keeping it for the next flush: {}".format(user_id, result))
+                continue
+
+            written += 1
+            with self._lock:
+                # The bet stays buffered if it was changed while it was written
+                entry = self._bets.get(user_id)
+                if entry is not None and entry[0] == bet:
+                    del self._bets[user_id]
+        return written
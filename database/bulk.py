@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming export and import of the users and chats tables as NDJSON or CSV.
+Rows are streamed through the cursor and imported in chunks, so the memory usage doesn't depend on the size of the table.
+
+Usage:
+    python -m database.bulk export users --format csv --output users.csv
+    python -m database.bulk import users --format csv --input users.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    "users": ("user_id", "first_name", "last_name", "username", "games_played", "games_won", "games_tie", "bet", "last_played", "banned"),
+    "chats": ("chat_id", "lang_id"),
+}
+FORMATS = ("ndjson", "csv")
+
+
+class BulkError(Exception):
+    pass
+
+
+def _get_columns(table):
+    columns = TABLES.get(table)
+    if columns is None:
+        raise BulkError("Unknown table '{}' - must be one of: {}".format(table, ", ".join(TABLES)))
+    return columns
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise BulkError("Unknown format '{}' - must be one of: {}".format(fmt, ", ".join(FORMATS)))
+
+
+def export_table(connection, table, out, fmt="ndjson"):
+    """
+    Writes all rows of a table to a text file object
+    :param connection: sqlite3 connection
+    :param table: Name of the table, see TABLES
+    :param out: Text file object to write to. For CSV it must be opened with newline="".
+    :param fmt: "ndjson" or "csv"
+    :return: The amount of exported rows
+    """
+    columns = _get_columns(table)
+    _check_format(fmt)
+
+    # Iterating the cursor fetches the rows step by step instead of loading the whole table
+    cursor = connection.execute("SELECT {} FROM {} ORDER BY rowid;".format(", ".join(columns), table))
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in cursor:
+            writer.writerow(row)
+            count += 1
+    else:
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        for row in cursor:
+            out.write(dumps(dict(zip(columns, row))))
+            out.write("\n")
+            count += 1
+    return count
+
+
+def _read_csv(inp, allowed):
+    reader = csv.reader(inp)
+    try:
+        columns = next(reader)
+    except StopIteration:
+        return (), iter(())
+    _check_columns(columns, allowed)
+
+    # Empty fields are imported as NULL - CSV can't tell them apart from empty strings
+    return columns, ([value if value != "" else None for value in row] for row in reader)
+
+
+def _read_ndjson(inp, allowed):
+    lines = (line for line in inp if line.strip())
+    try:
+        first = json.loads(next(lines))
+    except StopIteration:
+        return (), iter(())
+    columns = tuple(first)
+    _check_columns(columns, allowed)
+
+    def rows():
+        yield [first[column] for column in columns]
+        for line_number, line in enumerate(lines, start=2):
+            record = json.loads(line)
+            try:
+                yield [record[column] for column in columns]
+            except KeyError as e:
+                raise BulkError("Record {} is missing the column {}".format(line_number, e)) from e
+
+    return columns, rows()
+
+
+def _check_columns(columns, allowed):
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise BulkError("Unknown columns: {}".format(", ".join(unknown)))
+    if allowed[0] not in columns:
+        raise BulkError("The primary key column '{}' is missing".format(allowed[0]))
+
+
+def import_table(connection, table, inp, fmt="ndjson", chunk_size=10000):
+    """
+    Inserts or replaces the rows of a text file object in a table. Columns which are not part of the file keep their defaults.
+    Every chunk of rows is written with a single executemany in its own transaction.
+    :param connection: sqlite3 connection
+    :param table: Name of the table, see TABLES
+    :param inp: Text file object to read from. For CSV it must be opened with newline="".
+    :param fmt: "ndjson" or "csv"
+    :param chunk_size: Amount of rows per transaction
+    :return: The amount of imported rows
+    """
+    allowed = _get_columns(table)
+    _check_format(fmt)
+
+    if fmt == "csv":
+        columns, rows = _read_csv(inp, allowed)
+    else:
+        columns, rows = _read_ndjson(inp, allowed)
+
+    if not columns:
+        return 0
+
+    statement = "INSERT OR REPLACE INTO {} ({}) VALUES ({});".format(table, ", ".join(columns), ", ".join("?" * len(columns)))
+    count = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        with connection:
+            connection.executemany(statement, chunk)
+        count += len(chunk)
+        logger.debug("Imported {} rows into '{}'".format(count, table))
+    return count
+
+
+def main(argv=None):
+    default_database = os.path.join(os.path.dirname(os.path.abspath(__file__)), "users.db")
+
+    parser = argparse.ArgumentParser(prog="python -m database.bulk", description="Export or import the users and chats tables")
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--database", default=default_database, help="Path of the SQLite database (default: %(default)s)")
+    parser.add_argument("--output", help="File to export to (default: stdout)")
+    parser.add_argument("--input", help="File to import from (default: stdin)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per transaction when importing (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.action == "import":
+        # Make sure the tables exist when importing into a fresh database
+        from .database import Database
+        Database.create_database(args.database)
+    elif not os.path.exists(args.database):
+        print("Error: Database '{}' does not exist".format(args.database), file=sys.stderr)
+        return 1
+
+    connection = sqlite3.connect(args.database)
+    try:
+        if args.action == "export":
+            out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+            try:
+                count = export_table(connection, args.table, out, args.format)
+            finally:
+                if args.output:
+                    out.close()
+        else:
+            inp = open(args.input, "r", encoding="utf-8", newline="") if args.input else sys.stdin
+            try:
+                count = import_table(connection, args.table, inp, args.format, args.chunk_size)
+            finally:
+                if args.input:
+                    inp.close()
+    except (BulkError, sqlite3.Error, ValueError) as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    print("{}ed {} rows".format(args.action.capitalize(), count), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Typed access to the users, chats and admins tables. Every function takes a sqlite3 connection as first argument,
+so the same queries are used by the sync Database and on the threads of the DatabaseWorkers.
+The SQL texts are constants, so that sqlite3's per-connection statement cache prepares every statement only once.
+"""
+
+USER_COLUMNS = ("user_id", "first_name", "last_name", "username", "games_played", "games_won", "games_tie", "bet", "last_played", "banned")
+
+SELECT_USER = "SELECT {} FROM users WHERE user_id=?;".format(", ".join(USER_COLUMNS))
+SELECT_USER_EXISTS = "SELECT 1 FROM users WHERE user_id=? LIMIT 1;"
+SELECT_USER_NAMES = "SELECT first_name, last_name, username FROM users WHERE user_id=?;"
+SELECT_PLAYED_GAMES = "SELECT games_played FROM users WHERE user_id=?;"
+SELECT_BET = "SELECT bet FROM users WHERE user_id=?;"
+SELECT_BANNED_USERS = "SELECT user_id FROM users WHERE banned=1;"
+SELECT_RECENT_PLAYERS = "SELECT user_id FROM users WHERE last_played>=?;"
+SELECT_RECENT_PLAYERS_PAGE = "SELECT user_id FROM users WHERE user_id>? AND last_played>=? AND banned=0 ORDER BY user_id LIMIT ?;"
+INSERT_USER = "INSERT OR IGNORE INTO users (user_id, first_name, last_name, username) VALUES (?, ?, ?, ?);"
+UPDATE_BET = "UPDATE users SET bet=? WHERE user_id=?;"
+UPDATE_USER_NAMES = "UPDATE users SET first_name=?, last_name=?, username=? WHERE user_id=?;"
+UPDATE_CHANGED_USER_NAMES = ("UPDATE users SET first_name=?1, last_name=?2, username=?3 WHERE user_id=?4 "
+                             "AND (first_name IS NOT ?1 OR last_name IS NOT ?2 OR username IS NOT ?3);")
+UPDATE_GAMES_WON = "UPDATE users SET games_won=? WHERE user_id=?;"
+UPDATE_GAMES_PLAYED = "UPDATE users SET games_played=? WHERE user_id=?;"
+UPDATE_LAST_PLAYED = "UPDATE users SET last_played=? WHERE user_id=?;"
+UPDATE_BANNED = "UPDATE users SET banned=? WHERE user_id=?;"
+UPDATE_RESET_STATS = "UPDATE users SET games_played=0, games_won=0, games_tie=0, last_played=0 WHERE user_id=?;"
+
+SELECT_USER_ARCHIVED = "SELECT 1 FROM users_archive WHERE user_id=? LIMIT 1;"
+SELECT_INACTIVE_USERS_PAGE = "SELECT user_id FROM users WHERE user_id>? AND last_played<? AND banned=0 ORDER BY user_id LIMIT ?;"
+ARCHIVE_USER = "INSERT OR REPLACE INTO users_archive ({0}, archived) SELECT {0}, ? FROM users WHERE user_id=?;".format(", ".join(USER_COLUMNS))
+DELETE_USER = "DELETE FROM users WHERE user_id=?;"
+RESTORE_USER = "INSERT OR IGNORE INTO users ({0}) SELECT {0} FROM users_archive WHERE user_id=?;".format(", ".join(USER_COLUMNS))
+DELETE_ARCHIVED_USER = "DELETE FROM users_archive WHERE user_id=?;"
+
+# Username matches weigh twice as much as names. The matches are ranked within the index first, so only the best
+# ones are joined with the users table.
+SELECT_MATCHING_USERS = ("SELECT matches.rank, users.user_id, users.first_name, users.last_name, users.username FROM "
+                         "(SELECT rowid, bm25(users_fts, 1.0, 1.0, 2.0) AS rank FROM users_fts WHERE users_fts MATCH ? ORDER BY rank LIMIT ?) AS matches "
+                         "JOIN users ON users.user_id = matches.rowid ORDER BY matches.rank;")
+
+SELECT_LANG_ID = "SELECT lang_id FROM chats WHERE chat_id=?;"
+UPSERT_LANG_ID = "INSERT INTO chats (chat_id, lang_id) VALUES (?, ?) ON CONFLICT(chat_id) DO UPDATE SET lang_id=excluded.lang_id;"
+INSERT_CHAT = "INSERT OR IGNORE INTO chats (chat_id, lang_id) VALUES (?, ?);"
+SELECT_CHAT_ARCHIVED = "SELECT 1 FROM chats_archive WHERE chat_id=? LIMIT 1;"
+ARCHIVE_CHAT = "INSERT OR REPLACE INTO chats_archive (chat_id, lang_id, archived) SELECT chat_id, lang_id, ? FROM chats WHERE chat_id=?;"
+DELETE_CHAT = "DELETE FROM chats WHERE chat_id=?;"
+RESTORE_CHAT = "INSERT OR IGNORE INTO chats (chat_id, lang_id) SELECT chat_id, lang_id FROM chats_archive WHERE chat_id=?;"
+DELETE_ARCHIVED_CHAT = "DELETE FROM chats_archive WHERE chat_id=?;"
+
+SELECT_ADMINS = "SELECT user_id FROM admins;"
+
+
+class UserRow(object):
+    """A row of the users table"""
+    __slots__ = USER_COLUMNS
+
+    def __init__(self, user_id, first_name, last_name, username, games_played, games_won, games_tie, bet, last_played, banned):
+        self.user_id = user_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.username = username
+        self.games_played = games_played
+        self.games_won = games_won
+        self.games_tie = games_tie
+        self.bet = bet
+        self.last_played = last_played
+        self.banned = banned
+
+    def __eq__(self, other):
+        if not isinstance(other, UserRow):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return "UserRow({})".format(", ".join("{}={!r}".format(name, getattr(self, name)) for name in self.__slots__))
+
+
+def _user_row_factory(cursor, row):
+    return UserRow(*row)
+
+
+def _fetch_value(connection, sql, parameters, default=None):
+    row = connection.execute(sql, parameters).fetchone()
+    if row is None:
+        return default
+    return row[0]
+
+
+def get_user(connection, user_id):
+    """Returns the UserRow of a user or None"""
+    cursor = connection.cursor()
+    # Builds the UserRow right away instead of going through the connection's row factory
+    cursor.row_factory = _user_row_factory
+    return cursor.execute(SELECT_USER, (int(user_id),)).fetchone()
+
+
+def user_exists(connection, user_id):
+    return connection.execute(SELECT_USER_EXISTS, (int(user_id),)).fetchone() is not None
+
+
+def get_played_games(connection, user_id):
+    return int(_fetch_value(connection, SELECT_PLAYED_GAMES, (int(user_id),), 0))
+
+
+def get_bet(connection, user_id):
+    return int(_fetch_value(connection, SELECT_BET, (int(user_id),), 0))
+
+
+def set_bet(connection, user_id, bet):
+    connection.execute(UPDATE_BET, (int(bet), int(user_id)))
+
+
+def insert_user(connection, user_id, first_name, last_name, username):
+    """Returns True if the user was new. Archived users are restored instead of being created again."""
+    restore_user(connection, user_id)
+    return connection.execute(INSERT_USER, (int(user_id), first_name, last_name, username)).rowcount > 0
+
+
+def save_user(connection, user_id, first_name, last_name, username):
+    """
+    Inserts a user or updates their names if they changed - the row is only written if something is different
+    :return: True if the user was new
+    """
+    if insert_user(connection, user_id, first_name, last_name, username):
+        return True
+    connection.execute(UPDATE_CHANGED_USER_NAMES, (first_name, last_name, username, int(user_id)))
+    return False
+
+
+def user_data_changed(connection, user_id, first_name, last_name, username):
+    row = connection.execute(SELECT_USER_NAMES, (int(user_id),)).fetchone()
+    if row is None:
+        return True
+    return tuple(row) != (first_name, last_name, username)
+
+
+def update_user_data(connection, user_id, first_name, last_name, username):
+    connection.execute(UPDATE_USER_NAMES, (first_name, last_name, username, int(user_id)))
+
+
+def set_games_won(connection, user_id, games_won):
+    connection.execute(UPDATE_GAMES_WON, (int(games_won), int(user_id)))
+
+
+def set_games_played(connection, user_id, games_played):
+    connection.execute(UPDATE_GAMES_PLAYED, (int(games_played), int(user_id)))
+
+
+def set_last_played(connection, user_id, last_played):
+    connection.execute(UPDATE_LAST_PLAYED, (int(last_played), int(user_id)))
+
+
+def set_banned(connection, user_id, banned):
+    connection.execute(UPDATE_BANNED, (1 if banned else 0, int(user_id)))
+
+
+def reset_stats(connection, user_id):
+    connection.execute(UPDATE_RESET_STATS, (int(user_id),))
+
+
+def get_banned_users(connection):
+    return frozenset(row[0] for row in connection.execute(SELECT_BANNED_USERS))
+
+
+def get_recent_players(connection, since):
+    return [row[0] for row in connection.execute(SELECT_RECENT_PLAYERS, (int(since),))]
+
+
+def get_recent_players_page(connection, since, after_user_id, limit):
+    # Keyset pagination - every page is a range scan on the primary key, no matter how far the caller got
+    return [row[0] for row in connection.execute(SELECT_RECENT_PLAYERS_PAGE, (int(after_user_id), int(since), int(limit)))]
+
+
+def user_archived(connection, user_id):
+    return connection.execute(SELECT_USER_ARCHIVED, (int(user_id),)).fetchone() is not None
+
+
+def get_inactive_users_page(connection, before, after_user_id, limit):
+    """Returns the next user_ids after after_user_id who haven't played since `before` and aren't banned"""
+    return [row[0] for row in connection.execute(SELECT_INACTIVE_USERS_PAGE, (int(after_user_id), int(before), int(limit)))]
+
+
+def archive_users(connection, user_ids, archived):
+    """Moves users to the users_archive table"""
+    connection.executemany(ARCHIVE_USER, [(int(archived), int(user_id)) for user_id in user_ids])
+    connection.executemany(DELETE_USER, [(int(user_id),) for user_id in user_ids])
+
+
+def restore_user(connection, user_id):
+    """Moves an archived user back to the users table. Returns True if the user was archived."""
+    if connection.execute(RESTORE_USER, (int(user_id),)).rowcount <= 0:
+        return False
+    connection.execute(DELETE_ARCHIVED_USER, (int(user_id),))
+    return True
+
+
+def find_lang_id(connection, chat_id):
+    """Returns the stored language of a chat or None if the chat has no row"""
+    return _fetch_value(connection, SELECT_LANG_ID, (int(chat_id),))
+
+
+def build_search_query(text):
+    """
+    Turns a search text into an FTS5 query which matches every word as a prefix, e.g. '@john sm' -> '"john"* "sm"*'.
+    Returns None if the text contains no words.
+    """
+    words = [word for word in text.replace("@", " ").split() if word.strip('"')]
+    if not words:
+        return None
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def find_users(connection, text, limit=10):
+    """
+    Full text search over the names and usernames of all users
+    :param text: The search text, e.g. a name or an @username
+    :param limit: Maximum amount of results
+    :return: List of (rank, user_id, first_name, last_name, username) tuples, best match (lowest rank) first
+    """
+    query = build_search_query(text)
+    if query is None:
+        return []
+    return [tuple(row) for row in connection.execute(SELECT_MATCHING_USERS, (query, int(limit)))]
+
+
+def get_lang_id(connection, chat_id):
+    # Make sure that the database stored an actual value and not "None"
+    return find_lang_id(connection, chat_id) or "en"
+
+
+def set_lang_id(connection, chat_id, lang_id):
+    connection.execute(UPSERT_LANG_ID, (int(chat_id), lang_id))
+
+
+def insert_chat(connection, chat_id, lang_id):
+    connection.execute(INSERT_CHAT, (int(chat_id), lang_id))
+
+
+def chat_archived(connection, chat_id):
+    return connection.execute(SELECT_CHAT_ARCHIVED, (int(chat_id),)).fetchone() is not None
+
+
+def archive_chats(connection, chat_ids, archived):
+    """Moves chats to the chats_archive table"""
+    connection.executemany(ARCHIVE_CHAT, [(int(archived), int(chat_id)) for chat_id in chat_ids])
+    connection.executemany(DELETE_CHAT, [(int(chat_id),) for chat_id in chat_ids])
+
+
+def restore_chat(connection, chat_id):
+    """Moves an archived chat back to the chats table. Returns True if the chat was archived."""
+    if connection.execute(RESTORE_CHAT, (int(chat_id),)).rowcount <= 0:
+        return False
+    connection.execute(DELETE_ARCHIVED_CHAT, (int(chat_id),))
+    return True
+
+
+def get_admins(connection):
+    return [row[0] for row in connection.execute(SELECT_ADMINS)]
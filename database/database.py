@@ -5,6 +5,104 @@ import sqlite3
 from time import time
 
 from util import Cache
+from . import dal
+from .bannedusers import BannedUsers
+
+# Shared by Database and AsyncDatabase, so that a language change invalidates both
+lang_cache = Cache(timeout=120, maxsize=10000, key=lambda self, chat_id: int(chat_id), name="lang_id")
+
+USERS_TABLE = ("CREATE TABLE IF NOT EXISTS 'users'"
+               "('user_id' INTEGER NOT NULL,"
+               "'first_name' TEXT,"
+               "'last_name' TEXT,"
+               "'username' TEXT,"
+               "'games_played' INTEGER DEFAULT 0,"
+               "'games_won' INTEGER DEFAULT 0,"
+               "'games_tie' INTEGER DEFAULT 0,"
+               "'bet' INTEGER DEFAULT 10,"
+               "'last_played' INTEGER DEFAULT 0,"
+               "'banned' INTEGER DEFAULT 0,"
+               "PRIMARY KEY('user_id'));")
+
+# Users who didn't play for a long time, moved out of the users table by the Archiver. archived is the unix time of the move.
+USERS_ARCHIVE_TABLE = ("CREATE TABLE IF NOT EXISTS 'users_archive'"
+                       "('user_id' INTEGER NOT NULL,"
+                       "'first_name' TEXT,"
+                       "'last_name' TEXT,"
+                       "'username' TEXT,"
+                       "'games_played' INTEGER DEFAULT 0,"
+                       "'games_won' INTEGER DEFAULT 0,"
+                       "'games_tie' INTEGER DEFAULT 0,"
+                       "'bet' INTEGER DEFAULT 10,"
+                       "'last_played' INTEGER DEFAULT 0,"
+                       "'banned' INTEGER DEFAULT 0,"
+                       "'archived' INTEGER NOT NULL,"
+                       "PRIMARY KEY('user_id'));")
+
+# Full text index of the names of the users. It only stores the index and reads the names from the users table,
+# the triggers keep it up to date on every change of a users row.
+USERS_FTS_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS 'users_fts' USING fts5("
+                   "first_name, last_name, username, content='users', content_rowid='user_id', "
+                   "tokenize='unicode61 remove_diacritics 2', prefix='2 3');")
+USERS_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS 'users_fts_insert' AFTER INSERT ON 'users' BEGIN "
+    "INSERT INTO users_fts (rowid, first_name, last_name, username) VALUES (new.user_id, new.first_name, new.last_name, new.username); END;",
+    "CREATE TRIGGER IF NOT EXISTS 'users_fts_delete' AFTER DELETE ON 'users' BEGIN "
+    "INSERT INTO users_fts (users_fts, rowid, first_name, last_name, username) "
+    "VALUES ('delete', old.user_id, old.first_name, old.last_name, old.username); END;",
+    "CREATE TRIGGER IF NOT EXISTS 'users_fts_update' AFTER UPDATE OF first_name, last_name, username ON 'users' BEGIN "
+    "INSERT INTO users_fts (users_fts, rowid, first_name, last_name, username) "
+    "VALUES ('delete', old.user_id, old.first_name, old.last_name, old.username); "
+    "INSERT INTO users_fts (rowid, first_name, last_name, username) VALUES (new.user_id, new.first_name, new.last_name, new.username); END;",
+]
+
+
+def _create_users_fts(cursor):
+    """Creates the full text index of the users table and indexes the users stored before it existed"""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='users_fts';").fetchone()
+    cursor.execute(USERS_FTS_TABLE)
+    for trigger in USERS_FTS_TRIGGERS:
+        cursor.execute(trigger)
+    if not exists:
+        cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild');")
+
+
+# Changes of the schema after the initial set of tables. PRAGMA user_version holds the amount of migrations a database
+# file has seen, so every migration runs exactly once. Only ever append to these lists.
+USERS_INDEXES = [
+    # get_recent_players
+    "CREATE INDEX IF NOT EXISTS 'users_last_played' ON 'users' ('last_played');",
+    # load_banned_users - the index only holds the few banned users
+    "CREATE INDEX IF NOT EXISTS 'users_banned' ON 'users' ('banned') WHERE banned=1;",
+]
+MIGRATIONS = [USERS_INDEXES]
+USER_SHARD_MIGRATIONS = [USERS_INDEXES]
+
+
+def _migrate(connection, migrations):
+    """
+    Applies the migrations a database file hasn't seen yet, each in its own transaction
+    :param connection: A sqlite3 connection without an open transaction
+    :param migrations: List of migrations, each a list of SQL statements
+    :return: The schema version of the database file
+    """
+    while True:
+        # Other processes opening the same file wait for the migration instead of running it twice
+        connection.execute("BEGIN IMMEDIATE;")
+        try:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+            if version >= len(migrations):
+                connection.rollback()
+                return version
+
+            for statement in migrations[version]:
+                connection.execute(statement)
+            connection.execute("PRAGMA user_version = {};".format(version + 1))
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+        logging.getLogger(__name__).info("Migrated database schema to version {}".format(version + 1))
 
 
 class Database(object):
@@ -12,7 +110,6 @@ class Database(object):
 
     _instance = None
     _initialized = False
-    _banned_users = set()
 
     def __new__(cls):
         if not Database._instance:
@@ -36,7 +133,6 @@ class Database(object):
         self.connection = sqlite3.connect(database_path)
         self.connection.row_factory = sqlite3.Row
         self.connection.text_factory = lambda x: str(x, 'utf-8', "ignore")
-        self.cursor = self.connection.cursor()
 
         self.load_banned_users()
 
@@ -45,7 +141,7 @@ class Database(object):
     @staticmethod
     def create_database(database_path):
         """
-        Create database file and add admin and users table to the database
+        Create database file, add admin and users table to the database and apply the schema MIGRATIONS
         :param database_path:
         :return:
         """
@@ -61,180 +157,195 @@ class Database(object):
                        "'username' TEXT,"
                        "PRIMARY KEY('user_id'));")
 
-        cursor.execute("CREATE TABLE IF NOT EXISTS 'users'"
-                       "('user_id' INTEGER NOT NULL,"
-                       "'first_name' TEXT,"
-                       "'last_name' TEXT,"
-                       "'username' TEXT,"
-                       "'games_played' INTEGER DEFAULT 0,"
-                       "'games_won' INTEGER DEFAULT 0,"
-                       "'games_tie' INTEGER DEFAULT 0,"
-                       "'bet' INTEGER DEFAULT 10,"  
-                       "'last_played' INTEGER DEFAULT 0,"
-                       "'banned' INTEGER DEFAULT 0,"
-                       "PRIMARY KEY('user_id'));")
+        cursor.execute(USERS_TABLE)
+        cursor.execute(USERS_ARCHIVE_TABLE)
+        _create_users_fts(cursor)
 
         cursor.execute("CREATE TABLE IF NOT EXISTS 'chats'"
                        "('chat_id' INTEGER NOT NULL,"
                        "'lang_id' TEXT NOT NULL DEFAULT 'cn',"
                        "PRIMARY KEY('chat_id'));")
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'chats_archive'"
+                       "('chat_id' INTEGER NOT NULL,"
+                       "'lang_id' TEXT NOT NULL DEFAULT 'cn',"
+                       "'archived' INTEGER NOT NULL,"
+                       "PRIMARY KEY('chat_id'));")
+
+        # scope is 0 for the global leaderboard and the chat_id for leaderboards of groups
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'leaderboard_stats'"
+                       "('scope' INTEGER NOT NULL,"
+                       "'user_id' INTEGER NOT NULL,"
+                       "'first_name' TEXT,"
+                       "'games_played' INTEGER NOT NULL DEFAULT 0,"
+                       "'games_won' INTEGER NOT NULL DEFAULT 0,"
+                       "PRIMARY KEY('scope', 'user_id'));")
+        cursor.execute("CREATE INDEX IF NOT EXISTS 'leaderboard_stats_rank' ON 'leaderboard_stats' ('scope', 'games_won' DESC, 'games_played', 'user_id');")
+
+        # Progress of admin broadcasts, so that they can be resumed after a restart
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'broadcasts'"
+                       "('broadcast_id' INTEGER PRIMARY KEY AUTOINCREMENT,"
+                       "'admin_id' INTEGER NOT NULL,"
+                       "'text' TEXT NOT NULL,"
+                       "'since' INTEGER NOT NULL,"
+                       "'last_user_id' INTEGER NOT NULL DEFAULT 0,"
+                       "'sent' INTEGER NOT NULL DEFAULT 0,"
+                       "'failed' INTEGER NOT NULL DEFAULT 0,"
+                       "'finished' INTEGER NOT NULL DEFAULT 0);")
+
+        # Double-entry ledger of bets and payouts. settlement_id is 0 until the entry is part of a settlement.
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'ledger'"
+                       "('entry_id' INTEGER PRIMARY KEY AUTOINCREMENT,"
+                       "'round_id' TEXT NOT NULL,"
+                       "'user_id' INTEGER NOT NULL,"
+                       "'account' TEXT NOT NULL,"
+                       "'kind' TEXT NOT NULL,"
+                       "'amount' INTEGER NOT NULL,"
+                       "'created' INTEGER NOT NULL,"
+                       "'settlement_id' INTEGER NOT NULL DEFAULT 0,"
+                       "UNIQUE('round_id', 'user_id', 'account', 'kind'));")
+        cursor.execute("CREATE INDEX IF NOT EXISTS 'ledger_unsettled' ON 'ledger' ('user_id', 'entry_id') WHERE settlement_id=0;")
+
+        # Net balance changes which were (or still have to be) pushed to the remote balance service
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'settlements'"
+                       "('settlement_id' INTEGER PRIMARY KEY AUTOINCREMENT,"
+                       "'idempotency_key' TEXT NOT NULL UNIQUE,"
+                       "'user_id' INTEGER NOT NULL,"
+                       "'amount' INTEGER NOT NULL,"
+                       "'created' INTEGER NOT NULL,"
+                       "'done' INTEGER NOT NULL DEFAULT 0);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS 'settlements_open' ON 'settlements' ('settlement_id') WHERE done=0;")
+
+        # Rounds, bets and payouts per chat and hour (unix time // 3600). chat_id 0 holds the totals of all chats.
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'pnl_rollups'"
+                       "('chat_id' INTEGER NOT NULL,"
+                       "'hour' INTEGER NOT NULL,"
+                       "'rounds' INTEGER NOT NULL DEFAULT 0,"
+                       "'hands' INTEGER NOT NULL DEFAULT 0,"
+                       "'wagered' INTEGER NOT NULL DEFAULT 0,"
+                       "'paid' INTEGER NOT NULL DEFAULT 0,"
+                       "PRIMARY KEY('chat_id', 'hour'));")
+
+        # HyperLogLog registers of the players of each day (unix time // 86400)
+        cursor.execute("CREATE TABLE IF NOT EXISTS 'activity'"
+                       "('day' INTEGER NOT NULL,"
+                       "'registers' BLOB NOT NULL,"
+                       "PRIMARY KEY('day'));")
         connection.commit()
+
+        _migrate(connection, MIGRATIONS)
         connection.close()
 
-    def load_banned_users(self):
-        """Loads all banned users from the database into a list"""
-        self.cursor.execute("SELECT user_id FROM users WHERE banned=1;")
-        result = self.cursor.fetchall()
+    @staticmethod
+    def create_user_shard(database_path):
+        """
+        Create a database file which only holds the users tables, for storing one shard of the users, and apply the
+        USER_SHARD_MIGRATIONS
+        :param database_path:
+        :return:
+        """
+        connection = sqlite3.connect(database_path)
+        connection.execute(USERS_TABLE)
+        connection.execute(USERS_ARCHIVE_TABLE)
+        _create_users_fts(connection.cursor())
+        connection.commit()
 
-        if not result:
-            return
+        _migrate(connection, USER_SHARD_MIGRATIONS)
+        connection.close()
 
-        for row in result:
-            self._banned_users.add(int(row["user_id"]))
+    def load_banned_users(self):
+        """Loads all banned users from the database into memory"""
+        BannedUsers().load(self.connection)
 
     def get_banned_users(self):
-        """Returns a list of all banned user_ids"""
-        return self._banned_users
+        """Returns a set of all banned user_ids"""
+        return BannedUsers().users
 
     def get_user(self, user_id):
-        self.cursor.execute("SELECT user_id, first_name, last_name, username, games_played, games_won, games_tie, last_played, banned"
-                            " FROM users WHERE user_id=?;", [str(user_id)])
-
-        result = self.cursor.fetchone()
-        if not result or len(result) == 0:
-            return None
-        return result
+        """Returns the UserRow of a user or None"""
+        return dal.get_user(self.connection, user_id)
 
     def is_user_banned(self, user_id):
         """Checks if a user was banned by the admin of the bot from using it"""
-        # user = self.get_user(user_id)
-        # return user is not None and user[8] == 1
-        return int(user_id) in self._banned_users
+        return int(user_id) in BannedUsers()
 
     def ban_user(self, user_id):
         """Bans a user from using a the bot"""
-        self.cursor.execute("UPDATE users SET banned=1 WHERE user_id=?;", [str(user_id)])
-        self.connection.commit()
-        self._banned_users.add(int(user_id))
+        with self.connection:
+            dal.set_banned(self.connection, user_id, True)
+        BannedUsers().add(user_id)
 
     def unban_user(self, user_id):
         """Unbans a user from using a the bot"""
-        self.cursor.execute("UPDATE users SET banned=0 WHERE user_id=?;", [str(user_id)])
-        self.connection.commit()
-        self._banned_users.remove(int(user_id))
+        with self.connection:
+            dal.set_banned(self.connection, user_id, False)
+        BannedUsers().remove(user_id)
+
+    def find_users(self, query, limit=10):
+        """Returns the users whose names best match a search text, see dal.find_users"""
+        return dal.find_users(self.connection, query, limit)
 
     def get_recent_players(self):
         one_day_in_secs = 60 * 60 * 24
-        current_time = int(time())
-        self.cursor.execute("SELECT user_id FROM users WHERE last_played>=?;", [current_time - one_day_in_secs])
-
-        return self.cursor.fetchall()
+        return dal.get_recent_players(self.connection, int(time()) - one_day_in_secs)
 
     def get_played_games(self, user_id):
-        self.cursor.execute("SELECT games_played FROM users WHERE user_id=?;", [str(user_id)])
-        result = self.cursor.fetchone()
-
-        if not result or len(result) <= 0:
-            return 0
+        return dal.get_played_games(self.connection, user_id)
 
-        return int(result["games_played"])
-
-    @Cache(timeout=60)
+    @Cache(timeout=60, maxsize=1, key=lambda self: None)
     def get_admins(self):
-        self.cursor.execute("SELECT user_id from admins;")
-        admins = self.cursor.fetchall()
-        admin_list = []
-        for admin in admins:
-            admin_list.append(admin["user_id"])
-        return admin_list
-
-    @Cache(timeout=120)
-    def get_lang_id(self, chat_id):
-        self.cursor.execute("SELECT lang_id FROM chats WHERE chat_id=?;", [str(chat_id)])
-        result = self.cursor.fetchone()
+        return dal.get_admins(self.connection)
 
-        if not result or not result["lang_id"]:
-            # Make sure that the database stored an actual value and not "None"
-            return "en"
+    @lang_cache
+    def get_lang_id(self, chat_id):
+        return dal.get_lang_id(self.connection, chat_id)
 
-        return result["lang_id"]
-    
     def set_lang_id(self, chat_id, lang_id):
         if lang_id is None:
             lang_id = "en"
-        Cache().invalidate_lang_cache(chat_id)
-        try:
-            self.cursor.execute("INSERT INTO chats (chat_id, lang_id) VALUES(?, ?);", [chat_id, lang_id])
-        except sqlite3.IntegrityError:
-            self.cursor.execute("UPDATE chats SET lang_id = ? WHERE chat_id = ?;", [lang_id, chat_id])
-        self.connection.commit()
-    
-       # 更新用户下注金额
+        with self.connection:
+            dal.set_lang_id(self.connection, chat_id, lang_id)
+        lang_cache.invalidate(int(chat_id))
+
     def set_bet(self, user_id, bet):
-        self.cursor.execute("UPDATE users SET bet=? WHERE user_id=?;", [bet, str(user_id)])
-        self.connection.commit()
-        
+        """Updates the amount a user bets per round"""
+        with self.connection:
+            dal.set_bet(self.connection, user_id, bet)
+
     def get_bet(self, user_id):
-        self.cursor.execute("SELECT bet FROM users WHERE user_id=?;", [str(user_id)])
-        result = self.cursor.fetchone()
-        if not result or len(result) <= 0:
-            return 0
-        return int(result["bet"])
-    
-    def add_user(self, user_id, lang_id, first_name, last_name, username):
-        if self.is_user_saved(user_id):
-            return
-        self._add_user(user_id, lang_id, first_name, last_name, username)
+        return dal.get_bet(self.connection, user_id)
 
-    def _add_user(self, user_id, lang_id, first_name, last_name, username):
-        try:
-            self.cursor.execute("INSERT INTO users VALUES (?, ?, ?, ?, 0, 0, 0,10, 0, 0);", [str(user_id), first_name, last_name, username])
-            self.cursor.execute("INSERT INTO chats VALUES (?, ?);", [str(user_id), lang_id])
-            self.connection.commit()
-        except sqlite3.IntegrityError:
-            return
+    def add_user(self, user_id, lang_id, first_name, last_name, username):
+        with self.connection:
+            if not dal.insert_user(self.connection, user_id, first_name, last_name, username):
+                return
+            dal.insert_chat(self.connection, user_id, lang_id)
+        lang_cache.invalidate(int(user_id))
 
     def set_games_won(self, games_won, user_id):
-        self.cursor.execute("UPDATE users SET games_won = ? WHERE user_id = ?;", [games_won, str(user_id)])
-        self.connection.commit()
+        with self.connection:
+            dal.set_games_won(self.connection, user_id, games_won)
 
     def set_games_played(self, games_played, user_id):
-        self.cursor.execute("UPDATE users SET games_played = ? WHERE user_id = ?;", [games_played, str(user_id)])
-        self.connection.commit()
+        with self.connection:
+            dal.set_games_played(self.connection, user_id, games_played)
 
     def set_last_played(self, last_played, user_id):
-        self.cursor.execute("UPDATE users SET last_played = ? WHERE user_id = ?;", [last_played, str(user_id)])
-        self.connection.commit()
+        with self.connection:
+            dal.set_last_played(self.connection, user_id, last_played)
 
     def is_user_saved(self, user_id):
-        self.cursor.execute("SELECT rowid, * FROM users WHERE user_id=?;", [str(user_id)])
-
-        result = self.cursor.fetchall()
-        if len(result) > 0:
-            return True
-        else:
-            return False
+        return dal.user_exists(self.connection, user_id)
 
     def user_data_changed(self, user_id, first_name, last_name, username):
-        self.cursor.execute("SELECT * FROM users WHERE user_id=?;", [str(user_id)])
-        result = self.cursor.fetchone()
-
-        # check if user is saved
-        if not result:
-            return True
-
-        if result["first_name"] == first_name and result["last_name"] == last_name and result["username"] == username:
-            return False
-
-        return True
+        return dal.user_data_changed(self.connection, user_id, first_name, last_name, username)
 
     def update_user_data(self, user_id, first_name, last_name, username):
-        self.cursor.execute("UPDATE users SET first_name=?, last_name=?, username=? WHERE user_id=?;", [first_name, last_name, username, str(user_id)])
-        self.connection.commit()
+        with self.connection:
+            dal.update_user_data(self.connection, user_id, first_name, last_name, username)
 
     def reset_stats(self, user_id):
-        self.cursor.execute("UPDATE users SET games_played='0', games_won='0', games_tie='0', last_played='0' WHERE user_id=?;", [str(user_id)])
-        self.connection.commit()
+        with self.connection:
+            dal.reset_stats(self.connection, user_id)
 
     def close_conn(self):
         self.connection.close()
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar history of all played hands, one row per player and round.
+Hands are stored in segment files with a fixed capacity. Every column is a contiguous array of fixed-width values,
+so analysis code can map a segment with mmap and read whole columns without copying or parsing them:
+
+    for segment in open_segments("handhistory"):
+        with segment:
+            payouts = segment.column("payout")
+
+Columns are numpy arrays if numpy is installed and memoryviews otherwise.
+A segment starts with a header of which `rows` is written last, so readers never see a partially written hand.
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_LOST = -1
+OUTCOME_TIE = 0
+OUTCOME_WON = 1
+
+# Cards are stored as card_id + 1, unused slots are 0. More cards than this don't fit into a hand without busting.
+MAX_CARDS = 12
+
+# name, struct format, values per row
+COLUMNS = [
+    ("timestamp", "q", 1),
+    ("chat_id", "q", 1),
+    ("game_id", "q", 1),
+    ("user_id", "q", 1),
+    ("bet", "q", 1),
+    ("payout", "q", 1),
+    ("outcome", "b", 1),
+    ("player_total", "B", 1),
+    ("dealer_total", "B", 1),
+    ("player_cards", "B", MAX_CARDS),
+    ("dealer_cards", "B", MAX_CARDS),
+]
+_COLUMN_INDEX = {name: index for index, (name, _, _) in enumerate(COLUMNS)}
+_NUMPY_TYPES = {"q": "<i8", "b": "i1", "B": "u1"}
+
+_MAGIC = b"BJHANDS1"
+# magic, capacity, first segment, last segment, rows - segments created by a compaction cover several segment numbers
+_HEADER = struct.Struct("<8sQQQQ")
+_ROWS_OFFSET = 32
+_HEADER_SIZE = 64
+
+_SEGMENT_NAME = "hands-{:08d}.col"
+_SEGMENT_PATTERN = re.compile(r"^hands-(\d{8})\.col$")
+
+
+class HandHistoryError(Exception):
+    pass
+
+
+def _column_offsets(capacity):
+    offsets = []
+    offset = _HEADER_SIZE
+    for _, fmt, count in COLUMNS:
+        offsets.append(offset)
+        offset += struct.calcsize(fmt) * count * capacity
+    return offsets, offset
+
+
+def _round_up(value, multiple=8):
+    return (value + multiple - 1) // multiple * multiple
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(_HEADER.size)
+    if len(data) != _HEADER.size:
+        raise HandHistoryError("'{}' is too short for a hand history segment".format(path))
+    magic, capacity, first, last, rows = _HEADER.unpack(data)
+    if magic != _MAGIC:
+        raise HandHistoryError("'{}' is not a hand history segment".format(path))
+    return capacity, first, last, rows
+
+
+def list_segments(directory):
+    """
+    Returns a sorted list of (segment number, path) tuples of the segments in a directory.
+    Segments which are already part of a compacted segment are left out.
+    """
+    segments = []
+    for name in os.listdir(directory):
+        match = _SEGMENT_PATTERN.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    segments.sort()
+
+    result = []
+    covered_until = 0
+    for number, path in segments:
+        if number <= covered_until:
+            # Leftover of a compaction which was interrupted before it deleted its inputs
+            continue
+        try:
+            _, _, last, _ = _read_header(path)
+        except (OSError, HandHistoryError) as e:
+            logger.warning("Skipping hand history segment '{}': {}".format(path, e))
+            continue
+        covered_until = last
+        result.append((number, path))
+    return result
+
+
+class HandSegment(object):
+    """Read-only view of a segment file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.capacity, self.first_segment, self.last_segment, self.rows = _HEADER.unpack_from(self._mmap, 0)
+        offsets, size = _column_offsets(self.capacity)
+        if magic != _MAGIC or len(self._mmap) < size:
+            self._mmap.close()
+            raise HandHistoryError("'{}' is not a valid hand history segment".format(path))
+        self._offsets = offsets
+        self._views = []
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def column(self, name):
+        """
+        Returns the values of a column without copying them. Card columns have the shape (rows, MAX_CARDS).
+        :param name: One of the names in COLUMNS
+        :return: A numpy array if numpy is installed, otherwise a memoryview
+        """
+        index = _COLUMN_INDEX[name]
+        _, fmt, count = COLUMNS[index]
+        offset = self._offsets[index]
+
+        if numpy is not None:
+            values = numpy.frombuffer(self._mmap, dtype=_NUMPY_TYPES[fmt], count=self.rows * count, offset=offset)
+            return values.reshape(self.rows, count) if count > 1 else values
+
+        view = memoryview(self._mmap)[offset:offset + self.rows * count * struct.calcsize(fmt)]
+        view = view.cast(fmt, shape=[self.rows, count]) if count > 1 else view.cast(fmt)
+        # Views must be released before the mmap can be closed
+        self._views.append(view)
+        return view
+
+    def _raw_column(self, index):
+        """Returns a copy of the bytes of a column"""
+        _, fmt, count = COLUMNS[index]
+        offset = self._offsets[index]
+        return self._mmap[offset:offset + self.rows * count * struct.calcsize(fmt)]
+
+    def rows_as_tuples(self):
+        """Yields every hand as a tuple in the order of COLUMNS - slow, but handy for small segments and tests"""
+        columns = []
+        for index, (name, _, width) in enumerate(COLUMNS):
+            if width > 1:
+                raw = self._raw_column(index)
+                columns.append([raw[row * width:(row + 1) * width] for row in range(self.rows)])
+            else:
+                columns.append(self.column(name))
+        for row in range(self.rows):
+            yield tuple(column[row] for column in columns)
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # numpy arrays of this segment are still in use - the mapping is released together with them
+            pass
+
+
+def open_segments(directory):
+    """Returns a HandSegment for every segment of a directory, oldest first"""
+    while True:
+        segments = []
+        try:
+            for _, path in list_segments(directory):
+                segments.append(HandSegment(path))
+            return segments
+        except FileNotFoundError:
+            # A compaction merged the segment into an earlier one in the meantime - list them again
+            for segment in segments:
+                segment.close()
+
+
+def _encode_cards(cards):
+    data = bytes(card.card_id + 1 for card in cards[:MAX_CARDS])
+    return data + bytes(MAX_CARDS - len(data))
+
+
+class _SegmentWriter(object):
+    """Appends rows to a new segment file, which is allocated with its full capacity right away"""
+
+    def __init__(self, path, number, capacity, first=None):
+        self.path = path
+        self.number = number
+        self.capacity = capacity
+        self.rows = 0
+        self._offsets, size = _column_offsets(capacity)
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self._fd, size)
+        os.pwrite(self._fd, _HEADER.pack(_MAGIC, capacity, number if first is None else first, number, 0), 0)
+
+    @property
+    def free(self):
+        return self.capacity - self.rows
+
+    def append(self, columns):
+        """
+        Writes rows given as one list of values per column
+        :param columns: List of value lists in the order of COLUMNS, card columns contain MAX_CARDS bytes per row
+        :return:
+        """
+        count = len(columns[0])
+        data = []
+        for (_, fmt, width), values in zip(COLUMNS, columns):
+            data.append(b"".join(values) if width > 1 else struct.pack("<{}{}".format(count, fmt), *values))
+        self.append_raw(data, count)
+
+    def append_raw(self, data, count):
+        """
+        Writes rows given as the encoded bytes of every column, then publishes them by updating the row count
+        :param data: List of bytes in the order of COLUMNS
+        :param count: The amount of rows
+        :return:
+        """
+        for (_, fmt, width), offset, chunk in zip(COLUMNS, self._offsets, data):
+            os.pwrite(self._fd, chunk, offset + self.rows * struct.calcsize(fmt) * width)
+        self.rows += count
+        os.pwrite(self._fd, struct.pack("<Q", self.rows), _ROWS_OFFSET)
+
+    def close(self):
+        os.fdatasync(self._fd)
+        os.close(self._fd)
+
+
+class HandHistory(object):
+    """
+    Collects the hands of finished games in memory and appends them to the current segment on a background thread.
+    Full segments are rolled over to a new one. Segments left partially filled by restarts are compacted into dense
+    segments by the same thread, so neither the bot nor readers of the history ever wait for it.
+    """
+
+    def __init__(self, directory, capacity=65536, flush_interval=1.0):
+        """
+        :param directory: The directory of the segment files
+        :param capacity: Amount of hands per segment
+        :param flush_interval: Seconds between two writes
+        """
+        if capacity <= 0 or capacity % 8 != 0:
+            raise ValueError("capacity must be a positive multiple of 8")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        # Never append to an existing segment - it might be read or compacted right now
+        last = 0
+        for _, path in list_segments(directory):
+            last = max(last, _read_header(path)[2])
+        self._writer = self._open_writer(last + 1)
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="HandHistoryWriter", daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, _SEGMENT_NAME.format(number))
+
+    def _open_writer(self, number):
+        return _SegmentWriter(self._segment_path(number), number, self.capacity)
+
+    @property
+    def segment(self):
+        """The number of the segment which is currently written"""
+        return self._writer.number
+
+    def record_game(self, game, timestamp=None):
+        """
+        Adds the hands of all players of an evaluated game. Games which were stopped before the evaluation are ignored.
+        :param game: The BlackJackGame object
+        :param timestamp: Unix time of the end of the game, defaults to now
+        :return:
+        """
+        if not (game.list_won or game.list_tie or game.list_lost):
+            return
+
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        won = {id(player) for player in game.list_won}
+        tie = {id(player) for player in game.list_tie}
+        dealer_cards = _encode_cards(game.dealer.cards)
+        dealer_total = min(game.dealer.cardvalue, 255)
+
+        rows = []
+        for player in game.players:
+            outcome = OUTCOME_WON if id(player) in won else OUTCOME_TIE if id(player) in tie else OUTCOME_LOST
+            rows.append((timestamp, game.chat_id, game.id, player.user_id, player.bet, player.win, outcome,
+                         min(player.cardvalue, 255), dealer_total, _encode_cards(player.cards), dealer_cards))
+
+        with self._lock:
+            self._pending.extend(rows)
+
+    def pending_hands(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """
+        Writes all collected hands, rolling over to new segments as they fill up
+        :return: The amount of written hands
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return 0
+
+        rolled_over = False
+        with self._write_lock:
+            start = 0
+            while start < len(pending):
+                if self._writer.free == 0:
+                    number = self._writer.number + 1
+                    self._writer.close()
+                    self._writer = self._open_writer(number)
+                    rolled_over = True
+
+                chunk = pending[start:start + self._writer.free]
+                self._writer.append([list(column) for column in zip(*chunk)])
+                start += len(chunk)
+
+        if rolled_over:
+            self.compact()
+        return len(pending)
+
+    def compact(self):
+        """
+        Merges neighbouring sealed segments which aren't full into dense segments of at most `capacity` hands.
+        The result is written to a new file first and covers the numbers of all merged segments, so readers and
+        crashes in the middle of a compaction never see a hand twice or lose one.
+        :return: The amount of removed segment files
+        """
+        with self._compact_lock:
+            return self._compact(self._writer.number)
+
+    def _compact(self, current):
+        groups = [[]]
+        group_rows = 0
+        for number, path in list_segments(self.directory):
+            if number >= current:
+                break
+            capacity, _, last, rows = _read_header(path)
+            if rows >= self.capacity:
+                # Full segments stay as they are
+                groups.append([])
+                group_rows = 0
+                continue
+            if group_rows + rows > self.capacity:
+                groups.append([])
+                group_rows = 0
+            groups[-1].append((number, path, capacity, last, rows))
+            group_rows += rows
+
+        removed = 0
+        for group in groups:
+            if not group or (len(group) == 1 and group[0][2] == _round_up(group[0][4]) and group[0][4] > 0):
+                # Nothing to merge and already dense
+                continue
+            try:
+                removed += self._merge(group)
+            except (OSError, HandHistoryError) as e:
+                logger.error("Couldn't compact hand history segments {}: {}".format([entry[0] for entry in group], e))
+        return removed
+
+    def _merge(self, group):
+        rows = sum(entry[4] for entry in group)
+        if rows == 0:
+            # Segments of runs without any finished game
+            for _, path, _, _, _ in group:
+                os.remove(path)
+            return len(group)
+
+        first = group[0][0]
+        target = self._segment_path(first)
+        temp_path = target + ".tmp"
+        writer = _SegmentWriter(temp_path, group[-1][3], _round_up(rows), first=first)
+        try:
+            for _, path, _, _, _ in group:
+                with HandSegment(path) as segment:
+                    writer.append_raw([segment._raw_column(index) for index in range(len(COLUMNS))], segment.rows)
+        finally:
+            writer.close()
+
+        # The merged segment replaces the first one and covers the others until they are removed
+        os.replace(temp_path, target)
+        for _, path, _, _, _ in group[1:]:
+            os.remove(path)
+        return len(group) - 1
+
+    def _run(self):
+        # Clean up after previous runs before the first write
+        try:
+            self.compact()
+        except (OSError, HandHistoryError) as e:
+            logger.error("Couldn't compact hand history: {}".format(e))
+
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("Couldn't write hand history: {}".format(e))
+
+    def close(self):
+        """Writes all remaining hands and stops the background thread"""
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        self._writer.close()
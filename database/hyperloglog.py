@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import math
+import struct
+
+_USER_ID = struct.Struct("<q")
+# 2^-rank for every possible register value, so that estimating doesn't need to call pow() for each register
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+class HyperLogLog(object):
+    """
+    Approximate counter of distinct user_ids. Memory use and the time to count are fixed by the precision,
+    no matter how many users were added: 2^precision one-byte registers with a standard error of 1.04 / sqrt(2^precision).
+    """
+
+    def __init__(self, precision=12, registers=None):
+        """
+        :param precision: Amount of hash bits used to pick a register, between 4 and 16
+        :param registers: The registers of a stored counter, see to_bytes()
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+
+        self.precision = precision
+        size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(size)
+        elif len(registers) != size:
+            raise ValueError("Expected {} registers, got {}".format(size, len(registers)))
+        else:
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a counter from the output of to_bytes() - the precision follows from the amount of registers"""
+        return cls(precision=len(data).bit_length() - 1, registers=data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, user_id):
+        value = int.from_bytes(hashlib.blake2b(_USER_ID.pack(int(user_id)), digest_size=8).digest(), "little")
+        index = value >> (64 - self.precision)
+        # Position of the first 1-bit in the remaining bits
+        remaining = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Adds all users counted by another counter of the same precision to this counter"""
+        if other.precision != self.precision:
+            raise ValueError("Can't merge counters of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Returns the estimated amount of distinct user_ids"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(_INVERSE_POWERS[rank] for rank in self.registers)
+
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * size and empty > 0:
+            # Linear counting is more accurate for small amounts
+            estimate = size * math.log(size / empty)
+        return int(round(estimate))
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+
+from .asyncdatabase import AsyncDatabase
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = 0
+
+
+def _rank_key(user_id, first_name, games_played, games_won):
+    # Most wins first, fewer games (= higher winning rate) breaks ties
+    return -games_won, games_played, user_id, first_name
+
+
+class Leaderboards(object):
+    """
+    Global and per chat leaderboards ranked by won games.
+    The counters live in the leaderboard_stats table and are updated incrementally after each game. The top entries
+    of recently used scopes are kept in memory, so serving a leaderboard never needs more than one indexed query.
+    """
+    _instance = None
+    _initialized = False
+
+    size = 10
+    max_scopes = 10000
+
+    def __new__(cls):
+        if Leaderboards._instance is None:
+            Leaderboards._instance = super(Leaderboards, cls).__new__(cls)
+        return Leaderboards._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # (scope, user_id) -> [first_name, games_played, games_won]
+        self._pending = {}
+        # scope -> sorted list of rank keys, at most `size` entries
+        self._tops = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def add_game(self, chat_id, user_id, first_name, won, group=True):
+        """
+        Counts a finished game for the global leaderboard and - for group games - the leaderboard of the chat
+        :param chat_id: The chat the game was played in
+        :param user_id: The user_id of the player
+        :param first_name: The name to display on the leaderboard
+        :param won: True if the player won the game
+        :param group: False for singleplayer games, which only count for the global leaderboard
+        :return:
+        """
+        if user_id <= 0:
+            return
+
+        scopes = (GLOBAL_SCOPE, chat_id) if group else (GLOBAL_SCOPE,)
+        with self._lock:
+            for scope in scopes:
+                counters = self._pending.get((scope, user_id))
+                if counters is None:
+                    counters = self._pending[(scope, user_id)] = [first_name, 0, 0]
+                counters[0] = first_name
+                counters[1] += 1
+                if won:
+                    counters[2] += 1
+
+    def flush(self, connection=None):
+        """
+        Writes all collected increments to the database and updates the leaderboards in memory with the new totals
+        :param connection: The sqlite3 connection to use, e.g. the one of a DatabaseWorker. Defaults to the connection of Database().
+        :return: The amount of updated rows
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        if connection is None:
+            connection = Database().connection
+
+        totals = []
+        try:
+            with connection:
+                for (scope, user_id), (first_name, played, won) in pending.items():
+                    row = connection.execute("INSERT INTO leaderboard_stats (scope, user_id, first_name, games_played, games_won) "
+                                             "VALUES (?, ?, ?, ?, ?) ON CONFLICT(scope, user_id) DO UPDATE SET "
+                                             "first_name = excluded.first_name, games_played = games_played + excluded.games_played, "
+                                             "games_won = games_won + excluded.games_won RETURNING games_played, games_won;",
+                                             [scope, user_id, first_name, played, won]).fetchone()
+                    totals.append((scope, user_id, first_name, row[0], row[1]))
+        except Exception:
+            logger.exception("Couldn't write leaderboard of {} players - keeping them for the next flush".format(len(pending)))
+            self._restore(pending)
+            return 0
+
+        with self._lock:
+            for scope, user_id, first_name, games_played, games_won in totals:
+                self._update_top(scope, user_id, first_name, games_played, games_won)
+
+        return len(totals)
+
+    def _restore(self, pending):
+        """Merges increments which couldn't be written back into the buffer"""
+        with self._lock:
+            for key, (first_name, played, won) in pending.items():
+                counters = self._pending.setdefault(key, [first_name, 0, 0])
+                counters[1] += played
+                counters[2] += won
+
+    def _update_top(self, scope, user_id, first_name, games_played, games_won):
+        """
+        Moves a player to their new position in a loaded leaderboard - must be called with the lock held.
+        Counters only ever grow, so a player who isn't part of the top entries can only enter them through this method,
+        which keeps the in-memory leaderboard exact without ever rescanning the table.
+        """
+        entries = self._tops.get(scope)
+        if entries is None:
+            # Not loaded - the next load reads the new totals from the database
+            return
+
+        for index, entry in enumerate(entries):
+            if entry[2] == user_id:
+                del entries[index]
+                break
+
+        bisect.insort(entries, _rank_key(user_id, first_name, games_played, games_won))
+        del entries[self.size:]
+
+    def _load(self, connection, scope):
+        rows = connection.execute("SELECT user_id, first_name, games_played, games_won FROM leaderboard_stats WHERE scope=? "
+                                  "ORDER BY games_won DESC, games_played ASC, user_id ASC LIMIT ?;", [scope, self.size]).fetchall()
+        entries = [_rank_key(row[0], row[1], row[2], row[3]) for row in rows]
+
+        with self._lock:
+            self._tops[scope] = entries
+            self._tops.move_to_end(scope)
+            while len(self._tops) > self.max_scopes:
+                self._tops.popitem(last=False)
+            return self._entries(entries)
+
+    @staticmethod
+    def _entries(entries):
+        return [(user_id, first_name, games_played, -negative_won) for negative_won, games_played, user_id, first_name in entries]
+
+    async def get_top(self, scope=GLOBAL_SCOPE):
+        """
+        Returns the leaderboard of a scope
+        :param scope: The chat_id of a group or GLOBAL_SCOPE
+        :return: List of (user_id, first_name, games_played, games_won) tuples, best player first
+        """
+        with self._lock:
+            entries = self._tops.get(scope)
+            if entries is not None:
+                self._tops.move_to_end(scope)
+                return self._entries(entries)
+
+        return await AsyncDatabase().run(self._load, scope)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Double-entry ledger of the bets and payouts of all rounds. Every movement is booked twice - once on the player's account
+and once with the opposite sign on the house account - so the amounts of a round always add up to zero.
+The net change of the player accounts is pushed to the remote balance service by the LedgerSettler in the background.
+"""
+import asyncio
+import logging
+import threading
+from time import time
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_PLAYER = "player"
+ACCOUNT_HOUSE = "house"
+
+
+class Ledger(object):
+    """
+    Collects the ledger entries of finished rounds in memory and writes them to the database in batches
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if Ledger._instance is None:
+            Ledger._instance = super(Ledger, cls).__new__(cls)
+        return Ledger._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # Rows for the ledger table: (round_id, user_id, account, kind, amount, created)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def record_round(self, round_id, user_id, bet, payout):
+        """
+        Books the bet and the payout of a player in a round
+        :param round_id: Unique id of the round, e.g. chat_id, game.id and the start time
+        :param user_id: The user_id of the player
+        :param bet: The amount the player has bet
+        :param payout: The amount paid out to the player, including the returned bet
+        :return:
+        """
+        if user_id <= 0:
+            return
+
+        bet = int(bet)
+        payout = int(round(payout))
+        created = int(time())
+        entries = []
+        if bet:
+            entries.append((round_id, user_id, ACCOUNT_PLAYER, "bet", -bet, created))
+            entries.append((round_id, user_id, ACCOUNT_HOUSE, "bet", bet, created))
+        if payout:
+            entries.append((round_id, user_id, ACCOUNT_PLAYER, "payout", payout, created))
+            entries.append((round_id, user_id, ACCOUNT_HOUSE, "payout", -payout, created))
+
+        with self._lock:
+            self._pending.extend(entries)
+
+    def record_game(self, game):
+        """
+        Books all players of an evaluated game. Games which were stopped before the evaluation don't move any money.
+        :param game: The BlackJackGame object
+        :return:
+        """
+        if not (game.list_won or game.list_tie or game.list_lost):
+            return
+
+        round_id = "{}:{}:{}".format(game.chat_id, game.id, int(game.datetime_started.timestamp()))
+        for player in game.players:
+            self.record_round(round_id, player.user_id, player.bet, player.win)
+
+    def pending_entries(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, connection=None):
+        """
+        Writes all collected entries to the database in a single transaction
+        :param connection: The sqlite3 connection to use, e.g. the one of a DatabaseWorker. Defaults to the connection of Database().
+        :return: The amount of written entries
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return 0
+
+        if connection is None:
+            connection = Database().connection
+        try:
+            with connection:
+                # Entries are unique per round, user, account and kind, so writing a batch twice doesn't book it twice
+                connection.executemany("INSERT OR IGNORE INTO ledger (round_id, user_id, account, kind, amount, created) "
+                                       "VALUES (?, ?, ?, ?, ?, ?);", pending)
+        except Exception:
+            logger.exception("Couldn't write {} ledger entries - keeping them for the next flush".format(len(pending)))
+            with self._lock:
+                self._pending[:0] = pending
+            return 0
+
+        logger.debug("Flushed {} ledger entries".format(len(pending)))
+        return len(pending)
+
+
+def _claim_settlements(connection, limit):
+    """
+    Creates settlements for the unsettled entries of up to limit users and returns all settlements which aren't confirmed yet.
+    The idempotency key of a settlement never changes, so retrying it after a crash can't change a balance twice.
+    """
+    groups = connection.execute("SELECT user_id, SUM(amount), MAX(entry_id) FROM ledger WHERE settlement_id=0 AND account=? "
+                                "GROUP BY user_id LIMIT ?;", [ACCOUNT_PLAYER, limit]).fetchall()
+    now = int(time())
+    for user_id, amount, last_entry_id in groups:
+        key = "ledger-{}-{}".format(user_id, last_entry_id)
+        # Settlements without a balance change don't need to be sent at all
+        settlement_id = connection.execute("INSERT INTO settlements (idempotency_key, user_id, amount, created, done) VALUES (?, ?, ?, ?, ?);",
+                                           [key, user_id, amount, now, 1 if amount == 0 else 0]).lastrowid
+        connection.execute("UPDATE ledger SET settlement_id=? WHERE user_id=? AND settlement_id=0 AND entry_id<=?;",
+                           [settlement_id, user_id, last_entry_id])
+
+    return connection.execute("SELECT settlement_id, idempotency_key, user_id, amount FROM settlements WHERE done=0 "
+                              "ORDER BY settlement_id LIMIT ?;", [limit]).fetchall()
+
+
+def _finish_settlements(connection, settlement_ids):
+    connection.executemany("UPDATE settlements SET done=1 WHERE settlement_id=?;", [(settlement_id,) for settlement_id in settlement_ids])
+
+
+class LedgerSettler(object):
+    """
+    Pushes the net balance changes of the ledger to the remote balance service in batches
+    """
+    batch_size = 500
+    max_attempts = 5
+    retry_delay = 1
+
+    def __init__(self, client):
+        """
+        :param client: Client of the balance service with a method apply_balance_changes(changes), which takes a list of dicts
+        with the keys user_id, amount and idempotency_key and must ignore keys it has already applied.
+        """
+        self.client = client
+        self._lock = asyncio.Lock()
+
+    async def settle(self):
+        """
+        Settles all unsettled ledger entries
+        :return: The amount of confirmed settlements
+        """
+        from .asyncdatabase import AsyncDatabase
+
+        # Overlapping runs would send the same settlements twice
+        if self._lock.locked():
+            return 0
+
+        settled = 0
+        async with self._lock:
+            while True:
+                settlements = await AsyncDatabase().run(_claim_settlements, self.batch_size, write=True)
+                if not settlements:
+                    return settled
+
+                changes = [{"user_id": row["user_id"], "amount": row["amount"], "idempotency_key": row["idempotency_key"]}
+                           for row in settlements]
+                if not await self._send(changes):
+                    return settled
+
+                await AsyncDatabase().run(_finish_settlements, [row["settlement_id"] for row in settlements], write=True)
+                settled += len(settlements)
+
+                if len(settlements) < self.batch_size:
+                    return settled
+
+    async def _send(self, changes):
+        """Sends a batch of changes with exponential backoff. Returns False if all attempts failed."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                # The client is synchronous, so it must not run on the event loop
+                await asyncio.to_thread(self.client.apply_balance_changes, changes)
+                return True
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error("Couldn't settle {} balance changes, retrying with the next run: {}".format(len(changes), e))
+                    return False
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning("Settling {} balance changes failed (attempt {}), retrying in {}s: {}".format(len(changes), attempt, delay, e))
+                await asyncio.sleep(delay)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+from .asyncdatabase import AsyncDatabase
+from .database import Database
+from .leaderboard import GLOBAL_SCOPE
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_HOUR = 3600
+
+
+def _hour(timestamp):
+    return int(timestamp) // SECONDS_PER_HOUR
+
+
+class PnlReport(object):
+    """Totals of all rounds in a time window"""
+    __slots__ = ("rounds", "hands", "wagered", "paid")
+
+    def __init__(self, rounds=0, hands=0, wagered=0, paid=0):
+        self.rounds = rounds
+        self.hands = hands
+        self.wagered = wagered
+        self.paid = paid
+
+    @property
+    def house_profit(self):
+        return self.wagered - self.paid
+
+    @property
+    def rtp(self):
+        """Return to player - the share of the wagered amount which was paid out, or None without any bets"""
+        if not self.wagered:
+            return None
+        return self.paid / self.wagered
+
+
+class PnlRollups(object):
+    """
+    Profit and loss of the house per hour and chat. Finished rounds are added to counters in memory, which are added to
+    the pnl_rollups table in batches. Every round is counted for its chat and for GLOBAL_SCOPE, so the report of any
+    window reads one row per hour and never looks at single rounds.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if PnlRollups._instance is None:
+            PnlRollups._instance = super(PnlRollups, cls).__new__(cls)
+        return PnlRollups._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # (chat_id, hour) -> [rounds, hands, wagered, paid]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def record_game(self, game, timestamp=None):
+        """
+        Counts an evaluated game. Games which were stopped before the evaluation don't move any money.
+        :param game: The BlackJackGame object
+        :param timestamp: Unix time of the end of the game, defaults to now
+        :return:
+        """
+        if not (game.list_won or game.list_tie or game.list_lost):
+            return
+
+        players = [player for player in game.players if player.user_id > 0]
+        wagered = sum(int(player.bet) for player in players)
+        paid = sum(int(round(player.win)) for player in players)
+        self.add_round(game.chat_id, len(players), wagered, paid, timestamp)
+
+    def add_round(self, chat_id, hands, wagered, paid, timestamp=None):
+        """
+        Counts a round for its chat and globally
+        :param chat_id: The chat the round was played in
+        :param hands: Amount of players in the round
+        :param wagered: Sum of the bets
+        :param paid: Sum of the payouts, including returned bets
+        :param timestamp: Unix time of the end of the round, defaults to now
+        :return:
+        """
+        hour = _hour(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            for scope in (GLOBAL_SCOPE, chat_id):
+                counters = self._pending.get((scope, hour))
+                if counters is None:
+                    counters = self._pending[(scope, hour)] = [0, 0, 0, 0]
+                counters[0] += 1
+                counters[1] += hands
+                counters[2] += wagered
+                counters[3] += paid
+
+    def pending_buckets(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, connection=None):
+        """
+        Adds all collected counters to the pnl_rollups table in a single transaction
+        :param connection: The sqlite3 connection to use, e.g. the one of a DatabaseWorker. Defaults to the connection of Database().
+        :return: The amount of updated buckets
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        if connection is None:
+            connection = Database().connection
+
+        try:
+            with connection:
+                connection.executemany("INSERT INTO pnl_rollups (chat_id, hour, rounds, hands, wagered, paid) VALUES (?, ?, ?, ?, ?, ?) "
+                                       "ON CONFLICT(chat_id, hour) DO UPDATE SET rounds = rounds + excluded.rounds, "
+                                       "hands = hands + excluded.hands, wagered = wagered + excluded.wagered, paid = paid + excluded.paid;",
+                                       [(chat_id, hour, *counters) for (chat_id, hour), counters in pending.items()])
+        except Exception:
+            logger.exception("Couldn't write {} P&L buckets - keeping them for the next flush".format(len(pending)))
+            self._restore(pending)
+            return 0
+
+        return len(pending)
+
+    def _restore(self, pending):
+        """Merges counters which couldn't be written back into the buffer"""
+        with self._lock:
+            for key, counters in pending.items():
+                current = self._pending.setdefault(key, [0, 0, 0, 0])
+                for index, value in enumerate(counters):
+                    current[index] += value
+
+    def report(self, connection, hours, chat_id=GLOBAL_SCOPE, timestamp=None):
+        """
+        Sums the buckets of a window, including the counters which weren't written yet
+        :param connection: The sqlite3 connection to read the buckets from
+        :param hours: Length of the window in hours, ending with the current hour
+        :param chat_id: The chat to report or GLOBAL_SCOPE for all chats
+        :param timestamp: Unix time of the end of the window, defaults to now
+        :return: A PnlReport
+        """
+        last = _hour(time.time() if timestamp is None else timestamp)
+        first = last - hours + 1
+        row = connection.execute("SELECT SUM(rounds), SUM(hands), SUM(wagered), SUM(paid) FROM pnl_rollups "
+                                 "WHERE chat_id=? AND hour BETWEEN ? AND ?;", [chat_id, first, last]).fetchone()
+        totals = [value or 0 for value in row]
+
+        # The buffer only holds the buckets of the last few seconds
+        with self._lock:
+            for (scope, hour), counters in self._pending.items():
+                if scope == chat_id and first <= hour <= last:
+                    totals = [total + value for total, value in zip(totals, counters)]
+        return PnlReport(*totals)
+
+    async def get_report(self, hours, chat_id=GLOBAL_SCOPE):
+        """Returns the PnlReport of the last `hours` hours, see report()"""
+        return await AsyncDatabase().run(self.report, hours, chat_id)
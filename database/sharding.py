@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Spreads the users table over several SQLite files by a hash of the user_id. Every file gets its own connection and
+writer thread, so commits for different shards don't wait for each other. All other tables (chats, admins, ...) stay in the main file.
+"""
+import asyncio
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from .database import Database
+from .worker import DatabaseWorker
+
+_USER_ID = struct.Struct("<q")
+
+
+def shard_of(user_id, count):
+    """
+    Returns the index of the shard storing a user
+    :param user_id: The user_id of the user
+    :param count: The total amount of shards
+    :return:
+    """
+    if count == 1:
+        return 0
+    # crc32 instead of hash(), because the mapping must be the same in every process
+    return zlib.crc32(_USER_ID.pack(int(user_id))) % count
+
+
+class Shard(namedtuple("Shard", ["index", "count"])):
+    """One of count shards. 'user_id in shard' checks if a user is stored in this shard."""
+
+    def __contains__(self, user_id):
+        return shard_of(user_id, self.count) == self.index
+
+
+def shard_path(directory, index, count):
+    # The total is part of the name, so that a changed shard count never reads files with a different distribution
+    return os.path.join(directory, "users-{}-of-{}.db".format(index, count))
+
+
+class ShardedStore(object):
+    """
+    Owns the DatabaseWorkers of the main database file and of the user shards.
+    With a single shard, the users are stored in the main file and everything runs on one worker.
+    """
+
+    def __init__(self, directory, shards=1):
+        """
+        :param directory: The directory containing users.db and the shard files
+        :param shards: The amount of files the users table is spread over
+        """
+        if shards < 1:
+            raise ValueError("At least one shard is needed, got {}".format(shards))
+
+        self.directory = directory
+        self.shards = shards
+
+        main_path = os.path.join(directory, "users.db")
+        Database.create_database(main_path)
+        self.main = DatabaseWorker(main_path)
+
+        if shards == 1:
+            self.shard_workers = [self.main]
+            return
+
+        self.shard_workers = []
+        for index in range(shards):
+            path = shard_path(directory, index, shards)
+            Database.create_user_shard(path)
+            self.shard_workers.append(DatabaseWorker(path, name="DatabaseWorker-shard-{}".format(index)))
+
+    @property
+    def sharded(self):
+        return self.shards > 1
+
+    @property
+    def paths(self):
+        """Paths of all database files, the main file first"""
+        return [self.main.database_path] + [worker.database_path for worker in self.shard_workers if worker is not self.main]
+
+    def worker_for(self, user_id):
+        """Returns the DatabaseWorker of the shard storing a user"""
+        return self.shard_workers[shard_of(user_id, self.shards)]
+
+    async def run(self, func, *args, write=False):
+        """Runs a job on the main database file"""
+        return await asyncio.wrap_future(self.main.submit(func, *args, write=write))
+
+    async def run_user(self, user_id, func, *args, write=False):
+        """Runs a job on the shard of a user"""
+        return await asyncio.wrap_future(self.worker_for(user_id).submit(func, *args, write=write))
+
+    async def run_on_shards(self, func, *args, write=False):
+        """
+        Runs a job on all shards in parallel. func is called with the connection, the Shard and *args.
+        :return: List of the results, ordered by shard index
+        """
+        futures = [asyncio.wrap_future(worker.submit(func, Shard(index, self.shards), *args, write=write))
+                   for index, worker in enumerate(self.shard_workers)]
+        return await asyncio.gather(*futures)
+
+    def close(self):
+        """Executes all queued jobs and stops all workers"""
+        for worker in self.shard_workers:
+            if worker is not self.main:
+                worker.close()
+        self.main.close()
@@ -16,7 +16,7 @@ def set_game_won(user_id):
         if user is None:
             logger.warning("User '{}' is None - can't set won games!".format(user))
             return
-        games_won = int(user[5]) + 1
+        games_won = user.games_won + 1
         logger.debug("Add game won for user: {}".format(user_id))
         db.set_games_won(games_won, user_id)
 
@@ -41,26 +41,18 @@ def generate_bar_chart(win_percentage):
     return "🏆" * win_portion + "🔴" * loss_portion
 
 
-def get_user_stats(user_id):
+def get_user_stats(user, lang_id):
     """
     Generates and returns a string displaying the statistics of a user
-    :param user_id: The user_id of a specific user
+    :param user: The UserRow of a specific user or None
+    :param lang_id: The language to use for the statistics
     :return:
     """
-    user = Database().get_user(user_id)
-
     if user is None:
-        logger.warning("User '{}' is not stored in the database!".format(user_id))
+        logger.warning("User is not stored in the database!")
         return "No statistics found!"
 
-    lang_id = Database().get_lang_id(user_id)
-
-    try:
-        played_games, won_games, _, last_played = user[4:8]
-    except ValueError as e:
-        logger.warning("Cannot unpack user - {}".format(e))
-        raise
-
+    played_games, won_games, last_played = user.games_played, user.games_won, user.last_played
     if played_games == 0:
         # prevent division by zero errors
         return translate("no_stats")
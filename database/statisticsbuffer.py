@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from time import time
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class StatisticsBuffer(object):
+    """
+    Collects the statistics increments of finished games in memory and writes them to the database in batches.
+    Several games of the same user between two flushes are coalesced into a single row update.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if StatisticsBuffer._instance is None:
+            StatisticsBuffer._instance = super(StatisticsBuffer, cls).__new__(cls)
+        return StatisticsBuffer._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # user_id -> [games_played, games_won, last_played]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def add_game(self, user_id, won):
+        """
+        Counts a finished game for a user
+        :param user_id: The user_id of the player
+        :param won: True if the player won the game
+        :return:
+        """
+        with self._lock:
+            counters = self._pending.get(user_id)
+            if counters is None:
+                counters = self._pending[user_id] = [0, 0, 0]
+            counters[0] += 1
+            if won and user_id > 0:
+                counters[1] += 1
+            counters[2] = int(time())
+
+    def pending_users(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, connection=None):
+        """
+        Writes all collected increments to the database in a single transaction
+        :param connection: The sqlite3 connection to use, e.g. the one of a DatabaseWorker. Defaults to the connection of Database().
+        :return: The amount of updated users
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if connection is None:
+            connection = Database().connection
+        return self._write(connection, pending)
+
+    async def flush_shards(self, store=None):
+        """
+        Writes all collected increments with one transaction per shard of the users table, all shards in parallel
+        :param store: The ShardedStore to write to. Defaults to the store of AsyncDatabase().
+        :return: The amount of updated users
+        """
+        # Imported here, because the asyncdatabase module imports the Database, which imports the database package
+        from .asyncdatabase import AsyncDatabase
+        from .sharding import shard_of
+
+        if store is None:
+            store = AsyncDatabase().store
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        # Partition once on the event loop instead of letting every shard scan all users
+        partitions = [{} for _ in range(store.shards)]
+        for user_id, counters in pending.items():
+            partitions[shard_of(user_id, store.shards)][user_id] = counters
+
+        return sum(await store.run_on_shards(self._write_shard, partitions, write=True))
+
+    def _write_shard(self, connection, shard, partitions):
+        return self._write(connection, partitions[shard.index])
+
+    def _write(self, connection, pending):
+        if not pending:
+            return 0
+
+        # Plain UPDATEs instead of UPSERTs: users who never used /start must not be created without their profile data
+        rows = [(played, won, last_played, user_id) for user_id, (played, won, last_played) in pending.items()]
+        try:
+            with connection:
+                connection.executemany("UPDATE users SET games_played = games_played + ?, games_won = games_won + ?, "
+                                       "last_played = MAX(last_played, ?) WHERE user_id = ?;", rows)
+        except Exception:
+            logger.exception("Couldn't write statistics of {} users - keeping them for the next flush".format(len(rows)))
+            self._restore(pending)
+            return 0
+
+        logger.debug("Flushed statistics of {} users".format(len(rows)))
+        return len(rows)
+
+    def _restore(self, pending):
+        """Merges increments which couldn't be written back into the buffer"""
+        with self._lock:
+            for user_id, (played, won, last_played) in pending.items():
+                counters = self._pending.setdefault(user_id, [0, 0, 0])
+                counters[0] += played
+                counters[1] += won
+                counters[2] = max(counters[2], last_played)
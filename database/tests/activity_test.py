@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import ActivityCounters, Database
+
+DAY = 86400
+NOW = 20000 * DAY + 3600
+
+
+class ActivityCountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tempdir.name, "users.db")
+        Database.create_database(path)
+        self.connection = sqlite3.connect(path)
+        self.counters = ActivityCounters()
+        self.counters.flush(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+        self.tempdir.cleanup()
+
+    def test_daily_weekly_monthly(self):
+        # 100 players today, 200 others 3 days ago, 300 others 20 days ago and 400 others 40 days ago
+        for offset, (days_ago, players) in enumerate([(0, 100), (3, 200), (20, 300), (40, 400)]):
+            for user_id in range(1, players + 1):
+                self.counters.add_player(offset * 1000 + user_id, NOW - days_ago * DAY)
+        self.assertEqual(4, self.counters.flush(self.connection))
+
+        daily, weekly, monthly = self.counters.count(self.connection, NOW)
+        self.assertAlmostEqual(100, daily, delta=5)
+        self.assertAlmostEqual(300, weekly, delta=10)
+        self.assertAlmostEqual(600, monthly, delta=20)
+
+    def test_distinct_across_days(self):
+        """Players active on several days are counted once per week"""
+        for days_ago in range(7):
+            for user_id in range(1, 51):
+                self.counters.add_player(user_id, NOW - days_ago * DAY)
+        self.counters.flush(self.connection)
+        self.assertAlmostEqual(50, self.counters.count(self.connection, NOW)[1], delta=3)
+
+    def test_flush_merges(self):
+        """Flushing the same day twice adds to the stored counter"""
+        for user_id in range(1, 51):
+            self.counters.add_player(user_id, NOW)
+        self.counters.flush(self.connection)
+        for user_id in range(51, 101):
+            self.counters.add_player(user_id, NOW)
+
+        # Players which weren't written yet are counted as well
+        self.assertAlmostEqual(100, self.counters.count(self.connection, NOW)[0], delta=5)
+        self.counters.flush(self.connection)
+        self.assertEqual(0, self.counters.pending_days())
+        self.assertAlmostEqual(100, self.counters.count(self.connection, NOW)[0], delta=5)
+        self.assertEqual(1, self.connection.execute("SELECT COUNT(*) FROM activity;").fetchone()[0])
+
+    def test_ignores_dealer(self):
+        self.counters.add_player(-1, NOW)
+        self.assertEqual(0, self.counters.pending_days())
+
+
+if __name__ == '__main__':
+    unittest.main()
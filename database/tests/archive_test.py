@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from database import Archiver, AsyncDatabase, ShardedStore
+
+DAY = 86400
+NOW = int(time.time())
+USER_IDS = range(4980, 4990)
+
+
+class ArchiverTest(unittest.TestCase):
+    shards = 1
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store = ShardedStore(self.tempdir.name, self.shards)
+        self.db = AsyncDatabase()
+        self.patcher = mock.patch.object(self.db, "store", self.store)
+        self.patcher.start()
+
+        async def add():
+            for user_id in USER_IDS:
+                await self.db.add_user(user_id, "de", "Player", None, None)
+                # Even user_ids are active, odd ones didn't play for a year
+                last_played = NOW - DAY if user_id % 2 == 0 else NOW - 365 * DAY
+                await self.db.run_user(user_id, lambda connection, uid, played: connection.execute(
+                    "UPDATE users SET last_played=?, games_played=7 WHERE user_id=?;", [played, uid]), user_id, last_played, write=True)
+        asyncio.run(add())
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.store.close()
+        self.tempdir.cleanup()
+
+    def _count(self, table):
+        total = 0
+        for path in self.store.paths:
+            connection = sqlite3.connect(path)
+            try:
+                if connection.execute("SELECT 1 FROM sqlite_master WHERE name=?;", [table]).fetchone():
+                    total += connection.execute("SELECT COUNT(*) FROM {};".format(table)).fetchone()[0]
+            finally:
+                connection.close()
+        return total
+
+    def _archive(self, **kwargs):
+        archiver = Archiver(inactive_days=30, batch_size=2, pause=0, is_active=kwargs.get("is_active", lambda user_id: False))
+        return asyncio.run(archiver.run(NOW))
+
+    def test_archive_inactive_users(self):
+        self.assertEqual(5, self._archive())
+        self.assertEqual(5, self._count("users"))
+        self.assertEqual(5, self._count("users_archive"))
+        # The private chats of archived users are archived as well
+        self.assertEqual(5, self._count("chats"))
+        self.assertEqual(5, self._count("chats_archive"))
+        # Running again finds nothing new
+        self.assertEqual(0, self._archive())
+
+    def test_active_users_stay(self):
+        self.assertEqual(4, self._archive(is_active=lambda user_id: user_id == 4981))
+        self.assertIsNotNone(asyncio.run(self.db.run_user(4981, lambda connection, uid: connection.execute(
+            "SELECT 1 FROM users WHERE user_id=?;", [uid]).fetchone(), 4981)))
+
+    def test_banned_users_stay(self):
+        asyncio.run(self.db.run_user(4983, lambda connection, uid: connection.execute(
+            "UPDATE users SET banned=1 WHERE user_id=?;", [uid]), 4983, write=True))
+        self.assertEqual(4, self._archive())
+
+    def test_restore_on_request(self):
+        self._archive()
+        lang_id, user, bet = asyncio.run(self.db.get_request_data(4981, 4981))
+        self.assertEqual("de", lang_id)
+        self.assertEqual(7, user.games_played)
+        self.assertEqual(4, self._count("users_archive"))
+        self.assertEqual(4, self._count("chats_archive"))
+
+    def test_restore_on_get_user(self):
+        self._archive()
+        self.assertEqual(7, asyncio.run(self.db.get_user(4983)).games_played)
+        self.assertIsNone(asyncio.run(self.db.get_user(4999)))
+
+    def test_add_user_restores(self):
+        """An archived user who starts again keeps their statistics"""
+        self._archive()
+        self.assertFalse(asyncio.run(self.db.save_user(4985, "en", "Player", None, None)))
+        self.assertEqual(7, asyncio.run(self.db.get_user(4985)).games_played)
+        self.assertEqual(4, self._count("users_archive"))
+
+    def test_archive_chat(self):
+        asyncio.run(self.db.set_lang_id(-4980, "es"))
+        asyncio.run(self.db.archive_chat(-4980))
+        self.assertEqual(1, self._count("chats_archive"))
+        self.assertEqual("es", asyncio.run(self.db.get_lang_id(-4980)))
+        self.assertEqual(0, self._count("chats_archive"))
+
+
+class ShardedArchiverTest(ArchiverTest):
+    """The same with the users spread over several files and the chats in the main file"""
+    shards = 3
+
+
+if __name__ == '__main__':
+    unittest.main()
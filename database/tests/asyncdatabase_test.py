@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from database import DatabaseWorker
+
+
+def _create_table(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS items (value INTEGER);")
+
+
+def _insert(connection, value):
+    connection.execute("INSERT INTO items (value) VALUES (?);", [value])
+    return threading.current_thread().name
+
+
+def _count(connection):
+    return connection.execute("SELECT COUNT(*) FROM items;").fetchone()[0]
+
+
+def _fail(connection):
+    raise ValueError("Broken query")
+
+
+def _insert_and_fail(connection, values):
+    for value in values:
+        connection.execute("INSERT INTO items (value) VALUES (?);", [value])
+    raise ValueError("Broken after {} inserts".format(len(values)))
+
+
+def _insert_and_abort(connection):
+    connection.execute("INSERT INTO items (value) VALUES (1);")
+    # Ends the whole transaction, like SQLite does for some errors
+    connection.rollback()
+    raise sqlite3.OperationalError("Transaction aborted")
+
+
+class DatabaseWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "worker.db")
+        self.worker = DatabaseWorker(self.path)
+        self.worker.submit(_create_table, write=True).result()
+
+    def tearDown(self):
+        self.worker.close()
+        self.tempdir.cleanup()
+
+    def test_runs_on_worker_thread(self):
+        thread_name = self.worker.submit(_insert, 1, write=True).result()
+        self.assertEqual("DatabaseWorker", thread_name)
+        self.assertNotEqual(threading.current_thread().name, thread_name)
+
+    def test_writes_committed(self):
+        """Once a write future resolves, the row must be visible to other connections"""
+        futures = [self.worker.submit(_insert, i, write=True) for i in range(100)]
+        for future in futures:
+            future.result()
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(100, connection.execute("SELECT COUNT(*) FROM items;").fetchone()[0])
+        connection.close()
+
+    def test_reads_see_previous_writes(self):
+        self.worker.submit(_insert, 1, write=True)
+        self.assertEqual(1, self.worker.submit(_count).result())
+
+    def test_exception(self):
+        """A failing job must not affect other jobs of the same batch"""
+        failing = self.worker.submit(_fail, write=True)
+        succeeding = self.worker.submit(_insert, 1, write=True)
+
+        with self.assertRaises(ValueError):
+            failing.result()
+        succeeding.result()
+        self.assertEqual(1, self.worker.submit(_count).result())
+
+    def _submit_batch(self, *jobs):
+        """Submits the jobs while the worker is blocked, so that they are executed as one batch"""
+        started, release = threading.Event(), threading.Event()
+        self.worker.submit(lambda connection: started.set() or release.wait())
+        started.wait()
+        futures = [self.worker.submit(func, *args, write=True) for func, args in jobs]
+        release.set()
+        return futures
+
+    def test_failing_job_keeps_previous_writes(self):
+        first, failing = self._submit_batch((_insert, (1,)), (_fail, ()))
+        with self.assertRaises(ValueError):
+            failing.result()
+        first.result()
+        self.assertEqual(1, self.worker.submit(_count).result())
+
+    def test_failing_job_partial_writes_undone(self):
+        first, failing, last = self._submit_batch((_insert, (1,)), (_insert_and_fail, ((2, 3),)), (_insert, (4,)))
+        with self.assertRaises(ValueError):
+            failing.result()
+        first.result()
+        last.result()
+        self.assertEqual([1, 4], self.worker.submit(lambda connection: [row[0] for row in connection.execute(
+            "SELECT value FROM items ORDER BY value;")]).result())
+
+    def test_aborted_transaction_fails_batch(self):
+        """Futures of writes which were lost with the transaction must not resolve as success"""
+        first, aborting, last = self._submit_batch((_insert, (5,)), (_insert_and_abort, ()), (_insert, (6,)))
+        with self.assertRaises(sqlite3.OperationalError):
+            first.result()
+        with self.assertRaises(sqlite3.OperationalError):
+            aborting.result()
+        last.result()
+        self.assertEqual(1, self.worker.submit(_count).result())
+
+    def test_close_executes_queued_jobs(self):
+        futures = [self.worker.submit(_insert, i, write=True) for i in range(10)]
+        self.worker.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.worker = DatabaseWorker(self.path)
+        self.assertEqual(10, self.worker.submit(_count).result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from database import DatabaseBackup, DatabaseWorker, backup_database
+
+
+def _create_table(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS items (item_id INTEGER PRIMARY KEY, value TEXT);")
+    connection.executemany("INSERT INTO items (value) VALUES (?);", [("x" * 100,) for _ in range(20000)])
+
+
+def _insert(connection):
+    connection.execute("INSERT INTO items (value) VALUES ('new');")
+
+
+class BackupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "users.db")
+        self.worker = DatabaseWorker(self.path)
+        self.worker.submit(_create_table, write=True).result()
+
+    def tearDown(self):
+        self.worker.close()
+        self.tempdir.cleanup()
+
+    def test_backup_during_writes(self):
+        """A backup must complete while the worker keeps committing and contain a consistent state"""
+        stopped = threading.Event()
+
+        def write():
+            while not stopped.is_set():
+                self.worker.submit(_insert, write=True).result()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            target = os.path.join(self.tempdir.name, "copy.db")
+            backup_database(self.path, target, pages=8, pause=0)
+        finally:
+            stopped.set()
+            writer.join()
+
+        connection = sqlite3.connect(target)
+        self.assertEqual("ok", connection.execute("PRAGMA integrity_check;").fetchone()[0])
+        count, last_id = connection.execute("SELECT COUNT(*), MAX(item_id) FROM items;").fetchone()
+        # Rows are only appended, so a consistent copy has no gaps
+        self.assertEqual(count, last_id)
+        self.assertGreaterEqual(count, 20000)
+        connection.close()
+        self.assertFalse(os.path.exists(target + ".tmp"))
+
+    def test_snapshots(self):
+        directory = os.path.join(self.tempdir.name, "snapshots")
+        backup = DatabaseBackup([self.path], directory, keep=2, pause=0)
+        self.assertIsNone(backup.latest_path())
+
+        # Snapshots are named by the second they were taken in
+        for name in ("20260101-000000", "20260102-000000"):
+            os.makedirs(os.path.join(directory, name))
+        self.assertTrue(backup.start())
+        backup.join()
+
+        snapshots = backup.list_snapshots()
+        self.assertEqual(2, len(snapshots))
+        self.assertNotIn(os.path.join(directory, "20260101-000000"), snapshots)
+        self.assertEqual(os.path.join(snapshots[-1], "users.db"), backup.latest_path())
+
+        connection = backup.connect_latest()
+        self.assertEqual(20000, connection.execute("SELECT COUNT(*) FROM items;").fetchone()[0])
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.execute("DELETE FROM items;")
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sqlite3
+import unittest
+
+from database import AsyncDatabase, BannedUsers, Database
+
+
+class BannedUsersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.db.add_user(4715, "en", "test", "test2", "test3")
+        # A separate connection simulates another process or a manual SQL edit
+        self.other = sqlite3.connect(os.path.join(Database.dir_path, "users.db"))
+        self._set_banned(0)
+        asyncio.run(BannedUsers().refresh())
+
+    def tearDown(self):
+        self._set_banned(0)
+        self.other.close()
+
+    def _set_banned(self, banned):
+        self.other.execute("UPDATE users SET banned=? WHERE user_id=?;", [banned, 4715])
+        self.other.commit()
+
+    def test_refresh_on_external_change(self):
+        self.assertNotIn(4715, BannedUsers())
+
+        self._set_banned(1)
+        self.assertTrue(asyncio.run(BannedUsers().refresh()))
+        self.assertIn(4715, BannedUsers())
+        self.assertTrue(self.db.is_user_banned(4715))
+
+        self._set_banned(0)
+        self.assertTrue(asyncio.run(BannedUsers().refresh()))
+        self.assertNotIn(4715, BannedUsers())
+
+    def test_no_reload_without_change(self):
+        """Without commits of other connections the banned users must not be queried again"""
+        asyncio.run(BannedUsers().refresh())
+        self.assertFalse(asyncio.run(BannedUsers().refresh()))
+
+        # Commits of the worker's own connection don't change its data_version
+        asyncio.run(AsyncDatabase().set_bet(4715, 20))
+        self.assertFalse(asyncio.run(BannedUsers().refresh()))
+
+    def test_ban_in_process(self):
+        """Bans via the Database are visible right away, without waiting for a refresh"""
+        self.db.ban_user(4715)
+        self.assertIn(4715, BannedUsers())
+        self.db.unban_user(4715)
+        self.assertNotIn(4715, BannedUsers())
+
+
+if __name__ == '__main__':
+    unittest.main()
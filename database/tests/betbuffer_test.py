@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import mock
+
+from database import AsyncDatabase, BetBuffer, Database
+
+
+class BetBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.buffer = BetBuffer()
+        asyncio.run(self.buffer.flush(force=True))
+        for user_id in (4950, 4951):
+            self.db.add_user(user_id, "en", "test", "test2", "test3")
+            self.db.set_bet(user_id, 10)
+
+    def test_coalesce(self):
+        """Several adjustments of a bet must result in a single write of the latest value"""
+        self.buffer.set_bet(4950, 20)
+        self.buffer.set_bet(4950, 30)
+        self.buffer.set_bet(4950, 25)
+        self.assertEqual(1, self.buffer.pending_users())
+        self.assertEqual(25, self.buffer.get_bet(4950))
+
+        with mock.patch.object(AsyncDatabase, "set_bet", wraps=AsyncDatabase().set_bet) as set_bet:
+            self.assertEqual(1, asyncio.run(self.buffer.flush(force=True)))
+        set_bet.assert_called_once_with(4950, 25)
+        self.assertEqual(25, self.db.get_bet(4950))
+        self.assertIsNone(self.buffer.get_bet(4950))
+
+    def test_quiet_period(self):
+        """Bets which are still being adjusted are not written"""
+        self.buffer.set_bet(4950, 40)
+        with mock.patch.object(BetBuffer, "quiet_period", 3600):
+            self.assertEqual(0, asyncio.run(self.buffer.flush()))
+        self.assertEqual(10, self.db.get_bet(4950))
+
+        with mock.patch.object(BetBuffer, "quiet_period", 0):
+            self.assertEqual(1, asyncio.run(self.buffer.flush()))
+        self.assertEqual(40, self.db.get_bet(4950))
+
+    def test_flush_user(self):
+        """Joining a game writes the bet of the joining user right away"""
+        self.buffer.set_bet(4950, 50)
+        self.buffer.set_bet(4951, 60)
+        self.assertEqual(1, asyncio.run(self.buffer.flush_user(4950)))
+        self.assertEqual(50, self.db.get_bet(4950))
+        self.assertEqual(10, self.db.get_bet(4951))
+        self.assertEqual(60, self.buffer.get_bet(4951))
+        self.assertEqual(0, asyncio.run(self.buffer.flush_user(4950)))
+
+    def test_failed_write(self):
+        """Bets which couldn't be written stay buffered"""
+        self.buffer.set_bet(4950, 70)
+        with mock.patch.object(AsyncDatabase, "set_bet", side_effect=RuntimeError("locked")):
+            self.assertEqual(0, asyncio.run(self.buffer.flush(force=True)))
+        self.assertEqual(70, self.buffer.get_bet(4950))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import Database
+from database.bulk import export_table, import_table, BulkError
+
+
+class BulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.connection = self._create_database("source.db")
+        self.connection.executemany("INSERT INTO users (user_id, first_name, last_name, username, games_played, games_won, bet) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                                    [(i, "Näme {}".format(i), None, "user,{}".format(i), i, i // 2, 10) for i in range(1, 251)])
+        self.connection.executemany("INSERT INTO chats (chat_id, lang_id) VALUES (?, ?);", [(1, "de"), (-100, "en")])
+        self.connection.commit()
+
+    def tearDown(self):
+        self.connection.close()
+        self.tempdir.cleanup()
+
+    def _create_database(self, name):
+        path = os.path.join(self.tempdir.name, name)
+        Database.create_database(path)
+        return sqlite3.connect(path)
+
+    def _round_trip(self, table, fmt):
+        buffer = io.StringIO(newline="")
+        self.assertEqual(self.connection.execute("SELECT COUNT(*) FROM {};".format(table)).fetchone()[0],
+                         export_table(self.connection, table, buffer, fmt))
+
+        target = self._create_database("target_{}_{}.db".format(table, fmt))
+        buffer.seek(0)
+        count = import_table(target, table, buffer, fmt, chunk_size=100)
+
+        query = "SELECT * FROM {} ORDER BY rowid;".format(table)
+        self.assertEqual(self.connection.execute(query).fetchall(), target.execute(query).fetchall())
+        target.close()
+        return count
+
+    def test_round_trip_ndjson(self):
+        self.assertEqual(250, self._round_trip("users", "ndjson"))
+        self.assertEqual(2, self._round_trip("chats", "ndjson"))
+
+    def test_round_trip_csv(self):
+        self.assertEqual(250, self._round_trip("users", "csv"))
+        self.assertEqual(2, self._round_trip("chats", "csv"))
+
+    def test_import_partial_columns(self):
+        """Columns which are not part of the import keep their defaults"""
+        target = self._create_database("partial.db")
+        import_table(target, "users", io.StringIO('{"user_id": 5, "first_name": "Test"}\n'))
+        self.assertEqual((5, "Test", 0, 10), target.execute("SELECT user_id, first_name, games_played, bet FROM users;").fetchone())
+        target.close()
+
+    def test_invalid_input(self):
+        with self.assertRaises(BulkError):
+            export_table(self.connection, "admins; DROP TABLE users", io.StringIO())
+        with self.assertRaises(BulkError):
+            import_table(self.connection, "users", io.StringIO('{"user_id": 5, "evil": 1}\n'))
+        with self.assertRaises(BulkError):
+            import_table(self.connection, "users", io.StringIO('{"user_id": 5, "bet": 1}\n{"user_id": 6}\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import Database, dal
+
+
+class DataAccessLayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tempdir.name, "users.db")
+        Database.create_database(path)
+        self.connection = sqlite3.connect(path)
+        dal.insert_user(self.connection, 4901, "first", "last", "user")
+
+    def tearDown(self):
+        self.connection.close()
+        self.tempdir.cleanup()
+
+    def test_user_row(self):
+        user = dal.get_user(self.connection, 4901)
+        self.assertEqual(dal.UserRow(4901, "first", "last", "user", 0, 0, 0, 10, 0, 0), user)
+        with self.assertRaises(AttributeError):
+            user.unknown = 1
+        self.assertIsNone(dal.get_user(self.connection, 4902))
+
+    def test_integer_binding(self):
+        """Ids passed as strings must be stored and looked up as integers"""
+        dal.insert_user(self.connection, "4903", "first", None, None)
+        dal.set_bet(self.connection, "4903", "25")
+        row = self.connection.execute("SELECT typeof(user_id), typeof(bet) FROM users WHERE user_id=4903;").fetchone()
+        self.assertEqual(("integer", "integer"), row)
+        self.assertEqual(25, dal.get_bet(self.connection, 4903))
+
+    def test_user_exists(self):
+        self.assertTrue(dal.user_exists(self.connection, 4901))
+        self.assertFalse(dal.user_exists(self.connection, 4902))
+        self.assertFalse(dal.insert_user(self.connection, 4901, "other", None, None))
+
+    def test_user_data_changed(self):
+        self.assertFalse(dal.user_data_changed(self.connection, 4901, "first", "last", "user"))
+        self.assertTrue(dal.user_data_changed(self.connection, 4901, "first", "last", "new"))
+        self.assertTrue(dal.user_data_changed(self.connection, 4902, "first", "last", "user"))
+
+    def test_lang_id(self):
+        self.assertEqual("en", dal.get_lang_id(self.connection, -4901))
+        dal.set_lang_id(self.connection, -4901, "de")
+        dal.set_lang_id(self.connection, -4901, "cn")
+        self.assertEqual("cn", dal.get_lang_id(self.connection, -4901))
+
+
+if __name__ == '__main__':
+    unittest.main()
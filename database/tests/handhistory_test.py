@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from blackjack.game.card import Card
+from blackjack.game.player import Player
+from database import HandHistory, HandSegment, open_segments
+from database.handhistory import COLUMNS, MAX_CARDS, OUTCOME_LOST, OUTCOME_WON, list_segments
+
+
+class FakeGame(object):
+    """The parts of a BlackJackGame which the hand history reads"""
+
+    def __init__(self, game_id, chat_id=-4500):
+        self.id = game_id
+        self.chat_id = chat_id
+        self.dealer = Player(-1, "Dealer")
+        for card_id in (8, 5):
+            self.dealer.give_card(Card(card_id))
+        self.players = []
+        self.list_won = []
+        self.list_tie = []
+        self.list_lost = []
+
+    def add(self, user_id, card_ids, bet, win):
+        player = Player(user_id, "Player")
+        for card_id in card_ids:
+            player.give_card(Card(card_id))
+        player.bet = bet
+        player.win = win
+        self.players.append(player)
+        (self.list_won if win > 0 else self.list_lost).append(player)
+        return player
+
+
+def _game(game_id):
+    game = FakeGame(game_id)
+    # 10 + 9 against the dealer's 10 + 7
+    game.add(4601, (8, 7), 10, 20)
+    # 5 + 6 + 4 loses
+    game.add(4602, (3, 4, 2), 20, 0)
+    return game
+
+
+class HandHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _history(self, capacity=64):
+        # Flushed by the tests themselves
+        return HandHistory(self.directory, capacity=capacity, flush_interval=3600)
+
+    def _rows(self):
+        rows = []
+        for segment in open_segments(self.directory):
+            with segment:
+                rows.extend(segment.rows_as_tuples())
+        return rows
+
+    def test_record_game(self):
+        history = self._history()
+        history.record_game(_game(1000001), timestamp=1700000000)
+        self.assertEqual(2, history.pending_hands())
+        history.close()
+
+        rows = self._rows()
+        self.assertEqual(2, len(rows))
+        winner = dict(zip([name for name, _, _ in COLUMNS], rows[0]))
+        self.assertEqual(1700000000, winner["timestamp"])
+        self.assertEqual(-4500, winner["chat_id"])
+        self.assertEqual(1000001, winner["game_id"])
+        self.assertEqual(4601, winner["user_id"])
+        self.assertEqual((10, 20, OUTCOME_WON), (winner["bet"], winner["payout"], winner["outcome"]))
+        self.assertEqual((19, 17), (winner["player_total"], winner["dealer_total"]))
+        self.assertEqual(bytes([9, 8]) + bytes(MAX_CARDS - 2), winner["player_cards"])
+        self.assertEqual(bytes([9, 6]) + bytes(MAX_CARDS - 2), winner["dealer_cards"])
+        self.assertEqual(OUTCOME_LOST, rows[1][COLUMNS.index(("outcome", "b", 1))])
+
+    def test_unevaluated_game(self):
+        """Games which were stopped before the evaluation have no hands"""
+        history = self._history()
+        game = FakeGame(1000002)
+        game.players.append(Player(4601, "Player"))
+        history.record_game(game)
+        self.assertEqual(0, history.pending_hands())
+        history.close()
+
+    def test_readers_see_written_hands_only(self):
+        history = self._history()
+        history.record_game(_game(1000003))
+        path = list_segments(self.directory)[-1][1]
+        with HandSegment(path) as segment:
+            self.assertEqual(0, len(segment))
+
+        history.flush()
+        with HandSegment(path) as segment:
+            self.assertEqual(2, len(segment))
+            self.assertEqual([4601, 4602], list(segment.column("user_id")))
+            self.assertEqual(30, sum(segment.column("bet")))
+        history.close()
+
+    def test_rollover(self):
+        history = self._history(capacity=8)
+        for game_id in range(1000010, 1000020):
+            history.record_game(_game(game_id))
+        self.assertEqual(20, history.flush())
+        self.assertEqual(3, history.segment)
+        history.close()
+
+        segments = open_segments(self.directory)
+        self.assertEqual([8, 8, 4], [len(segment) for segment in segments])
+        for segment in segments:
+            segment.close()
+        self.assertEqual(list(range(1000010, 1000020)), sorted(set(row[2] for row in self._rows())))
+
+    def test_compaction(self):
+        """Segments left partially filled by restarts are merged into one dense segment when the next run starts"""
+        for game_id in (1000030, 1000031, 1000032):
+            history = self._history()
+            history.record_game(_game(game_id))
+            history.close()
+        # A run without any game
+        self._history().close()
+        history = self._history()
+        history.compact()
+        history.close()
+
+        segments = list_segments(self.directory)
+        self.assertEqual([1, 5], [number for number, _ in segments])
+        with HandSegment(segments[0][1]) as segment:
+            self.assertEqual(6, len(segment))
+            self.assertEqual((1, 4), (segment.first_segment, segment.last_segment))
+            self.assertEqual(8, segment.capacity)
+        self.assertEqual([1000030] * 2 + [1000031] * 2 + [1000032] * 2, [row[2] for row in self._rows()])
+
+    def test_interrupted_compaction(self):
+        """Inputs of a compaction which weren't removed yet must not be read twice"""
+        history = self._history()
+        history.record_game(_game(1000040))
+        history.close()
+        merged = list_segments(self.directory)[0][1]
+        with HandSegment(merged) as segment:
+            self.assertEqual((1, 1), (segment.first_segment, segment.last_segment))
+
+        self._history().close()
+        self.assertEqual(2, len(list_segments(self.directory)))
+        # Pretend segment 1 is the result of merging 1 and 2, and 2 is still there
+        os.replace(list_segments(self.directory)[-1][1], os.path.join(self.directory, "hands-00000002.col"))
+        with open(merged, "r+b") as f:
+            f.seek(24)
+            f.write((2).to_bytes(8, "little"))
+        self.assertEqual([1], [number for number, _ in list_segments(self.directory)])
+
+
+if __name__ == '__main__':
+    unittest.main()
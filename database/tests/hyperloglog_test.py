@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from database import HyperLogLog
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(0, HyperLogLog().count())
+
+    def test_small_counts(self):
+        counter = HyperLogLog()
+        for user_id in range(1, 101):
+            counter.add(user_id)
+            # Adding the same user again doesn't change anything
+            counter.add(user_id)
+        self.assertAlmostEqual(100, counter.count(), delta=3)
+
+    def test_large_counts(self):
+        counter = HyperLogLog()
+        for user_id in range(100000, 300000):
+            counter.add(user_id)
+        # 4 standard errors of the default precision
+        self.assertAlmostEqual(200000, counter.count(), delta=200000 * 0.065)
+
+    def test_merge(self):
+        first = HyperLogLog()
+        second = HyperLogLog()
+        for user_id in range(0, 30000):
+            first.add(user_id)
+        for user_id in range(20000, 50000):
+            second.add(user_id)
+        first.merge(second)
+        self.assertAlmostEqual(50000, first.count(), delta=50000 * 0.065)
+
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_serialization(self):
+        counter = HyperLogLog(precision=10)
+        for user_id in range(5000):
+            counter.add(user_id)
+        data = counter.to_bytes()
+        self.assertEqual(1024, len(data))
+
+        restored = HyperLogLog.from_bytes(data)
+        self.assertEqual(10, restored.precision)
+        self.assertEqual(counter.count(), restored.count())
+
+
+if __name__ == '__main__':
+    unittest.main()
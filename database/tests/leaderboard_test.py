@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from database import Database, Leaderboards, GLOBAL_SCOPE
+
+CHAT_ID = -4716
+
+
+class LeaderboardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.db.connection.execute("DELETE FROM leaderboard_stats WHERE scope=? OR user_id BETWEEN 4716 AND 4799;", [CHAT_ID])
+        self.db.connection.commit()
+        self.leaderboards = Leaderboards()
+        self.leaderboards.flush()
+        self.leaderboards._tops.clear()
+
+    def _play(self, user_id, won, group=True):
+        self.leaderboards.add_game(CHAT_ID, user_id, "Player {}".format(user_id), won, group=group)
+
+    def test_ranking(self):
+        self._play(4716, won=True)
+        self._play(4717, won=True)
+        self._play(4717, won=False)
+        self._play(4718, won=True)
+        self._play(4718, won=True)
+        self._play(4719, won=False)
+        # One row per player for the group and one for the global leaderboard
+        self.assertEqual(8, self.leaderboards.flush())
+
+        top = asyncio.run(self.leaderboards.get_top(CHAT_ID))
+        # Wins first, fewer games break ties
+        self.assertEqual([4718, 4716, 4717, 4719], [entry[0] for entry in top])
+        self.assertEqual((4718, "Player 4718", 2, 2), top[0])
+
+        top_global = asyncio.run(self.leaderboards.get_top(GLOBAL_SCOPE))
+        self.assertIn((4718, "Player 4718", 2, 2), top_global)
+
+    def test_incremental_update(self):
+        """Flushes must update loaded leaderboards in memory, including players entering the top entries"""
+        for user_id in range(4720, 4720 + Leaderboards.size):
+            self._play(user_id, won=True)
+        self.leaderboards.flush()
+        top = asyncio.run(self.leaderboards.get_top(CHAT_ID))
+        self.assertEqual(Leaderboards.size, len(top))
+        self.assertNotIn(4730, [entry[0] for entry in top])
+
+        self._play(4730, won=True)
+        self._play(4730, won=True)
+        self.leaderboards.flush()
+
+        # Drop the table rows to make sure the leaderboard is served from memory
+        self.db.connection.execute("DELETE FROM leaderboard_stats WHERE scope=?;", [CHAT_ID])
+        self.db.connection.commit()
+        top = asyncio.run(self.leaderboards.get_top(CHAT_ID))
+        self.assertEqual(Leaderboards.size, len(top))
+        self.assertEqual((4730, "Player 4730", 2, 2), top[0])
+
+    def test_restart(self):
+        """Leaderboards must be restored from the side table, e.g. after a restart"""
+        self._play(4740, won=True)
+        self.leaderboards.flush()
+        self.leaderboards._tops.clear()
+        self.assertEqual([(4740, "Player 4740", 1, 1)], asyncio.run(self.leaderboards.get_top(CHAT_ID)))
+
+    def test_singleplayer(self):
+        """Singleplayer games only count for the global leaderboard"""
+        self._play(4741, won=True, group=False)
+        self.leaderboards.flush()
+        self.assertEqual([], asyncio.run(self.leaderboards.get_top(CHAT_ID)))
+
+
+if __name__ == '__main__':
+    unittest.main()
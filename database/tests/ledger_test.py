@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from database import Database, Ledger, LedgerSettler
+
+USER_IDS = (4801, 4802)
+
+
+class FlakyClient(object):
+    """Balance service which fails a given amount of times before it accepts changes"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.applied = {}
+
+    def apply_balance_changes(self, changes):
+        self.calls.append(changes)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("Balance service unavailable")
+        for change in changes:
+            self.applied.setdefault(change["idempotency_key"], change)
+
+
+class LedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.ledger = Ledger()
+        self.ledger.flush()
+        self._clean()
+
+    def tearDown(self):
+        self._clean()
+
+    def _clean(self):
+        connection = self.db.connection
+        connection.execute("DELETE FROM ledger WHERE user_id IN (?, ?);", USER_IDS)
+        connection.execute("DELETE FROM settlements;")
+        connection.commit()
+
+    def _entries(self, user_id):
+        return self.db.connection.execute("SELECT account, kind, amount FROM ledger WHERE user_id=? ORDER BY entry_id;", [user_id]).fetchall()
+
+    def test_double_entry(self):
+        """Every round must add up to zero and be booked only once"""
+        self.ledger.record_round("round-1", USER_IDS[0], 10, 25)
+        self.ledger.record_round("round-1", USER_IDS[1], 20, 0)
+        self.assertEqual(6, self.ledger.flush())
+
+        entries = self._entries(USER_IDS[0])
+        self.assertEqual([("player", "bet", -10), ("house", "bet", 10), ("player", "payout", 25), ("house", "payout", -25)],
+                         [tuple(entry) for entry in entries])
+        total = self.db.connection.execute("SELECT SUM(amount) FROM ledger WHERE round_id='round-1';").fetchone()[0]
+        self.assertEqual(0, total)
+
+        # Writing the same round again must not book it twice
+        self.ledger.record_round("round-1", USER_IDS[0], 10, 25)
+        self.ledger.flush()
+        self.assertEqual(4, len(self._entries(USER_IDS[0])))
+
+    def test_settle_with_retries(self):
+        self.ledger.record_round("round-1", USER_IDS[0], 10, 20)
+        self.ledger.record_round("round-2", USER_IDS[0], 5, 0)
+        self.ledger.record_round("round-1", USER_IDS[1], 20, 50)
+        self.ledger.flush()
+
+        client = FlakyClient(failures=2)
+        settler = LedgerSettler(client)
+        settler.retry_delay = 0
+        self.assertEqual(2, asyncio.run(settler.settle()))
+
+        self.assertEqual(3, len(client.calls))
+        # Retries must send the same idempotency keys
+        self.assertEqual(client.calls[0], client.calls[2])
+        amounts = {change["user_id"]: change["amount"] for change in client.applied.values()}
+        self.assertEqual({USER_IDS[0]: 5, USER_IDS[1]: 30}, amounts)
+
+        # Nothing left to settle
+        self.assertEqual(0, asyncio.run(settler.settle()))
+        self.assertEqual(3, len(client.calls))
+
+    def test_settle_failure_keeps_settlements(self):
+        self.ledger.record_round("round-1", USER_IDS[0], 10, 0)
+        self.ledger.flush()
+
+        settler = LedgerSettler(FlakyClient(failures=LedgerSettler.max_attempts))
+        settler.retry_delay = 0
+        self.assertEqual(0, asyncio.run(settler.settle()))
+
+        # The next run retries the same settlement instead of creating a new one
+        client = FlakyClient()
+        settler.client = client
+        self.assertEqual(1, asyncio.run(settler.settle()))
+        self.assertEqual(1, len(client.applied))
+        change = list(client.applied.values())[0]
+        self.assertEqual(-10, change["amount"])
+        count = self.db.connection.execute("SELECT COUNT(*) FROM settlements;").fetchone()[0]
+        self.assertEqual(1, count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import inspect
+import os
+import re
+import sqlite3
+import tempfile
+import unittest
+
+from database import Database
+from database.database import MIGRATIONS, USER_SHARD_MIGRATIONS, USERS_TABLE
+
+USER_ID = 4995
+
+# Every public method of Database with a call issuing its statements
+CALLS = {
+    "load_banned_users": lambda db: db.load_banned_users(),
+    "get_banned_users": lambda db: db.get_banned_users(),
+    "get_user": lambda db: db.get_user(USER_ID),
+    "is_user_banned": lambda db: db.is_user_banned(USER_ID),
+    "ban_user": lambda db: db.ban_user(USER_ID),
+    "unban_user": lambda db: db.unban_user(USER_ID),
+    "find_users": lambda db: db.find_users("plan"),
+    "get_recent_players": lambda db: db.get_recent_players(),
+    "get_played_games": lambda db: db.get_played_games(USER_ID),
+    "get_admins": lambda db: db.get_admins(),
+    "get_lang_id": lambda db: db.get_lang_id(USER_ID),
+    "set_lang_id": lambda db: db.set_lang_id(USER_ID, "de"),
+    "set_bet": lambda db: db.set_bet(USER_ID, 20),
+    "get_bet": lambda db: db.get_bet(USER_ID),
+    "add_user": lambda db: db.add_user(USER_ID, "en", "Query", "Plan", "queryplan"),
+    "set_games_won": lambda db: db.set_games_won(3, USER_ID),
+    "set_games_played": lambda db: db.set_games_played(5, USER_ID),
+    "set_last_played": lambda db: db.set_last_played(1600000000, USER_ID),
+    "is_user_saved": lambda db: db.is_user_saved(USER_ID),
+    "user_data_changed": lambda db: db.user_data_changed(USER_ID, "Query", "Plan", "queryplan"),
+    "update_user_data": lambda db: db.update_user_data(USER_ID, "Query", "Plan", "queryplan2"),
+    "reset_stats": lambda db: db.reset_stats(USER_ID),
+}
+
+# Methods which don't issue queries against the tables
+NOT_CHECKED = {"create_database", "create_user_shard", "close_conn"}
+
+# Tables which are read as a whole on purpose, e.g. because they only hold a handful of rows
+WHOLE_TABLE_READS = {"admins"}
+
+STATEMENT = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+SCAN = re.compile(r"^SCAN (\w+)")
+SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+
+
+def full_scans(connection, sql):
+    """Returns the tables a statement reads completely according to its query plan"""
+    details = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql)]
+    # Results of subqueries in the same statement are no tables
+    subqueries = {match.group(1) for match in map(SUBQUERY.match, details) if match}
+    scans = []
+    for detail in details:
+        match = SCAN.match(detail)
+        if match is None or "VIRTUAL TABLE" in detail:
+            continue
+        if match.group(1) not in subqueries and match.group(1) not in WHOLE_TABLE_READS:
+            scans.append(detail)
+    return scans
+
+
+class QueryPlanTest(unittest.TestCase):
+    """Every statement of the Database class must use an index - a full scan of the users table won't show up in tests, but in production"""
+
+    def setUp(self):
+        self.db = Database()
+        self.statements = []
+        Database.get_admins.cache.clear()
+        Database.get_lang_id.cache.clear()
+        self.db.connection.set_trace_callback(self.statements.append)
+
+    def tearDown(self):
+        self.db.connection.set_trace_callback(None)
+        self.db.unban_user(USER_ID)
+        with self.db.connection:
+            self.db.connection.execute("DELETE FROM users WHERE user_id=?;", [USER_ID])
+            self.db.connection.execute("DELETE FROM chats WHERE chat_id=?;", [USER_ID])
+
+    def test_all_methods_covered(self):
+        methods = {name for name, _ in inspect.getmembers(Database, callable) if not name.startswith("_")}
+        self.assertEqual(set(), methods - set(CALLS) - NOT_CHECKED, "Add the new methods of Database to CALLS")
+
+    def test_no_full_scans(self):
+        for name, call in CALLS.items():
+            del self.statements[:]
+            call(self.db)
+            # The trace callback gets the statements with their parameters filled in
+            statements = [sql for sql in self.statements if STATEMENT.match(sql)]
+            for sql in statements:
+                with self.subTest(method=name, sql=sql):
+                    self.assertEqual([], full_scans(self.db.connection, sql))
+
+    def test_scans_are_detected(self):
+        self.assertEqual(["SCAN users"], full_scans(self.db.connection, "SELECT user_id FROM users WHERE games_won=3;"))
+        self.assertEqual([], full_scans(self.db.connection, "SELECT user_id FROM admins;"))
+
+
+class MigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "users.db")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _schema(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            version = connection.execute("PRAGMA user_version;").fetchone()[0]
+            indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='users';")}
+            return version, indexes
+        finally:
+            connection.close()
+
+    def test_new_database(self):
+        Database.create_database(self.path)
+        version, indexes = self._schema()
+        self.assertEqual(len(MIGRATIONS), version)
+        self.assertTrue({"users_last_played", "users_banned"} <= indexes)
+
+    def test_existing_database(self):
+        """Files created before the migrations get the missing indexes and keep their rows"""
+        connection = sqlite3.connect(self.path)
+        connection.execute(USERS_TABLE)
+        connection.execute("INSERT INTO users (user_id, banned) VALUES (4996, 1);")
+        connection.commit()
+        connection.close()
+
+        Database.create_database(self.path)
+        version, indexes = self._schema()
+        self.assertEqual(len(MIGRATIONS), version)
+        self.assertIn("users_banned", indexes)
+
+        connection = sqlite3.connect(self.path)
+        try:
+            self.assertEqual([(4996,)], connection.execute("SELECT user_id FROM users WHERE banned=1;").fetchall())
+        finally:
+            connection.close()
+
+    def test_migrations_run_once(self):
+        Database.create_database(self.path)
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP INDEX users_last_played;")
+        connection.commit()
+        connection.close()
+
+        # A file at the current version is left alone
+        Database.create_database(self.path)
+        version, indexes = self._schema()
+        self.assertEqual(len(MIGRATIONS), version)
+        self.assertNotIn("users_last_played", indexes)
+
+    def test_user_shard(self):
+        Database.create_user_shard(self.path)
+        version, indexes = self._schema()
+        self.assertEqual(len(USER_SHARD_MIGRATIONS), version)
+        self.assertTrue({"users_last_played", "users_banned"} <= indexes)
+
+
+if __name__ == '__main__':
+    unittest.main()
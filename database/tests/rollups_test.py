@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from blackjack.game.player import Player
+from database import Database, GLOBAL_SCOPE, PnlRollups
+
+HOUR = 3600
+NOW = 480000 * HOUR + 1800
+
+
+class FakeGame(object):
+
+    def __init__(self, chat_id, results):
+        self.chat_id = chat_id
+        self.players = []
+        self.list_won = []
+        self.list_tie = []
+        self.list_lost = []
+        for user_id, (bet, win) in enumerate(results, start=4400):
+            player = Player(user_id, "Player")
+            player.bet = bet
+            player.win = win
+            self.players.append(player)
+            (self.list_won if win > bet else self.list_tie if win == bet else self.list_lost).append(player)
+
+
+class PnlRollupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tempdir.name, "users.db")
+        Database.create_database(path)
+        self.connection = sqlite3.connect(path)
+        self.rollups = PnlRollups()
+        self.rollups.flush(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+        self.tempdir.cleanup()
+
+    def test_record_game(self):
+        # Blackjack pays 2.5 times the bet, the second player loses
+        self.rollups.record_game(FakeGame(-4400, [(10, 25.0), (20, 0)]), timestamp=NOW)
+        report = self.rollups.report(self.connection, 1, -4400, timestamp=NOW)
+        self.assertEqual((1, 2, 30, 25), (report.rounds, report.hands, report.wagered, report.paid))
+        self.assertEqual(5, report.house_profit)
+        self.assertAlmostEqual(25 / 30, report.rtp)
+
+    def test_unevaluated_game(self):
+        game = FakeGame(-4400, [(10, 0)])
+        game.list_lost = []
+        self.rollups.record_game(game, timestamp=NOW)
+        self.assertEqual(0, self.rollups.pending_buckets())
+
+    def test_windows_and_scopes(self):
+        self.rollups.add_round(-4401, 1, 10, 20, timestamp=NOW)
+        self.rollups.add_round(-4401, 1, 10, 0, timestamp=NOW - HOUR)
+        self.rollups.add_round(-4402, 2, 40, 40, timestamp=NOW - 5 * HOUR)
+        # Two buckets per round - one for the chat and one for all chats
+        self.assertEqual(6, self.rollups.flush(self.connection))
+
+        self.assertEqual(1, self.rollups.report(self.connection, 1, -4401, timestamp=NOW).rounds)
+        self.assertEqual(20, self.rollups.report(self.connection, 2, -4401, timestamp=NOW).wagered)
+        self.assertEqual(0, self.rollups.report(self.connection, 24, -4402, timestamp=NOW - 6 * HOUR).rounds)
+
+        report = self.rollups.report(self.connection, 24, GLOBAL_SCOPE, timestamp=NOW)
+        self.assertEqual((3, 4, 60, 60), (report.rounds, report.hands, report.wagered, report.paid))
+        self.assertEqual(1.0, report.rtp)
+
+    def test_flush_adds_up(self):
+        """Buckets which are flushed several times add up, and unflushed counters are part of reports"""
+        self.rollups.add_round(-4401, 1, 10, 20, timestamp=NOW)
+        self.rollups.flush(self.connection)
+        self.rollups.add_round(-4401, 1, 10, 0, timestamp=NOW)
+        self.assertEqual(2, self.rollups.report(self.connection, 1, -4401, timestamp=NOW).rounds)
+
+        self.rollups.flush(self.connection)
+        self.assertEqual(0, self.rollups.pending_buckets())
+        report = self.rollups.report(self.connection, 1, -4401, timestamp=NOW)
+        self.assertEqual((2, 20, 20), (report.rounds, report.wagered, report.paid))
+        self.assertEqual(2, self.connection.execute("SELECT COUNT(*) FROM pnl_rollups;").fetchone()[0])
+
+    def test_empty_window(self):
+        report = self.rollups.report(self.connection, 24, timestamp=NOW)
+        self.assertEqual(0, report.rounds)
+        self.assertIsNone(report.rtp)
+
+
+if __name__ == '__main__':
+    unittest.main()
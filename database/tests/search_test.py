@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from database import AsyncDatabase, Database, ShardedStore, dal
+from database.database import USERS_TABLE
+
+USERS = [
+    (5101, "John", "Smith", "johnny"),
+    (5102, "Johanna", "Müller", None),
+    (5103, "Peter", "Johnson", "pete"),
+    (5104, "José", None, "jose_bj"),
+    (5105, "Anna", "Smithers", "annas"),
+]
+
+
+class SearchQueryTest(unittest.TestCase):
+
+    def test_build_search_query(self):
+        self.assertEqual('"john"* "sm"*', dal.build_search_query("@john  sm"))
+        self.assertEqual('"a""b"*', dal.build_search_query('a"b'))
+        self.assertIsNone(dal.build_search_query(" @ "))
+        self.assertIsNone(dal.build_search_query('""'))
+
+
+class FindUsersTest(unittest.TestCase):
+    shards = 1
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store = ShardedStore(self.tempdir.name, self.shards)
+        self.db = AsyncDatabase()
+        self.patcher = mock.patch.object(self.db, "store", self.store)
+        self.patcher.start()
+
+        async def add():
+            for user_id, first_name, last_name, username in USERS:
+                await self.db.add_user(user_id, "en", first_name, last_name, username)
+        asyncio.run(add())
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.store.close()
+        self.tempdir.cleanup()
+
+    def _find(self, text, limit=10):
+        return [row[1] for row in asyncio.run(self.db.find_users(text, limit))]
+
+    def test_prefix_match(self):
+        self.assertEqual({5101, 5102, 5103}, set(self._find("joh")))
+        self.assertEqual([5103], self._find("pet john"))
+        self.assertEqual([], self._find("nobody"))
+
+    def test_username(self):
+        self.assertEqual([5101], self._find("@johnny"))
+        self.assertEqual([5104], self._find("jose_bj"))
+
+    def test_diacritics(self):
+        self.assertEqual([5104], self._find("jose"))
+        self.assertEqual([5102], self._find("muller"))
+
+    def test_ranking(self):
+        # The user whose username matches as well comes first
+        self.assertEqual(5101, self._find("john")[0])
+        self.assertEqual(2, len(self._find("smith")))
+        self.assertEqual(1, len(self._find("smith", limit=1)))
+
+    def test_empty_query(self):
+        self.assertEqual([], self._find("  "))
+
+    def test_index_follows_changes(self):
+        asyncio.run(self.db.save_user(5105, "en", "Anna", "Smithers", "queen_of_hearts"))
+        self.assertEqual([5105], self._find("queen"))
+        self.assertEqual([], self._find("annas"))
+
+        asyncio.run(self.db.run_user(5105, lambda connection, uid: connection.execute(
+            "DELETE FROM users WHERE user_id=?;", [uid]), 5105, write=True))
+        self.assertEqual([], self._find("queen"))
+        self.assertEqual([5101], self._find("smith"))
+
+
+class ShardedFindUsersTest(FindUsersTest):
+    """The same with the users spread over several files - the matches of all shards are merged by rank"""
+    shards = 3
+
+
+class ExistingUsersTest(unittest.TestCase):
+
+    def test_rebuild_index(self):
+        """Users stored before the index existed are indexed when the database is opened"""
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "users.db")
+            connection = sqlite3.connect(path)
+            connection.execute(USERS_TABLE)
+            connection.execute("INSERT INTO users (user_id, first_name, last_name, username) VALUES (5201, 'Old', 'Timer', 'oldtimer');")
+            connection.commit()
+            connection.close()
+
+            Database.create_user_shard(path)
+            connection = sqlite3.connect(path)
+            try:
+                self.assertEqual([5201], [row[1] for row in dal.find_users(connection, "old")])
+                # Opening it again doesn't index the users twice
+                Database.create_user_shard(path)
+                self.assertEqual(1, connection.execute("SELECT COUNT(*) FROM users_fts WHERE users_fts MATCH 'timer';").fetchone()[0])
+            finally:
+                connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
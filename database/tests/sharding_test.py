@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from database import AsyncDatabase, BannedUsers, ShardedStore, StatisticsBuffer, Shard, shard_of
+from database.sharding import shard_path
+
+SHARDS = 4
+USER_IDS = range(5000, 5040)
+
+
+class ShardOfTest(unittest.TestCase):
+
+    def test_distribution(self):
+        counts = [0] * SHARDS
+        for user_id in range(100000, 110000):
+            counts[shard_of(user_id, SHARDS)] += 1
+        for count in counts:
+            self.assertGreater(count, 2000)
+
+    def test_shard_contains(self):
+        shards = [Shard(index, SHARDS) for index in range(SHARDS)]
+        for user_id in USER_IDS:
+            self.assertEqual(1, sum(user_id in shard for shard in shards))
+        self.assertIn(123, Shard(0, 1))
+
+
+class ShardedAsyncDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store = ShardedStore(self.tempdir.name, SHARDS)
+        self.db = AsyncDatabase()
+        self.patcher = mock.patch.object(self.db, "store", self.store)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.store.close()
+        self.tempdir.cleanup()
+
+    def _add_users(self):
+        async def add():
+            await asyncio.gather(*(self.db.add_user(user_id, "de", "Player", None, None) for user_id in USER_IDS))
+        asyncio.run(add())
+
+    def _count(self, path, table):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute("SELECT COUNT(*) FROM {};".format(table)).fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_users_routed_to_shards(self):
+        self._add_users()
+        expected = [0] * SHARDS
+        for user_id in USER_IDS:
+            expected[shard_of(user_id, SHARDS)] += 1
+
+        counts = [self._count(shard_path(self.tempdir.name, index, SHARDS), "users") for index in range(SHARDS)]
+        self.assertEqual(expected, counts)
+        # Chats stay in the main file, the users table there stays empty
+        main_path = "{}/users.db".format(self.tempdir.name)
+        self.assertEqual(len(USER_IDS), self._count(main_path, "chats"))
+        self.assertEqual(0, self._count(main_path, "users"))
+
+        asyncio.run(self.db.set_bet(5001, 50))
+        lang_id, user, bet = asyncio.run(self.db.get_request_data(5001, 5001))
+        self.assertEqual(("de", 5001, 50), (lang_id, user.user_id, bet))
+
+    def test_recent_players_merged(self):
+        self._add_users()
+        now = int(time.time())
+
+        def touch(connection, shard):
+            connection.executemany("UPDATE users SET last_played=? WHERE user_id=?;", [(now, user_id) for user_id in USER_IDS if user_id % 3])
+
+        asyncio.run(self.db.run_on_shards(touch, write=True))
+
+        pages = []
+        after_user_id = 0
+        while True:
+            page = asyncio.run(self.db.get_recent_players_page(now - 60, after_user_id, limit=7))
+            if not page:
+                break
+            pages.append(page)
+            after_user_id = page[-1]
+
+        self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+        self.assertEqual([user_id for user_id in USER_IDS if user_id % 3], [user_id for page in pages for user_id in page])
+
+    def test_statistics_flush_per_shard(self):
+        self._add_users()
+        buffer = StatisticsBuffer()
+        buffer.flush()
+        for user_id in USER_IDS:
+            buffer.add_game(user_id, won=True)
+
+        self.assertEqual(len(USER_IDS), asyncio.run(buffer.flush_shards()))
+        self.assertEqual(0, buffer.pending_users())
+        self.assertEqual(1, asyncio.run(self.db.get_played_games(5003)))
+
+    def test_banned_users_of_all_shards(self):
+        self._add_users()
+        banned = [5002, 5011, 5025, 5039]
+        for user_id in banned:
+            connection = sqlite3.connect(shard_path(self.tempdir.name, shard_of(user_id, SHARDS), SHARDS))
+            connection.execute("UPDATE users SET banned=1 WHERE user_id=?;", [user_id])
+            connection.commit()
+            connection.close()
+
+        banned_users = BannedUsers()
+        with mock.patch.object(banned_users, "_data_versions", {}), mock.patch.object(banned_users, "_shard_users", {}), \
+                mock.patch.object(banned_users, "users", frozenset()):
+            self.assertTrue(asyncio.run(banned_users.refresh()))
+            self.assertEqual(set(banned), set(banned_users.users))
+            self.assertFalse(asyncio.run(banned_users.refresh()))
+
+
+if __name__ == '__main__':
+    unittest.main()
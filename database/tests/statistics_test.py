@@ -51,17 +51,17 @@ class StatisticsTest(unittest.TestCase):
         db.add_user(user_id, "en", "test", "test2", "test3")
 
         user = db.get_user(user_id)
-        self.assertEqual(user[5], 0)
+        self.assertEqual(user.games_won, 0)
 
         database.statistics.set_game_won(user_id)
 
         user = db.get_user(user_id)
-        self.assertEqual(user[5], 1)
+        self.assertEqual(user.games_won, 1)
 
         database.statistics.set_game_won(user_id)
 
         user = db.get_user(user_id)
-        self.assertEqual(user[5], 2)
+        self.assertEqual(user.games_won, 2)
 
     if __name__ == '__main__':
         unittest.main()
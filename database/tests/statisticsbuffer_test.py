@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from database import Database, StatisticsBuffer
+
+
+class StatisticsBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.buffer = StatisticsBuffer()
+        self.buffer.flush()
+        for user_id in (4711, 4712):
+            self.db.add_user(user_id, "en", "test", "test2", "test3")
+            self.db.reset_stats(user_id)
+
+    def test_coalesce(self):
+        """Several games of the same user must be merged into a single pending update"""
+        self.buffer.add_game(4711, won=True)
+        self.buffer.add_game(4711, won=False)
+        self.buffer.add_game(4712, won=False)
+        self.assertEqual(2, self.buffer.pending_users())
+
+        # Nothing is written before the flush
+        self.assertEqual(0, self.db.get_played_games(4711))
+
+        self.assertEqual(2, self.buffer.flush())
+        self.assertEqual(0, self.buffer.pending_users())
+
+        user = self.db.get_user(4711)
+        self.assertEqual(2, user.games_played)
+        self.assertEqual(1, user.games_won)
+        self.assertGreater(user.last_played, 0)
+        self.assertEqual(1, self.db.get_played_games(4712))
+
+    def test_flush_adds_up(self):
+        """Increments must be added to the stored values instead of replacing them"""
+        self.buffer.add_game(4711, won=True)
+        self.buffer.flush()
+        self.buffer.add_game(4711, won=True)
+        self.buffer.flush()
+
+        self.assertEqual(2, self.db.get_user(4711).games_won)
+
+    def test_flush_empty(self):
+        self.assertEqual(0, self.buffer.flush())
+
+    def test_unknown_user(self):
+        """Users who are not stored in the database are not created by a flush"""
+        self.buffer.add_game(4799, won=True)
+        self.buffer.flush()
+        self.assertIsNone(self.db.get_user(4799))
+
+
+if __name__ == '__main__':
+    unittest.main()
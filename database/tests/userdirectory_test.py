@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import mock
+
+from database import AsyncDatabase, Database, UserDirectory, dal
+
+USER_IDS = (4970, 4971, 4972)
+
+
+class UserDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.directory = UserDirectory()
+        with self.db.connection:
+            self.db.connection.execute("DELETE FROM users WHERE user_id IN (?, ?, ?);", USER_IDS)
+        for user_id in USER_IDS:
+            self.directory.forget(user_id)
+
+    def test_new_user(self):
+        self.assertFalse(self.directory.is_saved(4970))
+        self.assertTrue(asyncio.run(self.directory.save_user(4970, "de", "first", "last", "user")))
+        self.assertTrue(self.directory.is_saved(4970))
+        self.assertEqual("first", self.db.get_user(4970).first_name)
+
+    def test_known_user_needs_no_query(self):
+        asyncio.run(self.directory.save_user(4970, "de", "first", "last", "user"))
+        with mock.patch.object(AsyncDatabase, "save_user") as save_user:
+            self.assertFalse(asyncio.run(self.directory.save_user(4970, "de", "first", "last", "user")))
+        save_user.assert_not_called()
+
+    def test_changed_profile(self):
+        asyncio.run(self.directory.save_user(4970, "de", "first", "last", "user"))
+        self.assertTrue(self.directory.has_changed(4970, "first", "last", "renamed"))
+        self.assertFalse(asyncio.run(self.directory.save_user(4970, "de", "first", "last", "renamed")))
+        self.assertEqual("renamed", self.db.get_user(4970).username)
+        self.assertFalse(self.directory.has_changed(4970, "first", "last", "renamed"))
+
+    def test_remember_row(self):
+        """Users loaded by the request context are known without saving them"""
+        self.db.add_user(4971, "en", "first", None, None)
+        self.directory.remember_row(self.db.get_user(4971))
+        self.assertFalse(self.directory.has_changed(4971, "first", None, None))
+
+    def test_unknown_saved_user(self):
+        """A saved user who was evicted from the directory is updated instead of inserted again"""
+        self.db.add_user(4972, "en", "first", None, None)
+        self.assertFalse(asyncio.run(self.directory.save_user(4972, "en", "new", None, None)))
+        self.assertEqual("new", self.db.get_user(4972).first_name)
+
+    def test_bounded(self):
+        with mock.patch.object(UserDirectory, "maxsize", 2):
+            directory = UserDirectory()
+            for user_id in USER_IDS:
+                directory.remember(user_id, "first", None, None)
+            self.assertFalse(directory.is_saved(USER_IDS[0]))
+            self.assertTrue(directory.is_saved(USER_IDS[2]))
+
+
+class SaveUserTest(unittest.TestCase):
+
+    def test_unchanged_names_are_not_written(self):
+        connection = Database().connection
+        with connection:
+            connection.execute("DELETE FROM users WHERE user_id=4973;")
+            self.assertTrue(dal.save_user(connection, 4973, "first", None, "user"))
+        with connection:
+            self.assertFalse(dal.save_user(connection, 4973, "first", None, "user"))
+            self.assertEqual(0, connection.execute("SELECT changes();").fetchone()[0])
+            dal.save_user(connection, 4973, "first", "last", "user")
+            self.assertEqual(1, connection.execute("SELECT changes();").fetchone()[0])
+            connection.execute("DELETE FROM users WHERE user_id=4973;")
+
+
+if __name__ == '__main__':
+    unittest.main()
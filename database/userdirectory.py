@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+
+from .asyncdatabase import AsyncDatabase
+
+
+def _profile_hash(first_name, last_name, username):
+    return hash((first_name, last_name, username))
+
+
+class UserDirectory(object):
+    """
+    Bounded in-memory directory of users which are known to be stored, together with a hash of their names.
+    It answers "is this user saved" and "did their profile change" without a query, so the database is only written
+    for new users and changed names. The least recently seen users are evicted first - they are simply saved again.
+    """
+    _instance = None
+    _initialized = False
+
+    maxsize = 100000
+
+    def __new__(cls):
+        if UserDirectory._instance is None:
+            UserDirectory._instance = super(UserDirectory, cls).__new__(cls)
+        return UserDirectory._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # user_id -> hash of (first_name, last_name, username)
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.writes = 0
+        self._initialized = True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._profiles)
+
+    def remember(self, user_id, first_name, last_name, username):
+        """Marks a user as saved with the given names"""
+        with self._lock:
+            self._profiles[int(user_id)] = _profile_hash(first_name, last_name, username)
+            self._profiles.move_to_end(int(user_id))
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+
+    def remember_row(self, user_row):
+        """Marks a user as saved with the names of a UserRow loaded from the database"""
+        self.remember(user_row.user_id, user_row.first_name, user_row.last_name, user_row.username)
+
+    def forget(self, user_id):
+        """Removes a user, e.g. after their row was deleted"""
+        with self._lock:
+            self._profiles.pop(int(user_id), None)
+
+    def is_saved(self, user_id):
+        """Returns True if the user is known to be saved. False means unknown - the user might still be saved."""
+        with self._lock:
+            return int(user_id) in self._profiles
+
+    def has_changed(self, user_id, first_name, last_name, username):
+        """Returns False if the user is known to be saved with exactly these names"""
+        with self._lock:
+            return self._profiles.get(int(user_id)) != _profile_hash(first_name, last_name, username)
+
+    async def save_user(self, user_id, lang_id, first_name, last_name, username):
+        """
+        Saves a user unless they are known to be saved with the same names already
+        :param user_id: The user_id of the user
+        :param lang_id: The language for the private chat of a new user
+        :param first_name: The current first name
+        :param last_name: The current last name
+        :param username: The current username
+        :return: True if the user was new
+        """
+        user_id = int(user_id)
+        with self._lock:
+            if self._profiles.get(user_id) == _profile_hash(first_name, last_name, username):
+                self._profiles.move_to_end(user_id)
+                self.hits += 1
+                return False
+
+        new = await AsyncDatabase().save_user(user_id, lang_id, first_name, last_name, username)
+        self.remember(user_id, first_name, last_name, username)
+        with self._lock:
+            self.writes += 1
+        return new
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWorker(object):
+    """
+    Executes database jobs on a dedicated thread with its own connection. Write jobs which are queued at the same time
+    are executed in a single transaction with only one commit, so they must not commit or roll back on their own.
+    """
+    _STOP = object()
+
+    def __init__(self, database_path, batch_size=256, name="DatabaseWorker"):
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path)
+        connection.row_factory = sqlite3.Row
+        connection.text_factory = lambda x: str(x, 'utf-8', "ignore")
+        # WAL lets readers on other connections continue while this one writes
+        connection.execute("PRAGMA journal_mode=WAL;")
+        connection.execute("PRAGMA synchronous=NORMAL;")
+        return connection
+
+    def submit(self, func, *args, write=False):
+        """
+        Queues a job for the worker thread
+        :param func: Function which is called with the worker's connection and *args
+        :param args: Arguments for func
+        :param write: True if the job modifies the database. The returned future resolves after the commit.
+        :return: concurrent.futures.Future with the result of func
+        """
+        future = Future()
+        self._queue.put((future, func, args, write))
+        return future
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            jobs = [self._queue.get()]
+            # Take everything which piled up in the meantime, so that writes can share one commit
+            while len(jobs) < self.batch_size:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(job is self._STOP for job in jobs)
+            self._execute(connection, [job for job in jobs if job is not self._STOP])
+            if stop:
+                connection.close()
+                return
+
+    @staticmethod
+    def _execute(connection, jobs):
+        # Write jobs run in one transaction, each within its own savepoint. A failing job only undoes its own changes
+        # and the futures of the others resolve once the commit of the batch succeeded.
+        written = []
+        for future, func, args, write in jobs:
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            if write:
+                if not connection.in_transaction:
+                    connection.execute("BEGIN;")
+                connection.execute("SAVEPOINT job;")
+            try:
+                result = func(connection, *args)
+            except Exception as e:
+                future.set_exception(e)
+                if write:
+                    DatabaseWorker._rollback_job(connection, written, e)
+                continue
+
+            if write:
+                connection.execute("RELEASE job;")
+                written.append((future, result))
+            else:
+                future.set_result(result)
+
+        if not written:
+            return
+
+        try:
+            connection.commit()
+        except Exception as e:
+            logger.error("Couldn't commit {} writes: {}".format(len(written), e))
+            connection.rollback()
+            for future, _ in written:
+                future.set_exception(e)
+            return
+
+        for future, result in written:
+            future.set_result(result)
+
+    @staticmethod
+    def _rollback_job(connection, written, error):
+        """Undoes the changes of a failed write job. If SQLite had to abort the whole transaction, the previous jobs of the batch fail as well."""
+        if connection.in_transaction:
+            connection.execute("ROLLBACK TO job;")
+            connection.execute("RELEASE job;")
+            return
+
+        logger.error("Transaction aborted, {} writes are lost: {}".format(len(written), error))
+        for future, _ in written:
+            future.set_exception(error)
+        del written[:]
+
+    def close(self):
+        """Executes all queued jobs and stops the worker thread"""
+        self._queue.put(self._STOP)
+        self._thread.join()
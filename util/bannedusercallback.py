@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
+from telegram.ext import ApplicationHandlerStop
 
-def banned_user_callback(update, context):
-    """Gets called by the dispatcher when it's found that the user sending the update was banned from using the bot"""
+
+async def banned_user_callback(update, context):
+    """Gets called by the application when it's found that the user sending the update was banned from using the bot"""
     banned_text = "You have been banned from using this bot!"
-    
+
     if update.callback_query:
-        update.callback_query.answer(banned_text)
-    else:
-        update.effective_message.reply_text(banned_text)
+        await update.callback_query.answer(banned_text)
+    elif update.effective_message:
+        await update.effective_message.reply_text(banned_text)
+
+    # Don't run any other handler for this update
+    raise ApplicationHandlerStop
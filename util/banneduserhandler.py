@@ -7,17 +7,21 @@ import database
 
 
 class BannedUserHandler(TypeHandler):
+    """
+    Matches all updates of banned users. Must be added to the first handler group, so that its callback can stop the processing
+    of the update before any other handler (or the database) gets involved.
+    """
     logger = logging.getLogger()
 
+    def __init__(self, *args, **kwargs):
+        super(BannedUserHandler, self).__init__(*args, **kwargs)
+        self.banned_users = database.BannedUsers()
+
     def check_update(self, update):
-        db = database.Database()
         user = update.effective_user
 
         if user is None:
-            self.logger.warning(f"User is None! Update: {update}")
             return False
 
-        if db.is_user_banned(user.id):
-            return True
-
-        return False
+        # The set is kept up to date in the background, so this is just a set lookup
+        return user.id in self.banned_users.users
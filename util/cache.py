@@ -1,64 +1,212 @@
 # -*- coding: utf-8 -*-
-# Reference: https://code.activestate.com/recipes/325905-memoize-decorator-with-timeout/#c1
+import asyncio
+import functools
+import threading
 import time
+from collections import OrderedDict
+
+
+def _default_key(*args, **kwargs):
+    return args, tuple(sorted(kwargs.items()))
+
+
+def _consume_exception(future):
+    # Prevents "exception was never retrieved" warnings when nobody was waiting for a failed load
+    if not future.cancelled():
+        future.exception()
+
+
+class _PendingCall(object):
+    """A call which is currently computing the value for a key in another thread"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
 
 
 class Cache(object):
-    """Cache class decorator for caching method results for a certain input"""
+    """
+    Cache class decorator for caching function results in a bounded LRU with a time to live.
+    Works for regular and coroutine functions. Concurrent calls for a missing key are coalesced into a single call.
+    One Cache object can decorate several functions which compute the same values, e.g. a sync and an async getter.
+    """
     _caches = {}
-    _timeouts = {}
 
-    def __init__(self, timeout=2):
+    def __init__(self, timeout=2, maxsize=1024, key=None, name=None):
+        """
+        :param timeout: Seconds after which a cached value expires
+        :param maxsize: Maximum amount of cached values. The least recently used value gets evicted first.
+        :param key: Function computing the cache key from the arguments of a call, e.g. lambda self, chat_id: int(chat_id).
+        Defaults to all positional and keyword arguments.
+        :param name: Name under which the cache is registered for Cache.get_stats(). Defaults to the name of the first decorated function.
+        """
         self.timeout = timeout
+        self.maxsize = maxsize
+        self.key = key or _default_key
+        self.name = name
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        # key -> (value, expiry time)
+        self._values = OrderedDict()
+        self._pending = {}
+        self._pending_async = {}
+        self._lock = threading.Lock()
+
+        if name is not None:
+            Cache._caches[name] = self
+
+    def __call__(self, f):
+        if self.name is None:
+            self.name = f.__qualname__
+            Cache._caches[self.name] = self
+
+        if asyncio.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def wrapper(*args, **kwargs):
+                return await self._call_async(f, args, kwargs)
+        else:
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                return self._call(f, args, kwargs)
+
+        wrapper.cache = self
+        return wrapper
 
-    def collect(self):
-        """Clear cache of results which have timed out"""
-        for func in self._caches:
-            cache = {}
-            for key in self._caches[func]:
-                if (time.time() - self._caches[func][key][1]) < self._timeouts[func]:
-                    cache[key] = self._caches[func][key]
-            self._caches[func] = cache
+    def _lookup(self, key):
+        """Returns a tuple (found, value) - must be called with the lock held"""
+        entry = self._values.get(key)
+        if entry is None:
+            return False, None
 
-    def invalidate_lang_cache(self, chat_id):
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self._values[key]
+            return False, None
+
+        self._values.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def _store(self, key, value):
+        """Stores a value and evicts the least recently used values - must be called with the lock held"""
+        self._values[key] = (value, time.monotonic() + self.timeout)
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+            self.evictions += 1
+
+    def _call(self, f, args, kwargs):
+        key = self.key(*args, **kwargs)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingCall()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = f(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            pending.error = e
+            pending.event.set()
+            raise
+
+        with self._lock:
+            # Only store the value if the key wasn't invalidated in the meantime
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+                self._store(key, value)
+        pending.value = value
+        pending.event.set()
+        return value
+
+    async def _call_async(self, f, args, kwargs):
+        key = self.key(*args, **kwargs)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+
+            future = self._pending_async.get(key)
+            if future is None:
+                future = self._pending_async[key] = asyncio.get_running_loop().create_future()
+                future.add_done_callback(_consume_exception)
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            # Shielded, so that a cancelled waiter doesn't cancel the call for everybody else
+            return await asyncio.shield(future)
+
+        try:
+            value = await f(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                if self._pending_async.get(key) is future:
+                    del self._pending_async[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+
+        with self._lock:
+            if self._pending_async.get(key) is future:
+                del self._pending_async[key]
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key):
         """
-        Invalidate language cache for certain chat_id, e.g. after changing languages
-        :param chat_id: The chat_id of a certain Telegram chat
+        Removes the cached value of a key, e.g. after it has been changed in the database.
+        Calls which are computing the value for this key right now won't store their (possibly outdated) result.
+        :param key: The key as returned by the key function of this cache
         :return:
         """
-        for func in self._caches:
-            # Sadly I haven't been able to find a better way to access the correct cache
-            # So we are using string comparison for now
-            if "Database.get_lang_id" not in str(func):
-                continue
-
-            for key in self._caches[func]:
-                try:
-                    if int(chat_id) == key[0][1]:
-                        new_tuple = (self._caches[func][key][0], 0)
-                        self._caches[func][key] = new_tuple
-                except Exception as e:
-                    print(e)
+        with self._lock:
+            self._values.pop(key, None)
+            self._pending.pop(key, None)
+            self._pending_async.pop(key, None)
 
-    def __call__(self, f):
-        self.cache = self._caches[f] = {}
-        self._timeouts[f] = self.timeout
-
-        def func(*args, **kwargs):
-            kw = sorted(kwargs.items())
-            key = (args, tuple(kw))
-            # The cache depends on the function being called, the args and the kwargs.
-            # Only if all of them match, we return the stored value for that exact combination
-            try:
-                # if there is no cached value yet OR the value has timed out, a KeyError is being raised
-                v = self.cache[key]
-                if (time.time() - v[1]) > self.timeout:
-                    raise KeyError
-            except KeyError:
-                # When a KeyError is raised, we'll actually call the wrapped method and store the value
-                v = self.cache[key] = f(*args, **kwargs), time.time()
-            return v[0]
-
-        func.func_name = f.__name__
-
-        return func
+    def clear(self):
+        """Removes all cached values"""
+        with self._lock:
+            self._values.clear()
+            self._pending.clear()
+            self._pending_async.clear()
+
+    def stats(self):
+        """Returns a dict with the current size and the hit, miss, coalesced and eviction counters of this cache"""
+        with self._lock:
+            return {"size": len(self._values), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "evictions": self.evictions}
+
+    @classmethod
+    def get_stats(cls):
+        """Returns a dict of cache name -> stats of all registered caches"""
+        return {name: cache.stats() for name, cache in cls._caches.items()}
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+import unittest
+
+from util import Cache
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_cached(self):
+        calls = []
+
+        @Cache(timeout=60)
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        self.assertEqual(4, square(2))
+        self.assertEqual(4, square(2))
+        self.assertEqual(9, square(3))
+        self.assertEqual([2, 3], calls)
+        self.assertEqual({"size": 2, "hits": 1, "misses": 2, "coalesced": 0, "evictions": 0}, square.cache.stats())
+
+    def test_timeout(self):
+        calls = []
+
+        @Cache(timeout=0.05)
+        def get(x):
+            calls.append(x)
+            return x
+
+        get(1)
+        get(1)
+        time.sleep(0.1)
+        get(1)
+        self.assertEqual([1, 1], calls)
+
+    def test_lru_eviction(self):
+        calls = []
+
+        @Cache(timeout=60, maxsize=2)
+        def get(x):
+            calls.append(x)
+            return x
+
+        get(1)
+        get(2)
+        # Using 1 makes 2 the least recently used value
+        get(1)
+        get(3)
+        self.assertEqual(1, get.cache.stats()["evictions"])
+
+        get(1)
+        get(2)
+        self.assertEqual([1, 2, 3, 2], calls)
+
+    def test_invalidate_by_key(self):
+        class Store(object):
+            def __init__(self):
+                self.values = {1: "en", 2: "de"}
+
+            @Cache(timeout=60, key=lambda self, chat_id: int(chat_id))
+            def get(self, chat_id):
+                return self.values[int(chat_id)]
+
+        store = Store()
+        self.assertEqual("en", store.get(1))
+        self.assertEqual("de", store.get("2"))
+
+        store.values[1] = "fr"
+        store.values[2] = "es"
+        Store.get.cache.invalidate(1)
+        self.assertEqual("fr", store.get(1))
+        # Other keys are not affected
+        self.assertEqual("de", store.get(2))
+
+    def test_coalesce_threads(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @Cache(timeout=60)
+        def slow(x):
+            calls.append(x)
+            started.set()
+            release.wait()
+            return x * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(21))) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        # Give the other threads time to reach the cache
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([21], calls)
+        self.assertEqual([42] * 5, results)
+        self.assertEqual(4, slow.cache.stats()["coalesced"])
+
+    def test_coroutine(self):
+        calls = []
+
+        @Cache(timeout=60)
+        async def slow(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        async def run():
+            first = await asyncio.gather(*(slow(21) for _ in range(10)))
+            second = await slow(21)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual([42] * 10, first)
+        self.assertEqual(42, second)
+        self.assertEqual([21], calls)
+        self.assertEqual({"size": 1, "hits": 1, "misses": 1, "coalesced": 9, "evictions": 0}, slow.cache.stats())
+
+    def test_coroutine_exception(self):
+        calls = []
+
+        @Cache(timeout=60)
+        async def failing(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            raise ValueError(x)
+
+        async def run():
+            return await asyncio.gather(failing(1), failing(1), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        # Exceptions are not cached
+        with self.assertRaises(ValueError):
+            asyncio.run(failing(1))
+        self.assertEqual([1, 1], calls)
+
+    def test_invalidate_during_call(self):
+        """A value which was loaded before an invalidation must not end up in the cache"""
+        values = {"x": "old"}
+
+        @Cache(timeout=60)
+        async def get(key):
+            value = values[key]
+            await asyncio.sleep(0.01)
+            return value
+
+        async def run():
+            task = asyncio.ensure_future(get("x"))
+            await asyncio.sleep(0)
+            values["x"] = "new"
+            get.cache.invalidate((("x",), ()))
+            self.assertEqual("old", await task)
+            return await get("x")
+
+        self.assertEqual("new", asyncio.run(run()))
+
+    def test_shared_cache(self):
+        """One cache can decorate a sync and an async function computing the same values"""
+        cache = Cache(timeout=60, key=lambda chat_id: chat_id, name="shared_test")
+
+        @cache
+        def get(chat_id):
+            return "sync"
+
+        @cache
+        async def get_async(chat_id):
+            return "async"
+
+        self.assertEqual("sync", get(1))
+        self.assertEqual("sync", asyncio.run(get_async(1)))
+        self.assertIn("shared_test", Cache.get_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()